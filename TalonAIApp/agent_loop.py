@@ -1,26 +1,43 @@
 import asyncio
-from typing import Dict, Any
+import logging
+from typing import Dict, Any, Optional
 
 from .state import AgentState
-from .planner import run_agentic_planner
+from .planner import run_planner_step
 from .response_formatter import format_agent_response
+from .budget import RequestBudget, bind_budget, unbind_budget
+from .request_context import RequestContext
+from .tools import ToolPrefetch, bind_tool_prefetch, unbind_tool_prefetch
+from .tracing import span
+from .logs import log_payload
+
+logger = logging.getLogger(__name__)
 
 # Debug logging function
 def debug_log(message, data=None):
-    print(f"🔍 AGENT_LOOP: {message}")
-    if data:
-        print(f"📊 DATA: {data}")
+    log_payload(logger, message, data)
 
 
-async def run_agent_system(state: AgentState) -> Dict[str, Any]:
+async def run_agent_system(
+    state: AgentState,
+    budget: Optional[RequestBudget] = None,
+    context: Optional[RequestContext] = None,
+) -> Dict[str, Any]:
     """
-    Executes the agentic planner loop that can adapt its strategy based on results.
-    The agentic planner can:
-    - Dynamically decide what to do next based on intermediate results
-    - Ask for more information when needed
-    - Stop when satisfied with the outcome
-    - Adapt its approach based on what it discovers
+    Single bounded scheduler for one user message.
+
+    Each step asks the planner (or the intent router) what to run and runs it. The loop
+    stops as soon as a step reports the query answered, or when the request budget
+    (planner steps, LLM calls, tokens, wall time) runs out. Budget consumption is
+    returned under "budget" in the formatted response.
+
+    `context` carries data loaded once per request (recent memory); views pass one
+    they prefetched, otherwise it is loaded here. Agent tool calls started while the
+    planner decides (see tools.ToolPrefetch) are cancelled on return if no agent used them.
     """
+    budget = budget or RequestBudget(user_id=state.get("user_id"))
+    budget_token = bind_budget(budget)
+    prefetch_token = bind_tool_prefetch(ToolPrefetch())
     try:
         debug_log("🚀 Starting agent system", {
             "query": state.get("query"),
@@ -35,44 +52,62 @@ async def run_agent_system(state: AgentState) -> Dict[str, Any]:
         if not state.get("flags"):
             state["flags"] = {}
 
-        max_iterations = 10  # Prevent infinite loops
-        iteration = 0
+        if context is None:
+            context = await RequestContext.load(state.get("user_id", ""), state.get("session_id", "default"))
+
+        while True:
+            reason = budget.exhausted_reason()
+            if reason:
+                logger.warning("⚠️ Budget exhausted: %s", reason)
+                budget.stop_reason = f"budget exhausted: {reason}"
+                state["agent_trace"].append(f"Scheduler stopped: budget exhausted ({reason})")
+                if not state.get("final_message"):
+                    state["final_message"] = "I've reached the processing limit for this request. Please try rephrasing your question."
+                break
 
-        while iteration < max_iterations:
-            iteration += 1
-            debug_log(f"🔄 Running agentic planner (iteration {iteration})")
+            budget.planner_steps += 1
+            step = budget.planner_steps
+            logger.debug("🔄 Running planner step %s", step)
             
             try:
-                state = await run_agentic_planner(state)
-                debug_log("✅ Planner completed", {
-                    "final_message": state.get("final_message"),
+                with span("planner.step", step=step):
+                    state, done = await asyncio.wait_for(
+                        run_planner_step(state, step, context),
+                        timeout=budget.remaining_time()
+                    )
+                debug_log("✅ Planner step completed", {
+                    "done": done,
                     "agent_trace": state.get("agent_trace")
                 })
                 
-                if state.get("final_message"):
-                    debug_log("🏁 Breaking loop - final message received")
+                if done:
+                    debug_log("🏁 Query answered - stopping scheduler")
+                    budget.stop_reason = "answered"
                     break
-                    
+
+            except asyncio.TimeoutError:
+                logger.warning("⏱️ Planner step %s exceeded the wall-time budget", step)
+                budget.stop_reason = f"budget exhausted: max wall time ({budget.max_wall_time:g}s)"
+                state["agent_trace"].append(f"Scheduler stopped: wall-time budget exceeded in step {step}")
+                break
             except Exception as e:
-                debug_log(f"❌ Error in planner iteration {iteration}", str(e))
+                logger.exception("❌ Error in planner step %s: %s", step, e)
+                budget.stop_reason = "error"
                 state["final_message"] = "I encountered an error while processing your request."
-                state["agent_trace"].append(f"Error in iteration {iteration}: {str(e)}")
+                state["agent_trace"].append(f"Error in iteration {step}: {str(e)}")
                 break
 
-        if iteration >= max_iterations:
-            debug_log("⚠️ Reached maximum iterations")
-            state["final_message"] = "I've reached the maximum processing iterations. Please try rephrasing your question."
-            state["agent_trace"].append("Reached maximum iterations limit")
-
         # Use the comprehensive response formatter
         debug_log("🎯 Formatting comprehensive response")
-        formatted_response = format_agent_response(state)
+        with span("response.format"):
+            formatted_response = format_agent_response(state)
+        formatted_response["budget"] = budget.report()
         debug_log("✅ Response formatted successfully")
         
         return formatted_response
         
     except Exception as e:
-        debug_log("❌ Critical error in agent system", str(e))
+        logger.exception("❌ Critical error in agent system: %s", e)
         # Return safe fallback response
         return {
             "type": "error",
@@ -85,8 +120,12 @@ async def run_agent_system(state: AgentState) -> Dict[str, Any]:
             "response_type": "error",
             "error": str(e),
             "agent_trace": state.get("agent_trace", []) + [f"Critical error: {str(e)}"],
-            "tool_trace": state.get("tool_trace", [])
+            "tool_trace": state.get("tool_trace", []),
+            "budget": budget.report()
         }
+    finally:
+        unbind_tool_prefetch(prefetch_token)
+        unbind_budget(budget_token)
 
         
         
\ No newline at end of file
@@ -4,3 +4,9 @@ from django.apps import AppConfig
 class TalonaiappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'TalonAIApp'
+
+    def ready(self):
+        # Register lifespan hooks (shared Claude client, DB pool and query tracing, memory writer,
+        # trace exporter) before the server starts.
+        # Shutdown hooks run in reverse, so the memory writer flushes before the DB pool closes.
+        from . import claude, db, memory, tracing  # noqa: F401
@@ -0,0 +1,124 @@
+import os
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# Per-request limits enforced by the scheduler in agent_loop.run_agent_system
+AGENT_MAX_LLM_CALLS = int(os.getenv("AGENT_MAX_LLM_CALLS", "8"))
+AGENT_MAX_WALL_TIME = float(os.getenv("AGENT_MAX_WALL_TIME", "60"))
+AGENT_MAX_TOKENS = int(os.getenv("AGENT_MAX_TOKENS", "60000"))
+AGENT_MAX_PLANNER_STEPS = int(os.getenv("AGENT_MAX_PLANNER_STEPS", "5"))
+
+
+class RequestBudget:
+    """
+    LLM call, token and wall-time allowance for one user message.
+
+    call_claude records usage against the budget bound to the current task, and the
+    scheduler checks it before starting each planner step.
+    """
+
+    def __init__(
+        self,
+        max_llm_calls: int = AGENT_MAX_LLM_CALLS,
+        max_wall_time: float = AGENT_MAX_WALL_TIME,
+        max_tokens: int = AGENT_MAX_TOKENS,
+        max_planner_steps: int = AGENT_MAX_PLANNER_STEPS,
+        user_id: Optional[str] = None,
+    ):
+        self.user_id = user_id  # for per-user fairness in the LLM rate limiter
+        self.max_llm_calls = max_llm_calls
+        self.max_wall_time = max_wall_time
+        self.max_tokens = max_tokens
+        self.max_planner_steps = max_planner_steps
+        self.started_at = time.monotonic()
+        self.llm_calls = 0
+        self.cache_hits = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        # Anthropic prompt caching: input tokens served from / written to the cache
+        self.cache_read_tokens = 0
+        self.cache_creation_tokens = 0
+        self.planner_steps = 0
+        self.escalations = 0  # fast-model answers re-asked on the large model
+        self.prompt_tokens: Dict[str, int] = {}  # estimated prompt tokens per agent
+        self.stop_reason: Optional[str] = None
+
+    def record_call(
+        self,
+        input_tokens: int = 0,
+        output_tokens: int = 0,
+        cache_read_tokens: int = 0,
+        cache_creation_tokens: int = 0,
+    ) -> None:
+        self.llm_calls += 1
+        self.input_tokens += input_tokens or 0
+        self.output_tokens += output_tokens or 0
+        self.cache_read_tokens += cache_read_tokens
+        self.cache_creation_tokens += cache_creation_tokens
+
+    def record_prompt(self, agent: Optional[str], tokens: int) -> None:
+        key = agent or "other"
+        self.prompt_tokens[key] = self.prompt_tokens.get(key, 0) + tokens
+
+    def record_cache_hit(self) -> None:
+        self.cache_hits += 1
+
+    @property
+    def tokens_used(self) -> int:
+        return self.input_tokens + self.output_tokens
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started_at
+
+    def remaining_time(self) -> float:
+        return max(0.0, self.max_wall_time - self.elapsed)
+
+    def exhausted_reason(self) -> Optional[str]:
+        """Why no further planner step may start, or None if budget remains."""
+        if self.planner_steps >= self.max_planner_steps:
+            return f"max planner steps ({self.max_planner_steps})"
+        if self.llm_calls >= self.max_llm_calls:
+            return f"max LLM calls ({self.max_llm_calls})"
+        if self.tokens_used >= self.max_tokens:
+            return f"max tokens ({self.max_tokens})"
+        if self.remaining_time() <= 0:
+            return f"max wall time ({self.max_wall_time:g}s)"
+        return None
+
+    def report(self) -> Dict[str, Any]:
+        """Budget consumption, returned with every /chat/ response."""
+        return {
+            "llm_calls": self.llm_calls,
+            "max_llm_calls": self.max_llm_calls,
+            "cache_hits": self.cache_hits,
+            "input_tokens": self.input_tokens,
+            "output_tokens": self.output_tokens,
+            "prompt_tokens": self.prompt_tokens,
+            "cache_read_tokens": self.cache_read_tokens,
+            "cache_creation_tokens": self.cache_creation_tokens,
+            "max_tokens": self.max_tokens,
+            "escalations": self.escalations,
+            "planner_steps": self.planner_steps,
+            "max_planner_steps": self.max_planner_steps,
+            "wall_time": round(self.elapsed, 3),
+            "max_wall_time": self.max_wall_time,
+            "stop_reason": self.stop_reason,
+        }
+
+
+_current_budget: ContextVar[Optional[RequestBudget]] = ContextVar("talon_request_budget", default=None)
+
+
+def get_current_budget() -> Optional[RequestBudget]:
+    return _current_budget.get()
+
+
+def bind_budget(budget: Optional[RequestBudget]):
+    """Make `budget` the current request's budget; returns a token for unbind_budget."""
+    return _current_budget.set(budget)
+
+
+def unbind_budget(token) -> None:
+    _current_budget.reset(token)
@@ -1,54 +1,459 @@
-from anthropic import AsyncAnthropic
-from typing import Optional
+from anthropic import AsyncAnthropic, DefaultAsyncHttpxClient
+from typing import Optional, Dict, Any, List, Sequence, Union
+import asyncio
+import logging
 import os
+import time
+from contextlib import asynccontextmanager
 
-# Claude Sonnet 3.5 - stable model
-CLAUDE_MODEL = "claude-3-5-sonnet-20241022"
+import httpx
+import orjson
 
+from .lifecycle import on_startup, on_shutdown
+from .llm_cache import llm_cache, cache_ttl_for, make_cache_key, LLM_CACHE_MAX_TEMPERATURE
+from .llm_fixtures import llm_fixtures
+from .streaming import JsonFieldStream, emit_event, streaming_enabled
+from .budget import get_current_budget
+from .prompts import PromptText, count_tokens
+from .resilience import claude_policy, StreamInterruptedError
+from .limiter import llm_limiter
+from .tracing import annotate, span, traced
+
+logger = logging.getLogger(__name__)
+
+# Claude Sonnet 3.5 - stable model, used for user-facing answers
+CLAUDE_MODEL = os.getenv("CLAUDE_MODEL", "claude-3-5-sonnet-20241022")
+# Small, fast model for routing decisions and extraction
+CLAUDE_FAST_MODEL = os.getenv("CLAUDE_FAST_MODEL", "claude-3-5-haiku-20241022")
+
+# Model per calling agent; override with CLAUDE_MODEL_<AGENT>
+AGENT_MODELS = {
+    "planner": CLAUDE_FAST_MODEL,
+    "profile_updater": CLAUDE_FAST_MODEL,
+    "info": CLAUDE_MODEL,
+    "diagnostic": CLAUDE_MODEL,
+    "modcoach": CLAUDE_MODEL,
+    "buildplanner": CLAUDE_MODEL,
+}
+
+
+def model_for(agent: Optional[str]) -> str:
+    """Model an agent's calls use when call_claude isn't given one explicitly."""
+    if agent:
+        override = os.getenv(f"CLAUDE_MODEL_{agent.upper()}")
+        if override:
+            return override
+    return AGENT_MODELS.get(agent, CLAUDE_MODEL)
+
+# Connection pool settings for the shared Anthropic HTTP client
+CLAUDE_POOL_MAX_CONNECTIONS = int(os.getenv("CLAUDE_POOL_MAX_CONNECTIONS", "20"))
+CLAUDE_POOL_MAX_KEEPALIVE = int(os.getenv("CLAUDE_POOL_MAX_KEEPALIVE", "10"))
+CLAUDE_POOL_KEEPALIVE_EXPIRY = float(os.getenv("CLAUDE_POOL_KEEPALIVE_EXPIRY", "60"))
+
+
+class ClaudeClientManager:
+    """
+    Process-wide owner of the AsyncAnthropic client.
+
+    One client (and therefore one keep-alive connection pool) is shared by every
+    call_claude invocation running on the same event loop, so planner iterations and
+    agent pipelines reuse warm TLS connections instead of opening new ones.
+    """
+
+    def __init__(
+        self,
+        max_connections: int = CLAUDE_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections: int = CLAUDE_POOL_MAX_KEEPALIVE,
+        keepalive_expiry: float = CLAUDE_POOL_KEEPALIVE_EXPIRY,
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self._client: Optional[AsyncAnthropic] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.clients_created = 0
+        self.clients_reused = 0
+        self.clients_closed = 0
+
+    def get_client(self) -> AsyncAnthropic:
+        """Return the shared client, creating it on first use (or when the event loop changed)."""
+        loop = asyncio.get_running_loop()
+        if self._client is not None and self._loop is loop and not self._client.is_closed():
+            self.clients_reused += 1
+            return self._client
+
+        # httpx pools are bound to the loop they were created on; scripts that call
+        # asyncio.run() more than once get a fresh client per loop.
+        api_key = os.getenv("ANTHROPIC_API_KEY")
+        if not api_key:
+            logger.error("❌ ANTHROPIC_API_KEY environment variable not set!")
+            raise ValueError("ANTHROPIC_API_KEY environment variable is required")
+
+        self._client = AsyncAnthropic(
+            api_key=api_key,
+            http_client=DefaultAsyncHttpxClient(limits=self.limits),
+            max_retries=0,  # retries, timeouts and hedging are handled by resilience.claude_policy
+        )
+        self._loop = loop
+        self.clients_created += 1
+        logger.info("🔌 Created shared Claude client (max_connections=%s, keepalive=%s)",
+                    self.limits.max_connections, self.limits.max_keepalive_connections)
+        return self._client
+
+    async def aclose(self) -> None:
+        """Close the shared client and release its pooled connections."""
+        client, self._client, self._loop = self._client, None, None
+        if client is not None and not client.is_closed():
+            await client.close()
+            self.clients_closed += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool reuse metrics for the /metrics/ endpoint."""
+        total = self.clients_created + self.clients_reused
+        return {
+            "clients_created": self.clients_created,
+            "clients_reused": self.clients_reused,
+            "clients_closed": self.clients_closed,
+            "reuse_ratio": round(self.clients_reused / total, 3) if total else 0.0,
+            "active": self._client is not None and not self._client.is_closed(),
+            "max_connections": self.limits.max_connections,
+            "max_keepalive_connections": self.limits.max_keepalive_connections,
+            "keepalive_expiry": self.limits.keepalive_expiry,
+        }
+
+
+client_manager = ClaudeClientManager()
+
+
+def get_claude_client() -> AsyncAnthropic:
+    """Shared AsyncAnthropic client for the current event loop."""
+    return client_manager.get_client()
+
+
+def get_claude_client_stats() -> Dict[str, Any]:
+    return client_manager.stats()
+
+
+@on_startup
+async def warm_claude_client() -> None:
+    """Create the shared client on the server loop before the first request."""
+    if os.getenv("ANTHROPIC_API_KEY"):
+        get_claude_client()
+
+
+@on_shutdown
+async def close_claude_client() -> None:
+    await client_manager.aclose()
+
+
+# A system prompt: plain text, or content blocks (see cache_block)
+SystemPrompt = Union[str, List[Dict[str, Any]]]
+
+# Shortest prefix (tools + system, plus history for a history breakpoint) Anthropic caches,
+# by model family. The API silently ignores markers on shorter prefixes, so call_claude
+# leaves them off and records the prefix size on the span instead.
+PROMPT_CACHE_MIN_TOKENS = {"haiku": 2048}
+PROMPT_CACHE_MIN_TOKENS_DEFAULT = 1024
+
+
+def cache_min_tokens(model: str) -> int:
+    return next(
+        (tokens for family, tokens in PROMPT_CACHE_MIN_TOKENS.items() if family in model),
+        PROMPT_CACHE_MIN_TOKENS_DEFAULT,
+    )
+
+
+def cache_block(text: str) -> Dict[str, Any]:
+    """
+    System content block marked for Anthropic prompt caching.
+
+    Everything up to and including the block (tools, then system) is cached for ~5
+    minutes, so put static instructions here and keep per-request state in the prompt.
+    Prefixes shorter than the model's minimum (see cache_min_tokens) are not cached.
+    """
+    return {"type": "text", "text": text, "cache_control": {"type": "ephemeral"}}
+
+
+def _without_cache_markers(system: Optional[SystemPrompt]) -> Optional[SystemPrompt]:
+    if not system or isinstance(system, str):
+        return system
+    return [{key: value for key, value in block.items() if key != "cache_control"} for block in system]
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content", "")
+    if isinstance(content, str):
+        return content
+    return "".join(block.get("text", "") for block in content)
+
+
+def _cached_history(history: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Copy of `history` with a cache breakpoint on its last message."""
+    if not history:
+        return []
+    *earlier, last = history
+    content = last["content"]
+    if isinstance(content, str):
+        content = [cache_block(content)]
+    else:
+        content = [*content[:-1], {**content[-1], "cache_control": {"type": "ephemeral"}}]
+    return [*earlier, {**last, "content": content}]
+
+
+_tool_texts: Dict[str, PromptText] = {}
+
+
+def _tool_tokens(tool: Optional[Dict[str, Any]]) -> int:
+    """Approximate tokens of a tool definition, counted once per tool."""
+    if not tool:
+        return 0
+    if tool["name"] not in _tool_texts:
+        _tool_texts[tool["name"]] = PromptText(orjson.dumps(tool).decode())
+    return _tool_texts[tool["name"]].tokens
+
+
+def _system_tokens(system: Optional[SystemPrompt]) -> int:
+    # Counted per block, so PromptText instructions use their cached count
+    if not system:
+        return 0
+    if isinstance(system, str):
+        return count_tokens(system)
+    return sum(count_tokens(block.get("text", "")) for block in system)
+
+
+@traced("claude.call")
 async def call_claude(
     prompt: str,
-    model: str = CLAUDE_MODEL,
-    system: Optional[str] = None,
+    model: Optional[str] = None,
+    system: Optional[SystemPrompt] = None,
     temperature: float = 0.0,
     max_tokens: int = 4096,
+    agent: Optional[str] = None,
+    stream: bool = False,
+    tool: Optional[Dict[str, Any]] = None,
+    history: Optional[List[Dict[str, Any]]] = None,
+    stream_field: Sequence[str] = (),
 ) -> str:
     """
     Reusable async Claude caller using Sonnet 3.5.
 
     Args:
         prompt (str): The user prompt to send.
-        model (str): Claude model ID (default: Sonnet 3.5).
-        system (Optional[str]): Optional system instruction.
+        model (Optional[str]): Claude model ID (default: the agent's model, see model_for).
+        system (Optional[SystemPrompt]): Optional system instruction, as text or as content
+            blocks; wrap static instructions in cache_block() to use prompt caching.
         temperature (float): Sampling randomness (default deterministic).
         max_tokens (int): Max output tokens from Claude (default 4096).
+        agent (Optional[str]): Calling agent name; selects the response cache TTL.
+        stream (bool): Stream tokens to the active /chat/stream/ response as they arrive.
+            Ignored outside a streaming request.
+        tool (Optional[Dict[str, Any]]): Tool definition (name, description, input_schema)
+            Claude is forced to call; see structured.call_structured.
+        history (Optional[List[Dict[str, Any]]]): Earlier turns of the conversation, as
+            alternating user / assistant messages; `prompt` is sent as the next user turn.
+            The last history message is marked for prompt caching once the prefix through
+            it is long enough to cache, so each call only processes the newly appended turns.
+        stream_field (Sequence[str]): With `tool`, the key path of the string field in its
+            input to stream, e.g. ("diagnosis", "explanation"); the rest of the tool input
+            is never streamed. Without it, a forced tool call streams nothing.
 
     Returns:
-        str: Claude's plain text response.
-    """
-    api_key = os.getenv("ANTHROPIC_API_KEY")
-    if not api_key:
-        print("❌ ANTHROPIC_API_KEY environment variable not set!")
-        raise ValueError("ANTHROPIC_API_KEY environment variable is required")
-    
-    print(f"🤖 Claude API call - Model: {model}, Temperature: {temperature}")
-    
-    client = AsyncAnthropic(api_key=api_key)
-    messages = [{"role": "user", "content": prompt}]
+        str: Claude's plain text response, or the forced tool's input as JSON text.
+    """
+    model = model or model_for(agent)
+    stream = stream and streaming_enabled()
+    annotate(**{"llm.model": model, "llm.agent": agent, "llm.stream": stream})
+    budget = get_current_budget()
+    cache_key = None
+    cache_ttl = cache_ttl_for(agent)
+    if llm_cache.enabled and cache_ttl > 0 and temperature <= LLM_CACHE_MAX_TEMPERATURE:
+        cache_key = make_cache_key(model, system, [*history, prompt] if history else prompt, temperature, max_tokens, tool)
+        cached = await llm_cache.get(cache_key)
+        if cached is not None:
+            logger.debug("⚡ Claude cache hit (%s)", agent)
+            annotate(**{"llm.cache_hit": True})
+            if budget:
+                budget.record_cache_hit()
+            if stream:
+                _emit_whole(agent, cached, tool, stream_field)
+            return cached
+
+    system_tokens = _system_tokens(system)
+    history_tokens = sum(count_tokens(_message_text(message)) for message in history or [])
+    prompt_tokens = count_tokens(prompt) + system_tokens + history_tokens
+    logger.debug("🤖 Claude API call - Model: %s, Temperature: %s, ~%s prompt tokens (%s)",
+                 model, temperature, prompt_tokens, agent)
+    if budget:
+        budget.record_prompt(agent, prompt_tokens)
+
+    fixture_key = None
+    if llm_fixtures.mode != "off":
+        fixture_key = cache_key or make_cache_key(
+            model, system, [*history, prompt] if history else prompt, temperature, max_tokens, tool
+        )
+        if llm_fixtures.replaying:
+            fixture = await llm_fixtures.replay(fixture_key)
+            if fixture is not None:
+                response_text = _replay_fixture(fixture, agent, budget)
+                if stream:
+                    _emit_whole(agent, response_text, tool, stream_field)
+                return response_text
+
+    client = get_claude_client()
+    prefix_tokens = _tool_tokens(tool) + system_tokens
+    min_cache_tokens = cache_min_tokens(model)
+    if prefix_tokens < min_cache_tokens:
+        system = _without_cache_markers(system)
+    if prefix_tokens + history_tokens >= min_cache_tokens:
+        messages = _cached_history(history)
+    else:
+        messages = list(history or [])
+    messages.append({"role": "user", "content": prompt})
+    annotate(**{"llm.cache_prefix_tokens": prefix_tokens + history_tokens})
+
+    request = {
+        "model": model,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "messages": messages,
+    }
     if system:
-        messages.insert(0, {"role": "system", "content": system})
+        # The Messages API takes the system prompt as a top-level parameter, not a message role
+        request["system"] = system
+    if tool:
+        request["tools"] = [tool]
+        request["tool_choice"] = {"type": "tool", "name": tool["name"]}
 
     try:
-        response = await client.messages.create(
-            model=model,
-            max_tokens=max_tokens,
-            temperature=temperature,
-            messages=messages
+        if stream:
+            operation = lambda: _stream_message(client, request, agent, stream_field)
+        else:
+            operation = lambda: client.messages.create(**request)
+        started = time.monotonic()
+        response = await claude_policy.call(
+            operation,
+            streaming=stream,
+            deadline=budget.remaining_time() if budget else None,
+            slot=lambda: _limiter_slot(budget.user_id if budget else None, prompt_tokens),
         )
-        
-        result = response.content[0].text.strip()
-        print(f"✅ Claude response received ({len(result)} chars)")
+        latency = time.monotonic() - started
+
+        annotate(**{
+            "llm.prompt_tokens_estimate": prompt_tokens,
+            "llm.input_tokens": response.usage.input_tokens,
+            "llm.output_tokens": response.usage.output_tokens,
+            "llm.cache_read_tokens": getattr(response.usage, "cache_read_input_tokens", 0) or 0,
+        })
+        if budget:
+            budget.record_call(
+                response.usage.input_tokens,
+                response.usage.output_tokens,
+                cache_read_tokens=getattr(response.usage, "cache_read_input_tokens", 0) or 0,
+                cache_creation_tokens=getattr(response.usage, "cache_creation_input_tokens", 0) or 0,
+            )
+
+        result = _response_text(response)
+        logger.debug("✅ Claude response received (%s chars)", len(result))
+        if cache_key and result:
+            await llm_cache.set(cache_key, result, cache_ttl)
+        if llm_fixtures.recording:
+            await llm_fixtures.record(
+                fixture_key, result, latency,
+                agent=agent,
+                model=model,
+                input_tokens=response.usage.input_tokens,
+                output_tokens=response.usage.output_tokens,
+                cache_read_tokens=getattr(response.usage, "cache_read_input_tokens", 0) or 0,
+                cache_creation_tokens=getattr(response.usage, "cache_creation_input_tokens", 0) or 0,
+            )
         return result
-        
+
+    except Exception as e:
+        logger.warning("❌ Claude API error (%s): %s", agent, e)
+        if budget:
+            budget.record_call()  # failed calls still count against the request
+        raise
+
+
+@asynccontextmanager
+async def _limiter_slot(user: Optional[str], prompt_tokens: int):
+    """
+    A fair share of the worker's request / token rate for one request sent to Claude.
+    Retries and hedged duplicates each take their own; actual input tokens correct the
+    reservation when the request succeeded.
+    """
+    with span("llm.queue_wait"):
+        ticket = await llm_limiter.acquire(user, prompt_tokens)
+    held: Dict[str, Any] = {}
+    try:
+        yield held
+    finally:
+        response = held.get("result")
+        llm_limiter.release(ticket, response.usage.input_tokens if response is not None else None)
+
+
+def _replay_fixture(fixture: Dict[str, Any], agent: Optional[str], budget) -> str:
+    """Serve a recorded response (LLM_FIXTURE_MODE=replay) with its recorded usage."""
+    logger.debug("📼 Replaying recorded Claude response (%s)", agent)
+    annotate(**{
+        "llm.fixture": True,
+        "llm.input_tokens": fixture.get("input_tokens", 0),
+        "llm.output_tokens": fixture.get("output_tokens", 0),
+    })
+    if budget:
+        budget.record_call(
+            fixture.get("input_tokens", 0),
+            fixture.get("output_tokens", 0),
+            cache_read_tokens=fixture.get("cache_read_tokens", 0),
+            cache_creation_tokens=fixture.get("cache_creation_tokens", 0),
+        )
+    return fixture["response"]
+
+
+def _response_text(response) -> str:
+    """Text of a Messages API response; a tool_use block is returned as its JSON input."""
+    for block in response.content:
+        if block.type == "tool_use":
+            return orjson.dumps(block.input).decode()
+    return "".join(block.text for block in response.content if block.type == "text").strip()
+
+
+def _emit_whole(agent: Optional[str], response_text: str, tool: Optional[Dict[str, Any]], stream_field: Sequence[str]) -> None:
+    """Stream a response that is already complete (cache hit, replayed fixture) as one token event."""
+    if tool:
+        response_text = JsonFieldStream(stream_field).feed(response_text) if stream_field else ""
+    if response_text:
+        emit_event("token", {"agent": agent, "text": response_text})
+
+
+async def _stream_message(client: AsyncAnthropic, request: Dict[str, Any], agent: Optional[str],
+                          stream_field: Sequence[str] = ()):
+    """
+    Use the streaming Messages API, forwarding text deltas as SSE token events. For a forced
+    tool call only the `stream_field` string of its input is forwarded, as it is decoded.
+
+    A failure after the first token raises StreamInterruptedError, which is not retried:
+    the client already has part of the answer and a retry would duplicate it.
+    """
+    emitted = False
+    field = JsonFieldStream(stream_field) if stream_field else None
+    try:
+        async with client.messages.stream(**request) as stream:
+            async for event in stream:
+                if event.type == "text":
+                    text = event.text
+                elif event.type == "input_json" and field is not None:
+                    text = field.feed(event.partial_json)
+                else:
+                    continue
+                if not text:
+                    continue
+                emit_event("token", {"agent": agent, "text": text})
+                emitted = True
+            return await stream.get_final_message()
     except Exception as e:
-        print(f"❌ Claude API error: {e}")
+        if emitted:
+            raise StreamInterruptedError(f"Claude stream interrupted: {e}") from e
         raise
@@ -0,0 +1,60 @@
+from typing import Any, Dict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from .lifecycle import on_shutdown
+from .tracing import span
+
+# Longest SQL text recorded on a db.query span
+TRACE_SQL_MAX_CHARS = 300
+
+
+def trace_db_query(execute, sql, params, many, context):
+    """Execute wrapper recording each query as a db.query span of the current request trace."""
+    with span("db.query", **{"db.statement": sql[:TRACE_SQL_MAX_CHARS], "db.alias": context["connection"].alias}) as active:
+        result = execute(sql, params, many, context)
+        if active is not None and context["cursor"].rowcount >= 0:
+            active.set(**{"db.rows": context["cursor"].rowcount})
+        return result
+
+
+def install_db_tracing(sender, connection, **kwargs):
+    # Pooled connections fire connection_created on every checkout; install the wrapper once
+    if trace_db_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(trace_db_query)
+
+
+connection_created.connect(install_db_tracing)
+
+
+def get_db_pool_stats(alias: str = "default") -> Dict[str, Any]:
+    """
+    Connection pool metrics for the /metrics/ endpoint.
+
+    With the psycopg pool this reports psycopg_pool's counters plus a saturation
+    ratio (connections in use / max size); other profiles only report their mode.
+    """
+    stats: Dict[str, Any] = {"mode": getattr(settings, "DB_POOL_MODE", "none")}
+    pool = getattr(connections[alias], "pool", None)
+    if pool is None:
+        return stats
+
+    pool_stats = pool.get_stats()
+    in_use = pool_stats.get("pool_size", 0) - pool_stats.get("pool_available", 0)
+    stats.update(pool_stats)
+    stats["in_use"] = in_use
+    stats["saturation"] = round(in_use / pool.max_size, 3) if pool.max_size else 0.0
+    return stats
+
+
+@on_shutdown
+async def close_db_pools() -> None:
+    """Close pooled Postgres connections when the worker exits."""
+    def close_pools():
+        for conn in connections.all(initialized_only=True):
+            if hasattr(conn, "close_pool"):
+                conn.close_pool()
+    await sync_to_async(close_pools)()
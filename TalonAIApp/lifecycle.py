@@ -0,0 +1,51 @@
+import logging
+from typing import Awaitable, Callable, List
+
+logger = logging.getLogger(__name__)
+
+# Async hooks run by the ASGI lifespan wrapper in TalonAILinux/asgi.py
+Hook = Callable[[], Awaitable[None]]
+
+_startup_hooks: List[Hook] = []
+_shutdown_hooks: List[Hook] = []
+
+# True between lifespan startup and shutdown, i.e. shutdown hooks are guaranteed to run
+_running = False
+
+
+def on_startup(hook: Hook) -> Hook:
+    """Register an async hook to run when the ASGI server starts."""
+    _startup_hooks.append(hook)
+    return hook
+
+
+def on_shutdown(hook: Hook) -> Hook:
+    """Register an async hook to run when the ASGI server shuts down."""
+    _shutdown_hooks.append(hook)
+    return hook
+
+
+def lifespan_running() -> bool:
+    """Whether the server ran startup hooks and will run shutdown hooks on exit."""
+    return _running
+
+
+async def run_startup_hooks() -> None:
+    global _running
+    _running = True
+    for hook in _startup_hooks:
+        try:
+            await hook()
+        except Exception as e:
+            logger.exception("⚠️ Startup hook %s failed: %s", hook.__name__, e)
+
+
+async def run_shutdown_hooks() -> None:
+    global _running
+    _running = False
+    # Shut down in reverse registration order
+    for hook in reversed(_shutdown_hooks):
+        try:
+            await hook()
+        except Exception as e:
+            logger.exception("⚠️ Shutdown hook %s failed: %s", hook.__name__, e)
@@ -0,0 +1,206 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional
+
+# Outbound Claude request limits for this worker process
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "16"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "50"))
+LLM_INPUT_TOKENS_PER_MINUTE = int(os.getenv("LLM_INPUT_TOKENS_PER_MINUTE", "40000"))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "30"))  # max seconds a call waits for a slot
+
+
+class LLMQueueTimeout(RuntimeError):
+    """A Claude call waited longer than LLM_QUEUE_TIMEOUT for the rate limiter."""
+
+
+class TokenBucket:
+    """Bucket holding up to `per_minute` units, refilled continuously."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is now)."""
+        self._refill()
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        self._refill()
+        self.level -= amount
+
+    def give_back(self, amount: float) -> None:
+        self._refill()
+        self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    __slots__ = ("user", "tokens", "enqueued_at", "future")
+
+    def __init__(self, user: str, tokens: int):
+        self.user = user
+        self.tokens = tokens
+        self.enqueued_at = time.monotonic()
+        self.future: Optional[asyncio.Future] = None
+
+
+class LLMRateLimiter:
+    """
+    Concurrency + requests-per-minute + input-tokens-per-minute limiter for Claude calls,
+    with round-robin fairness across users.
+
+    Calls that can't start immediately wait in a per-user FIFO queue; whenever capacity
+    frees up, users with waiting calls are served in rotation, so one chatty user_id
+    queues behind their own calls instead of everyone else's. Token reservations use
+    the prompt's estimated size and are corrected with the actual usage on release.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_minute: int = LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute: int = LLM_INPUT_TOKENS_PER_MINUTE,
+        queue_timeout: float = LLM_QUEUE_TIMEOUT,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.in_flight = 0
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()  # users in rotation order
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.granted = 0
+        self.queued = 0
+        self.timeouts = 0
+        self.throttled: Dict[str, int] = {"concurrency": 0, "requests_per_minute": 0, "tokens_per_minute": 0}
+        self._waits: Deque[float] = deque(maxlen=500)
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _blocked_for(self, ticket: Ticket) -> Optional[tuple]:
+        """(reason, seconds until retry) if `ticket` can't start now; seconds is None for concurrency."""
+        if self.in_flight >= self.max_concurrency:
+            return "concurrency", None
+        wait = self.requests.wait_time(1)
+        if wait > 0:
+            return "requests_per_minute", wait
+        wait = self.tokens.wait_time(ticket.tokens)
+        if wait > 0:
+            return "tokens_per_minute", wait
+        return None
+
+    def _grant(self, ticket: Ticket) -> None:
+        self.in_flight += 1
+        self.requests.take(1)
+        self.tokens.take(ticket.tokens)
+        self.granted += 1
+        self._waits.append(time.monotonic() - ticket.enqueued_at)
+
+    async def acquire(self, user: Optional[str], tokens: int) -> Ticket:
+        """Wait for a slot; raises LLMQueueTimeout after queue_timeout seconds."""
+        ticket = Ticket(user or "anonymous", min(max(tokens, 1), int(self.tokens.capacity)))
+        if not self._queues and self._blocked_for(ticket) is None:
+            self._grant(ticket)
+            return ticket
+
+        ticket.future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(ticket.user, deque()).append(ticket)
+        self.queued += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(ticket.future), self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if ticket.future.done() and not ticket.future.cancelled():
+                # Granted just as we gave up: hand the slot back
+                self.release(ticket)
+            else:
+                ticket.future.cancel()
+                self._remove(ticket)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timeouts += 1
+                raise LLMQueueTimeout(
+                    f"Waited {self.queue_timeout:g}s for an LLM slot (queue depth {self.queue_depth})"
+                ) from e
+            raise
+        return ticket
+
+    def release(self, ticket: Ticket, input_tokens: Optional[int] = None) -> None:
+        """Free the slot; `input_tokens` (actual usage) corrects the token reservation."""
+        self.in_flight -= 1
+        if input_tokens is not None:
+            difference = ticket.tokens - input_tokens
+            if difference > 0:
+                self.tokens.give_back(difference)
+            elif difference < 0:
+                self.tokens.take(-difference)
+        self._dispatch()
+
+    def _remove(self, ticket: Ticket) -> None:
+        queue = self._queues.get(ticket.user)
+        if queue and ticket in queue:
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user]
+
+    def _dispatch(self) -> None:
+        """Grant waiting tickets round-robin across users while capacity allows."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._queues:
+            user, queue = next(iter(self._queues.items()))
+            ticket = queue[0]
+            blocked = self._blocked_for(ticket)
+            if blocked is not None:
+                reason, retry_in = blocked
+                self.throttled[reason] += 1
+                if retry_in is not None:
+                    self._timer = asyncio.get_running_loop().call_later(retry_in, self._dispatch)
+                return
+            queue.popleft()
+            # Served: move this user to the back of the rotation
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            if ticket.future.done():
+                continue  # gave up while queued
+            self._grant(ticket)
+            ticket.future.set_result(None)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+        return {
+            "in_flight": self.in_flight,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.queue_depth,
+            "queued_users": len(self._queues),
+            "granted": self.granted,
+            "queued": self.queued,
+            "queue_timeouts": self.timeouts,
+            "throttled": dict(self.throttled),
+            "wait_avg": round(sum(waits) / len(waits), 4) if waits else 0.0,
+            "wait_p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))], 4) if waits else 0.0,
+            "wait_max": round(waits[-1], 4) if waits else 0.0,
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level),
+        }
+
+
+llm_limiter = LLMRateLimiter()
+
+
+def get_limiter_stats() -> Dict[str, Any]:
+    return llm_limiter.stats()
@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from .lifecycle import on_shutdown
+
+logger = logging.getLogger(__name__)
+
+# Opt-in: cached answers are only served when LLM_CACHE_ENABLED=True
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "False") == "True"
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+LLM_CACHE_REDIS_URL = os.getenv("LLM_CACHE_REDIS_URL") or os.getenv("REDIS_URL")
+# Only low-temperature calls are deterministic enough to reuse
+LLM_CACHE_MAX_TEMPERATURE = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.3"))
+
+# Seconds a cached response stays valid, per calling agent.
+# Override with LLM_CACHE_TTL_<AGENT>, e.g. LLM_CACHE_TTL_DIAGNOSTIC=600; 0 disables.
+AGENT_CACHE_TTLS = {
+    "planner": 300,
+    "profile_updater": 600,
+    "info": 3600,
+    "diagnostic": 3600,
+    "modcoach": 3600,
+    "buildplanner": 3600,
+}
+
+
+def cache_ttl_for(agent: Optional[str]) -> int:
+    """TTL in seconds for an agent's responses (0 = don't cache)."""
+    if not agent:
+        return 0
+    override = os.getenv(f"LLM_CACHE_TTL_{agent.upper()}")
+    if override is not None:
+        return int(override)
+    return AGENT_CACHE_TTLS.get(agent, 0)
+
+
+def make_cache_key(
+    model: str,
+    system: Any,
+    prompt: Any,
+    temperature: float,
+    max_tokens: int,
+    tool: Any = None,
+) -> str:
+    """Content address for a Claude request: identical inputs map to the same key."""
+    payload = json.dumps(
+        [model, system, prompt, temperature, max_tokens, tool],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return "llm:" + hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LRUTier:
+    """In-process LRU with per-entry expiry."""
+
+    def __init__(self, max_entries: int = LLM_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: str, ttl: int) -> None:
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RedisTier:
+    """Optional shared tier; any Redis failure degrades to a cache miss."""
+
+    def __init__(self, url: Optional[str] = LLM_CACHE_REDIS_URL):
+        self.url = url
+        self._client = None
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.url)
+
+    def _get_client(self):
+        if self._client is None:
+            import redis.asyncio as redis  # only imported when a Redis URL is configured
+            self._client = redis.from_url(self.url, decode_responses=True)
+        return self._client
+
+    async def get(self, key: str) -> Optional[Tuple[str, int]]:
+        try:
+            # GET and TTL in one round trip
+            async with self._get_client().pipeline(transaction=False) as pipe:
+                value, ttl = await pipe.get(key).ttl(key).execute()
+            return (value, ttl) if value is not None else None
+        except Exception as e:
+            self.errors += 1
+            logger.warning("⚠️ LLM cache Redis get failed: %s", e)
+            return None
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        try:
+            await self._get_client().set(key, value, ex=ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("⚠️ LLM cache Redis set failed: %s", e)
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class LLMResponseCache:
+    """Two-tier (LRU, then Redis) cache of Claude text responses."""
+
+    def __init__(self, enabled: bool = LLM_CACHE_ENABLED):
+        self.enabled = enabled
+        self.lru = LRUTier()
+        self.redis = RedisTier()
+        self.hits = {"lru": 0, "redis": 0}
+        self.misses = 0
+        self.stores = 0
+
+    async def get(self, key: str) -> Optional[str]:
+        value = self.lru.get(key)
+        if value is not None:
+            self.hits["lru"] += 1
+            return value
+
+        if self.redis.enabled:
+            found = await self.redis.get(key)
+            if found is not None:
+                value, ttl = found
+                self.hits["redis"] += 1
+                # Promote to the local tier for the remainder of its lifetime
+                if ttl > 0:
+                    self.lru.set(key, value, ttl)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str, ttl: int) -> None:
+        self.stores += 1
+        self.lru.set(key, value, ttl)
+        if self.redis.enabled:
+            await self.redis.set(key, value, ttl)
+
+    def stats(self) -> Dict[str, Any]:
+        hits = self.hits["lru"] + self.hits["redis"]
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "stores": self.stores,
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "lru_entries": len(self.lru),
+            "redis_enabled": self.redis.enabled,
+            "redis_errors": self.redis.errors,
+        }
+
+
+llm_cache = LLMResponseCache()
+
+
+@on_shutdown
+async def close_llm_cache() -> None:
+    await llm_cache.redis.aclose()
+
+
+def get_llm_cache_stats() -> Dict[str, Any]:
+    return llm_cache.stats()
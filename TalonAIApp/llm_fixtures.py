@@ -0,0 +1,125 @@
+import asyncio
+import gzip
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+# Record / replay of Claude responses, for profiling and comparing planner variants offline.
+#   record - live calls; each response is appended to LLM_FIXTURE_PATH
+#   replay - responses are served from LLM_FIXTURE_PATH, no network
+LLM_FIXTURE_MODE = os.getenv("LLM_FIXTURE_MODE", "off")
+LLM_FIXTURE_PATH = os.getenv("LLM_FIXTURE_PATH", "llm_fixtures.jsonl.gz")  # ".gz" = gzip-compressed JSONL
+# Replay waits the recorded latency times this factor (0 = answer immediately)
+LLM_FIXTURE_LATENCY_SCALE = float(os.getenv("LLM_FIXTURE_LATENCY_SCALE", "0"))
+# Replay: a request with no fixture raises FixtureMissError instead of calling Claude
+LLM_FIXTURE_STRICT = os.getenv("LLM_FIXTURE_STRICT", "True") == "True"
+
+
+class FixtureMissError(LookupError):
+    """Replay mode found no recorded response for a Claude request."""
+
+
+def _open(path: str, mode: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+class LLMFixtureStore:
+    """
+    On-disk (prompt hash → response, usage, latency) store, one JSON object per line.
+
+    Keys are llm_cache.make_cache_key of the request, so any change to the model, system
+    prompt, messages, temperature or tool schema is a different fixture. Recording the
+    same request again appends a new line; on load the last one wins.
+    """
+
+    def __init__(
+        self,
+        mode: str = LLM_FIXTURE_MODE,
+        path: str = LLM_FIXTURE_PATH,
+        latency_scale: float = LLM_FIXTURE_LATENCY_SCALE,
+        strict: bool = LLM_FIXTURE_STRICT,
+    ):
+        if mode not in ("off", "record", "replay"):
+            raise ValueError(f"LLM_FIXTURE_MODE must be off, record or replay, not {mode!r}")
+        self.mode = mode
+        self.path = path
+        self.latency_scale = latency_scale
+        self.strict = strict
+        self._fixtures: Optional[Dict[str, Dict[str, Any]]] = None
+        self._write_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.recorded = 0
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        fixtures: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.path):
+            return fixtures
+        with _open(self.path, "r") as file:
+            for line in file:
+                if line.strip():
+                    fixture = json.loads(line)
+                    fixtures[fixture["key"]] = fixture
+        return fixtures
+
+    async def _ensure_loaded(self) -> Dict[str, Dict[str, Any]]:
+        if self._fixtures is None:
+            fixtures = await asyncio.to_thread(self._load)
+            if self._fixtures is None:  # concurrent first calls may both load; keep one
+                self._fixtures = fixtures
+        return self._fixtures
+
+    async def replay(self, key: str) -> Optional[Dict[str, Any]]:
+        """Recorded fixture for `key`, after its (scaled) recorded latency; None on a non-strict miss."""
+        fixture = (await self._ensure_loaded()).get(key)
+        if fixture is None:
+            self.misses += 1
+            if self.strict:
+                raise FixtureMissError(f"No recorded Claude response for {key} in {self.path}")
+            return None
+        self.hits += 1
+        if self.latency_scale > 0:
+            await asyncio.sleep(fixture.get("latency", 0) * self.latency_scale)
+        return fixture
+
+    def _append(self, fixture: Dict[str, Any]) -> None:
+        line = json.dumps(fixture, separators=(",", ":"), ensure_ascii=False) + "\n"
+        # Appending a gzip member per line keeps the file valid; the lock keeps lines whole
+        with self._write_lock, _open(self.path, "a") as file:
+            file.write(line)
+
+    async def record(self, key: str, response: str, latency: float, **details: Any) -> None:
+        fixture = {"key": key, "response": response, "latency": round(latency, 4), "recorded_at": time.time(), **details}
+        fixtures = await self._ensure_loaded()
+        await asyncio.to_thread(self._append, fixture)
+        fixtures[key] = fixture
+        self.recorded += 1
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "path": self.path if self.mode != "off" else None,
+            "fixtures": len(self._fixtures) if self._fixtures is not None else None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "recorded": self.recorded,
+        }
+
+
+llm_fixtures = LLMFixtureStore()
+
+
+def get_llm_fixture_stats() -> Dict[str, Any]:
+    return llm_fixtures.stats()
@@ -0,0 +1,140 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Any, Dict, Optional
+
+import orjson
+from django.conf import settings
+
+from .tracing import current_span
+
+# Profile, level and payload sample rate are configured in settings (LOG_PROFILE etc.):
+# "development" logs readable lines with debug payloads, "production" logs JSON lines with
+# payloads summarized (key names and sizes, never whole states)
+LOG_PAYLOAD_MAX_CHARS = int(os.getenv("LOG_PAYLOAD_MAX_CHARS", "2000"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# LogRecord attributes; anything else on a record came from `extra=`
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message, trace id and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS:
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return orjson.dumps(entry, default=str).decode()
+
+
+class ConsoleFormatter(logging.Formatter):
+    """Readable development format; a sampled debug payload goes on its own line."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        data = getattr(record, "data", None)
+        return f"{text}\n📊 {data}" if data is not None else text
+
+
+class AsyncQueueHandler(logging.handlers.QueueHandler):
+    """
+    Non-blocking handler: the calling thread (usually the event loop) only enqueues the
+    record; formatting and the write to stdout happen on a QueueListener thread. When the
+    queue is full, records are dropped and counted rather than blocking the request.
+    """
+
+    def __init__(self, json: bool = False, stream=None, maxsize: int = LOG_QUEUE_SIZE):
+        super().__init__(queue.Queue(maxsize))
+        target = logging.StreamHandler(stream or sys.stdout)
+        target.setFormatter(JsonFormatter() if json else ConsoleFormatter())
+        self.dropped = 0
+        self.listener = logging.handlers.QueueListener(self.queue, target, respect_handler_level=False)
+        self.listener.start()
+        atexit.register(self.close)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Merge %-args now (they may be mutated after we return) but leave the
+        # formatting itself, JSON included, to the listener thread
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        trace_span = current_span()
+        if trace_span is not None:
+            record.trace_id = trace_span.trace.trace_id
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self) -> None:
+        if self.listener._thread is not None:
+            self.listener.stop()
+        super().close()
+
+
+def summarize(data: Any) -> Any:
+    """Shape of a payload without its content: dict keys with value sizes, string lengths."""
+    if isinstance(data, dict):
+        return {key: _size(value) for key, value in data.items()}
+    return _size(data)
+
+
+def _size(value: Any) -> Any:
+    if isinstance(value, (dict, list, tuple, set)):
+        return f"<{type(value).__name__}:{len(value)}>"
+    if isinstance(value, str):
+        return value if len(value) <= 80 else f"<str:{len(value)}>"
+    return value
+
+
+def log_payload(logger: logging.Logger, message: str, data: Any = None, level: int = logging.DEBUG) -> None:
+    """
+    Log `message` with an optional verbose payload.
+
+    Nothing is serialized unless the level is enabled. Payloads are attached to a
+    settings.LOG_PAYLOAD_SAMPLE_RATE share of records; the production profile logs their shape
+    (see summarize) and the development profile a truncated JSON dump.
+    """
+    if not logger.isEnabledFor(level):
+        return
+    if data is None or random.random() >= settings.LOG_PAYLOAD_SAMPLE_RATE:
+        logger.log(level, message)
+        return
+    if settings.LOG_PROFILE == "production":
+        payload = summarize(data)
+    else:
+        payload = orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS).decode()
+        if len(payload) > LOG_PAYLOAD_MAX_CHARS:
+            payload = payload[:LOG_PAYLOAD_MAX_CHARS] + f"... ({len(payload)} chars)"
+    logger.log(level, message, extra={"data": payload})
+
+
+def get_log_handler_stats() -> Optional[Dict[str, Any]]:
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, AsyncQueueHandler):
+            return {"queued": handler.queue.qsize(), "dropped": handler.dropped}
+    return None
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from TalonAIApp.memory import MEMORY_DAYS_TO_KEEP, MEMORY_MAX_PER_USER, prune_memories
+from TalonAIApp.models import ConversationMemory
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply conversation memory retention across all users: delete memories older "
+        "than --days and all but the newest --max-per-user per user. Run on a schedule "
+        "(e.g. hourly cron); the app itself only prunes users it has just written for."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--days", type=int, default=MEMORY_DAYS_TO_KEEP)
+        parser.add_argument("--max-per-user", type=int, default=MEMORY_MAX_PER_USER)
+        parser.add_argument(
+            "--batch-size", type=int, default=500,
+            help="Users pruned per batch, to keep each delete short"
+        )
+
+    def handle(self, *args, **options):
+        user_ids = list(
+            ConversationMemory.objects.order_by().values_list("user_id", flat=True).distinct()
+        )
+        batch_size = options["batch_size"]
+        deleted = 0
+        for start in range(0, len(user_ids), batch_size):
+            deleted += prune_memories(
+                user_ids[start:start + batch_size],
+                max_memories=options["max_per_user"],
+                days_to_keep=options["days"],
+            )
+        self.stdout.write(f"🧹 Pruned {deleted} memories for {len(user_ids)} users")
@@ -1,11 +1,216 @@
+import asyncio
+import contextvars
 import json
-from typing import List, Dict, Any
-from django.db import models
+import logging
+import os
+import time
+from typing import List, Dict, Any, Awaitable, Iterable, Optional
+from django.db import close_old_connections, models
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 from datetime import timedelta
 from .models import ConversationMemory
+from .lifecycle import lifespan_running, on_shutdown
 from asgiref.sync import sync_to_async
 
+logger = logging.getLogger(__name__)
+
+# Write-behind queue for ConversationMemory inserts
+MEMORY_WRITE_BATCH_SIZE = int(os.getenv("MEMORY_WRITE_BATCH_SIZE", "50"))
+MEMORY_WRITE_FLUSH_INTERVAL = float(os.getenv("MEMORY_WRITE_FLUSH_INTERVAL", "1.0"))  # max seconds a row waits
+MEMORY_QUEUE_MAX_SIZE = int(os.getenv("MEMORY_QUEUE_MAX_SIZE", "1000"))
+
+# Retention, applied in bulk every MEMORY_RETENTION_INTERVAL seconds
+MEMORY_RETENTION_INTERVAL = float(os.getenv("MEMORY_RETENTION_INTERVAL", "300"))
+MEMORY_MAX_PER_USER = int(os.getenv("MEMORY_MAX_PER_USER", "10"))
+MEMORY_DAYS_TO_KEEP = int(os.getenv("MEMORY_DAYS_TO_KEEP", "7"))
+PRUNE_DELETE_CHUNK = 1000
+
+def _report_db_error(e: Exception) -> None:
+    logger.warning("⚠️ Error storing conversation memory: %s", e)
+    # Check if it's a table doesn't exist error
+    if "does not exist" in str(e):
+        logger.warning("💡 Database table missing - run migrations: python manage.py migrate")
+    # Check if it's a connection pool error
+    elif "MaxClientsInSessionMode" in str(e) or "max clients reached" in str(e):
+        logger.warning("💡 Database pool limit reached - skipping memory storage")
+
+def prune_memories(
+    user_ids: Optional[Iterable[str]] = None,
+    max_memories: int = MEMORY_MAX_PER_USER,
+    days_to_keep: int = MEMORY_DAYS_TO_KEEP
+) -> int:
+    """
+    Apply memory retention in bulk: delete memories older than days_to_keep and all
+    but the newest max_memories per user. Limited to `user_ids` when given.
+    Returns the number of rows deleted.
+    """
+    memories = ConversationMemory.objects.all()
+    if user_ids is not None:
+        memories = memories.filter(user_id__in=list(user_ids))
+
+    cutoff_date = timezone.now() - timedelta(days=days_to_keep)
+    deleted, _ = memories.filter(created_at__lt=cutoff_date).delete()
+
+    # Rank each user's memories newest-first in one query
+    excess_ids = list(
+        memories.annotate(
+            rank=Window(RowNumber(), partition_by=[F("user_id")], order_by=F("created_at").desc())
+        ).filter(rank__gt=max_memories).values_list("id", flat=True)
+    )
+    for start in range(0, len(excess_ids), PRUNE_DELETE_CHUNK):
+        chunk, _ = ConversationMemory.objects.filter(id__in=excess_ids[start:start + PRUNE_DELETE_CHUNK]).delete()
+        deleted += chunk
+    return deleted
+
+async def _outside_request(work: Awaitable[None]) -> None:
+    """
+    Run DB work from a background task. No request_started/request_finished signals
+    fire there, so stale connections are closed (returned to the pool) around it.
+    """
+    await sync_to_async(close_old_connections)()
+    try:
+        await work
+    finally:
+        await sync_to_async(close_old_connections)()
+
+class MemoryWriter:
+    """
+    Write-behind queue for conversation memory.
+
+    Requests enqueue an unsaved ConversationMemory and return immediately; a
+    background task inserts queued rows with bulk_create (up to batch_size rows,
+    or whatever arrived within flush_interval) and periodically prunes old
+    memories of the users it wrote for. The queue is flushed on shutdown.
+
+    The task runs in an empty context rather than the first caller's, so its DB work
+    is not traced into (or kept on the connection of) whichever request started it.
+
+    Without an ASGI lifespan there is no shutdown flush, so rows are written inline.
+    """
+
+    def __init__(
+        self,
+        batch_size: int = MEMORY_WRITE_BATCH_SIZE,
+        flush_interval: float = MEMORY_WRITE_FLUSH_INTERVAL,
+        max_queue_size: int = MEMORY_QUEUE_MAX_SIZE,
+        retention_interval: float = MEMORY_RETENTION_INTERVAL
+    ):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.retention_interval = retention_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending_users: set = set()
+        self._last_retention = time.monotonic()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+        self.pruned = 0
+
+    async def enqueue(self, memory: ConversationMemory) -> None:
+        if not lifespan_running():
+            await self._write_batch([memory])
+            await self._maybe_run_retention()
+            return
+
+        if self._task is None or self._task.done():
+            self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+            self._task = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+        try:
+            self._queue.put_nowait(memory)
+            self.enqueued += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+            logger.warning("⚠️ Memory write queue full - dropping conversation memory")
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            first = await self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            stop = False
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    memory = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if memory is None:
+                    stop = True
+                    break
+                batch.append(memory)
+
+            await _outside_request(self._write_batch(batch))
+            if stop:
+                return
+            await _outside_request(self._maybe_run_retention())
+
+    async def _write_batch(self, batch: List[ConversationMemory]) -> None:
+        try:
+            await ConversationMemory.objects.abulk_create(batch)
+            self.written += len(batch)
+            self.batches += 1
+            self._pending_users.update(memory.user_id for memory in batch)
+        except Exception as e:
+            self.failed += len(batch)
+            _report_db_error(e)
+            # Don't raise the error - memory storage is not critical
+
+    async def _maybe_run_retention(self) -> None:
+        if time.monotonic() - self._last_retention >= self.retention_interval:
+            await self.run_retention()
+
+    async def run_retention(self) -> None:
+        """Prune memories of every user written since the last run."""
+        users, self._pending_users = self._pending_users, set()
+        self._last_retention = time.monotonic()
+        if not users:
+            return
+        try:
+            self.pruned += await sync_to_async(prune_memories)(users)
+        except Exception as e:
+            logger.warning("⚠️ Error cleaning up old memories: %s", e)
+            # Don't raise the error - cleanup is not critical
+
+    async def close(self) -> None:
+        """Write everything still queued, then prune."""
+        if self._task is not None and not self._task.done():
+            await self._queue.put(None)
+            await self._task
+        self._task = None
+        await _outside_request(self.run_retention())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "pruned": self.pruned,
+        }
+
+memory_writer = MemoryWriter()
+
+@on_shutdown
+async def flush_memory_writer() -> None:
+    """Flush queued conversation memory before the worker exits."""
+    await memory_writer.close()
+
+def get_memory_writer_stats() -> Dict[str, Any]:
+    return memory_writer.stats()
+
 async def store_conversation_memory(
     user_id: str,
     session_id: str,
@@ -15,69 +220,16 @@ async def store_conversation_memory(
     car_profile: Dict[str, Any]
 ) -> None:
     """
-    Store a conversation interaction in memory
+    Queue a conversation interaction for storage in memory
     """
-    try:
-        from django.db import connection
-        # Close any existing connections to avoid pool issues
-        connection.close()
-        
-        await ConversationMemory.objects.acreate(
-            user_id=user_id,
-            session_id=session_id,
-            query=query,
-            agent_trace=agent_trace or [],
-            final_output=final_output or {},
-            car_profile_snapshot=car_profile or {}
-        )
-        
-        # Clean up old memories after storing new one
-        await cleanup_old_memories(user_id)
-    except Exception as e:
-        print(f"⚠️ Error storing conversation memory: {e}")
-        # Check if it's a table doesn't exist error
-        if "does not exist" in str(e):
-            print("💡 Database table missing - run migrations: python manage.py migrate")
-        # Check if it's a connection pool error
-        elif "MaxClientsInSessionMode" in str(e) or "max clients reached" in str(e):
-            print("💡 Database pool limit reached - skipping memory storage")
-        # Don't raise the error - memory storage is not critical
-
-async def cleanup_old_memories(user_id: str, max_memories: int = 10, days_to_keep: int = 7) -> None:
-    """
-    Clean up old memories to prevent database bloat
-    - Keep only max_memories per user
-    - Delete memories older than days_to_keep
-    """
-    try:
-        from django.db import connection
-        # Close any existing connections to avoid pool issues
-        connection.close()
-        
-        # Delete memories older than days_to_keep
-        cutoff_date = timezone.now() - timedelta(days=days_to_keep)
-        await ConversationMemory.objects.filter(
-            user_id=user_id,
-            created_at__lt=cutoff_date
-        ).adelete()
-        
-        # If still too many memories, delete oldest ones
-        memory_count = await ConversationMemory.objects.filter(user_id=user_id).acount()
-        if memory_count > max_memories:
-            # Get IDs of oldest memories to delete
-            # Use sync_to_async to handle the values_list query
-            @sync_to_async
-            def get_old_memory_ids():
-                return list(ConversationMemory.objects.filter(
-                    user_id=user_id
-                ).order_by('created_at')[:memory_count - max_memories].values_list('id', flat=True))
-            
-            old_memories = await get_old_memory_ids()
-            
-            await ConversationMemory.objects.filter(id__in=old_memories).adelete()
-    except Exception as e:
-        print(f"⚠️ Error cleaning up old memories: {e}")
-        # Don't raise the error - cleanup is not critical
+    await memory_writer.enqueue(ConversationMemory(
+        user_id=user_id,
+        session_id=session_id,
+        query=query,
+        agent_trace=agent_trace or [],
+        final_output=final_output or {},
+        car_profile_snapshot=car_profile or {}
+    ))
 
 async def get_recent_memory(
     user_id: str, 
@@ -91,18 +243,14 @@ async def get_recent_memory(
         @sync_to_async
         def get_memories():
             try:
-                from django.db import connection
-                # Close any existing connections to avoid pool issues
-                connection.close()
-                
                 return list(ConversationMemory.objects.filter(
                     user_id=user_id
                 ).order_by('-created_at')[:limit].values())
             except Exception as db_error:
-                print(f"⚠️ Database error in get_memories: {db_error}")
+                logger.warning("⚠️ Database error in get_memories: %s", db_error)
                 # If it's a connection pool error, return empty list
                 if "MaxClientsInSessionMode" in str(db_error) or "max clients reached" in str(db_error):
-                    print("💡 Database pool limit reached - returning empty memory")
+                    logger.warning("💡 Database pool limit reached - returning empty memory")
                 return []
         
         memories = await get_memories()
@@ -121,7 +269,7 @@ async def get_recent_memory(
             for memory in memories if memory
         ]
     except Exception as e:
-        print(f"⚠️ Error retrieving recent memory: {e}")
+        logger.warning("⚠️ Error retrieving recent memory: %s", e)
         return []
 
 async def get_session_memory(
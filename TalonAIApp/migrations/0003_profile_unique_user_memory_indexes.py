@@ -0,0 +1,56 @@
+# Generated by Django 5.1.3 on 2026-10-17 20:04
+
+from django.db import migrations, models
+
+
+def merge_duplicate_profiles(apps, schema_editor):
+    """
+    Collapse duplicate CarProfile rows per user_id before adding the unique
+    constraint. The oldest row (the one the app has been reading) is kept and
+    the duplicates' mods, symptoms, maintenance logs and goals are moved onto it.
+    """
+    CarProfile = apps.get_model('TalonAIApp', 'CarProfile')
+    related_models = [
+        apps.get_model('TalonAIApp', name)
+        for name in ('Mod', 'Symptom', 'MaintenanceLog', 'BuildGoal')
+    ]
+
+    duplicated_users = (
+        CarProfile.objects.values('user_id')
+        .annotate(count=models.Count('id'))
+        .filter(count__gt=1)
+        .values_list('user_id', flat=True)
+    )
+    for user_id in duplicated_users:
+        ids = list(CarProfile.objects.filter(user_id=user_id).order_by('id').values_list('id', flat=True))
+        keep, duplicates = ids[0], ids[1:]
+        for model in related_models:
+            model.objects.filter(car_id__in=duplicates).update(car_id=keep)
+        CarProfile.objects.filter(id__in=duplicates).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('TalonAIApp', '0002_conversationmemory'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_profiles, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='conversationmemory',
+            index=models.Index(fields=['user_id', '-created_at'], name='convmem_user_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmemory',
+            index=models.Index(fields=['user_id', 'session_id', 'created_at'], name='convmem_user_session_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationmemory',
+            index=models.Index(fields=['created_at'], name='convmem_created_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='carprofile',
+            constraint=models.UniqueConstraint(fields=('user_id',), name='carprofile_unique_user_id'),
+        ),
+    ]
@@ -11,6 +11,12 @@ class CarProfile(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        constraints = [
+            # One profile per user; also serves profile lookups by user_id
+            models.UniqueConstraint(fields=['user_id'], name='carprofile_unique_user_id'),
+        ]
+
 
 class Mod(models.Model):
     car = models.ForeignKey(CarProfile, on_delete=models.CASCADE, related_name='mods')
@@ -57,4 +63,12 @@ class ConversationMemory(models.Model):
     
     class Meta:
         ordering = ['-created_at']  # Most recent first
+        indexes = [
+            # Recent memory for the planner (get_recent_memory)
+            models.Index(fields=['user_id', '-created_at'], name='convmem_user_recent_idx'),
+            # Session history in order (get_session_memory)
+            models.Index(fields=['user_id', 'session_id', 'created_at'], name='convmem_user_session_idx'),
+            # Age-based retention (prune_memories)
+            models.Index(fields=['created_at'], name='convmem_created_at_idx'),
+        ]
     
\ No newline at end of file
@@ -1,48 +1,155 @@
-from typing import Dict, Any
-import json
-from .claude import call_claude
+from typing import Dict, Any, List, Tuple
+import asyncio
+import logging
+from .claude import cache_block
+from .structured import call_structured, PlannerDecision, StructuredOutputError
+from .streaming import emit_event
 from .state import AgentState
-from .memory import get_recent_memory, format_memory_for_prompt
+from .request_context import RequestContext
 from .info import info_pipeline
 from .mod_coach import mod_coach_pipeline
 from .diagnostic import diagnostic_pipeline
 from .build_planner import buildplanner_pipeline
 from .profile_updater import profile_updater_pipeline
+from .router import fast_path_route
+from .tools import prefetch_tools
+from .prompts import PromptTemplate, PromptText, compact_json, format_car_profile, format_trace
+from .tracing import annotate, span
 
-async def run_agentic_planner(state: AgentState) -> AgentState:
+logger = logging.getLogger(__name__)
+
+async def run_planner_step(state: AgentState, iteration: int, context: RequestContext) -> Tuple[AgentState, bool]:
     """
-    Fully dynamic LLM-based planner that intelligently decides what agents to run
+    One scheduler step: decide what to run (router fast path or LLM planner), then run it.
+
+    Returns the updated state and whether the request is finished - either the planner
+    chose `end`, or the agents that just ran were expected to fully answer the query.
     """
-    max_iterations = 5  # Prevent infinite loops
-    iteration = 0
+    if iteration == 1 and (route := fast_path_route(state.get("query", ""), state.get("car_profile"))):
+        # Confident local route: skip the planner LLM both before and after the agent
+        decision = {
+            "actions": [route["action"]],
+            "reasoning": f"Fast path (router confidence {route['confidence']}): {', '.join(route['reasons'])}",
+            "final": True
+        }
+        annotate(fast_path=True)
+    else:
+        # Tools the agents may need run while the planner picks the agents
+        prefetch_tools(state.get("query", ""), state.get("car_profile"))
+        with span("planner.decide", iteration=iteration):
+            decision = await decide_next_action(state, iteration, context)
     
-    while iteration < max_iterations:
-        iteration += 1
-        
-        # Get recent memory for context
-        try:
-            memories = await get_recent_memory(state.get("user_id", ""), limit=3)
-            memory_context = format_memory_for_prompt(memories)
-        except Exception as e:
-            print(f"⚠️ Memory retrieval failed: {e}")
-            memory_context = "No previous conversations found."
-        
-        prompt = f"""
-You are an intelligent automotive assistant planner. You analyze user queries and current state to decide what actions to take.
+    actions = decision.get("actions") or [decision["action"]]
+    action = "+".join(actions)
+    reasoning = decision["reasoning"]
+    annotate(actions=action)
+    
+    logger.info("🎯 AGENTIC PLANNER: %s - %s", action, reasoning)
+    state["agent_trace"].append(f"AgenticPlanner[{iteration}] → {action}: {reasoning}")
+    emit_event("decision", {"iteration": iteration, "action": action, "actions": actions, "reasoning": reasoning})
+    
+    if "end" in actions:
+        logger.debug("✅ AGENTIC PLANNER: Session complete")
+        if not state.get("final_message"):
+            state["final_message"] = "Session complete. Happy driving!"
+        return state, True
+    
+    # Execute the chosen action(s); independent agents run concurrently
+    state = await execute_actions(state, actions)
+    return state, bool(decision.get("final"))
 
-CURRENT STATE:
-- User Query: "{state.get('query', '')}"
-- Car Profile: {json.dumps(state.get('car_profile', {}), indent=2)}
-- Previous Actions: {json.dumps(state.get('agent_trace', []), indent=2)}
-- Current Results:
-  * Info Answer: {state.get('info_answer', 'None')}
-  * Profile Updated: {state.get('profile_updated', False)}
-  * Mod Recommendations: {len(state.get('mod_recommendations') or []) if state.get('mod_recommendations') else 0} recommendations
-  * Diagnostic Results: {'Available' if state.get('symptom_summary') else 'None'}
-  * Build Plan: {len(state.get('build_plan') or []) if state.get('build_plan') else 0} stages
+# Agent name → (pipeline, log label)
+AGENT_PIPELINES = {
+    "profile_updater": (profile_updater_pipeline, "👤 PROFILE UPDATER"),
+    "info": (info_pipeline, "📚 INFO"),
+    "modcoach": (mod_coach_pipeline, "🚀 MODCOACH"),
+    "diagnostic": (diagnostic_pipeline, "🔧 DIAGNOSTIC"),
+    "buildplanner": (buildplanner_pipeline, "📋 BUILDPLANNER"),
+}
 
-MEMORY CONTEXT:
-{memory_context}
+# When parallel agents write the same state key, the higher-priority agent's value wins
+# (same order determine_primary_agent uses to pick the response type)
+AGENT_PRIORITY = ["profile_updater", "info", "modcoach", "diagnostic", "buildplanner"]
+
+# Keys every agent may append to; parallel additions are concatenated in action order
+APPEND_ONLY_KEYS = ("agent_trace", "tool_trace")
+
+async def run_agent(state: AgentState, action: str) -> AgentState:
+    pipeline, label = AGENT_PIPELINES[action]
+    logger.debug("%s agent running...", label)
+    emit_event("agent_start", {"agent": action})
+    with span("agent.run", agent=action):
+        state = await pipeline(state)
+    emit_event("agent_end", {"agent": action})
+    return state
+
+async def execute_actions(state: AgentState, actions: List[str]) -> AgentState:
+    """
+    Run one or more agents. Multiple agents each get a branch copy of the state and
+    run concurrently; their writes are merged back with merge_agent_states.
+    """
+    if len(actions) == 1:
+        return await run_agent(state, actions[0])
+
+    branches = []
+    for _ in actions:
+        branch = dict(state)
+        for key in APPEND_ONLY_KEYS:
+            branch[key] = list(state.get(key) or [])
+        branch["flags"] = dict(state.get("flags") or {})
+        branches.append(branch)
+
+    results = await asyncio.gather(
+        *(run_agent(branch, action) for branch, action in zip(branches, actions)),
+        return_exceptions=True,
+    )
+
+    completed = [(action, result) for action, result in zip(actions, results) if not isinstance(result, Exception)]
+    state = merge_agent_states(state, completed)
+
+    for action, result in zip(actions, results):
+        if isinstance(result, Exception):
+            logger.warning("⚠️ %s agent failed in parallel run: %s", action, result)
+            state["agent_trace"].append(f"Error running {action}: {result}")
+    return state
+
+def merge_agent_states(state: AgentState, branches: List[tuple]) -> AgentState:
+    """
+    Merge parallel agent results into `state`.
+
+    Conflict rules:
+    - agent_trace / tool_trace: entries added by each branch are appended in action order
+    - flags: dict-merged, higher-priority agent wins per flag
+    - any other key: if several agents wrote it, the higher-priority agent's value wins
+    """
+    original = dict(state)
+    base_lengths = {key: len(state.get(key) or []) for key in APPEND_ONLY_KEYS}
+    written_by: Dict[str, str] = {}
+
+    for action, branch in branches:
+        for key in APPEND_ONLY_KEYS:
+            state[key] = (state.get(key) or []) + (branch.get(key) or [])[base_lengths[key]:]
+
+    ranked = sorted(branches, key=lambda item: AGENT_PRIORITY.index(item[0]))
+    for action, branch in ranked:
+        for key, value in branch.items():
+            if key in APPEND_ONLY_KEYS:
+                continue
+            if key == "flags":
+                state["flags"] = {**(state.get("flags") or {}), **(value or {})}
+                continue
+            if key in original and value is original[key]:
+                continue  # untouched by this agent
+            if key in written_by:
+                logger.info("⚠️ Merge conflict on '%s': %s overrides %s", key, action, written_by[key])
+            written_by[key] = action
+            state[key] = value
+
+    return state
+
+# Static planner instructions, sent as a cached system block
+PLANNER_INSTRUCTIONS = PromptText("""
+You are an intelligent automotive assistant planner. You analyze user queries and current state to decide what actions to take.
 
 AVAILABLE AGENTS:
 • `profile_updater` — Extract and update car profile information from user queries
@@ -65,87 +172,114 @@ EFFICIENCY RULES:
 - Simple greetings → info agent, then END
 - If user's needs are met → END immediately
 - Profile updates can run alongside other agents when car info is mentioned
+- When the query needs several agents that don't depend on each other's results
+  (e.g. a symptom AND a mod question → diagnostic + modcoach), list them all in
+  "actions"; they run in parallel
+- Only sequence agents across iterations when one needs another's output first
+- Set "final" to true when the chosen agents' output will fully answer the query, so
+  the session ends right after they run without another planning step
 
-Your response must be valid JSON:
+Answer by calling the `planner_decision` tool. "end" must be the only action when used.
 
-```json
-{{
-  "action": "profile_updater|info|modcoach|diagnostic|buildplanner|end",
-  "reasoning": "Clear explanation of why this action is chosen",
-  "confidence": "high|medium|low"
-}}
-```
+Be intelligent about what the user actually needs.
+""")
 
-Return ONLY valid JSON. Be intelligent about what the user actually needs.
-"""
+PLANNER_STATE_PROMPT = PromptTemplate("""
+CURRENT STATE:
+- User Query: "{query}"
+- Car Profile: {car_profile}
+- Previous Actions:
+{trace}
+{results}
 
-        print(f"\n🧠 AGENTIC PLANNER (Iteration {iteration}): Analyzing current state...")
-        raw = await call_claude(prompt, temperature=0.3)
-        decision = parse_agentic_output(raw)
-        
-        action = decision["action"]
-        reasoning = decision["reasoning"]
-        
-        print(f"🎯 AGENTIC PLANNER: {action} - {reasoning}")
-        state["agent_trace"].append(f"AgenticPlanner[{iteration}] → {action}: {reasoning}")
+MEMORY CONTEXT:
+{memory_context}
+""")
+
+PLANNER_UPDATE_PROMPT = PromptTemplate("""
+UPDATE (iteration {iteration}):
+- New Actions:
+{trace}
+{results}
+""")
+
+RESULTS_PROMPT = PromptTemplate("""- Current Results:
+  * Info Answer: {info_answer}
+  * Profile Updated: {profile_updated}
+  * Mod Recommendations: {mod_count} recommendations
+  * Diagnostic Results: {diagnostic}
+  * Build Plan: {build_stages} stages""")
+
+def format_results(state: AgentState) -> str:
+    return RESULTS_PROMPT.render(
+        info_answer=state.get('info_answer', 'None'),
+        profile_updated=state.get('profile_updated', False),
+        mod_count=len(state.get('mod_recommendations') or []),
+        diagnostic='Available' if state.get('symptom_summary') else 'None',
+        build_stages=len(state.get('build_plan') or []),
+    )
+
+async def decide_next_action(state: AgentState, iteration: int, context: RequestContext) -> Dict[str, Any]:
+    """
+    Ask the LLM planner which agent to run next.
+
+    The planner is one conversation per request (context.planner_history): the first
+    call sends the full state, later calls append only the new trace entries and
+    results, and the cached prefix covers everything already sent.
+    """
+    trace = state.get('agent_trace') or []
+    if not context.planner_history:
+        # Memory is loaded once per request (see RequestContext)
+        memory_context = context.memory_prompt
         
-        # Execute the chosen action
-        if action == "profile_updater":
-            print(f"👤 Running PROFILE UPDATER agent...")
-            state = await profile_updater_pipeline(state)
-        elif action == "info":
-            print(f"📚 Running INFO agent...")
-            state = await info_pipeline(state)
-        elif action == "modcoach":
-            print(f"🚀 Running MODCOACH agent...")
-            state = await mod_coach_pipeline(state)
-        elif action == "diagnostic":
-            print(f"🔧 Running DIAGNOSTIC agent...")
-            state = await diagnostic_pipeline(state)
-        elif action == "buildplanner":
-            print(f"📋 Running BUILDPLANNER agent...")
-            state = await buildplanner_pipeline(state)
-        elif action == "end":
-            print(f"✅ AGENTIC PLANNER: Session complete")
-            if not state.get("final_message"):
-                state["final_message"] = "Session complete. Happy driving!"
-            break
-    
-    if iteration >= max_iterations:
-        print(f"⚠️ AGENTIC PLANNER: Reached max iterations, ending session")
-        state["final_message"] = "I've reached the maximum number of planning iterations. Please try rephrasing your question if you need more help."
-        state["agent_trace"].append(f"AgenticPlanner[{iteration}] → end: Reached maximum iterations")
-    
-    return state
+        prompt = PLANNER_STATE_PROMPT.render(
+            query=state.get('query', ''),
+            car_profile=format_car_profile(state.get('car_profile')),
+            trace=format_trace(trace),
+            results=format_results(state),
+            memory_context=memory_context,
+        )
+    else:
+        prompt = PLANNER_UPDATE_PROMPT.render(
+            iteration=iteration,
+            trace=format_trace(trace[context.planner_trace_seen:]),
+            results=format_results(state),
+        )
 
-def parse_agentic_output(response: str) -> Dict[str, Any]:
+    logger.debug("🧠 AGENTIC PLANNER (Iteration %s): Analyzing current state...", iteration)
     try:
-        # Clean up the response - remove markdown code blocks if present
-        cleaned_response = response.strip()
-        if cleaned_response.startswith("```json"):
-            cleaned_response = cleaned_response[7:]
-        if cleaned_response.startswith("```"):
-            cleaned_response = cleaned_response[3:]
-        if cleaned_response.endswith("```"):
-            cleaned_response = cleaned_response[:-3]
-        
-        cleaned_response = cleaned_response.strip()
-        
-        parsed = json.loads(cleaned_response)
-        action = parsed.get("action")
-        reasoning = parsed.get("reasoning", "")
-        
-        allowed_actions = {"profile_updater", "modcoach", "diagnostic", "buildplanner", "info", "end"}
-        
-        if action not in allowed_actions:
-            raise ValueError(f"Invalid action: {action}")
-        
-        return {
-            "action": action,
-            "reasoning": reasoning
-        }
-    except Exception as e:
+        decision = await call_structured(
+            prompt,
+            PlannerDecision,
+            system=[cache_block(PLANNER_INSTRUCTIONS)],
+            history=context.planner_history,
+            temperature=0.3,
+            agent="planner"
+        )
+    except StructuredOutputError as e:
         return {
             "action": "end",
+            "actions": ["end"],
             "reasoning": f"Error parsing response: {str(e)}"
-        }
\ No newline at end of file
+        }
+
+    # Decisions go back as plain-text assistant turns (a tool_use turn would need a tool_result)
+    context.planner_history.extend([
+        {"role": "user", "content": prompt},
+        {"role": "assistant", "content": compact_json(decision.model_dump(include={"actions", "reasoning", "final"}))},
+    ])
+    context.planner_trace_seen = len(trace)
+    return normalize_decision(decision)
+
+def normalize_decision(decision: PlannerDecision) -> Dict[str, Any]:
+    # Drop duplicates, keep order; "end" can't be combined with real work
+    actions = list(dict.fromkeys(decision.actions)) or ["end"]
+    if "end" in actions and len(actions) > 1:
+        actions.remove("end")
+    
+    return {
+        "action": actions[0],
+        "actions": actions,
+        "reasoning": decision.reasoning,
+        "final": decision.final
+    }
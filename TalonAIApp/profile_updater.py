@@ -1,27 +1,16 @@
-import json
-from .claude import call_claude
+import logging
+from .claude import cache_block
+from .structured import call_structured, ProfileUpdateResult
 from .models import CarProfile
+from .prompts import PromptTemplate, PromptText, compact_json
+from .profiles import get_car_profile, invalidate_car_profile
 from asgiref.sync import sync_to_async
 
-async def profile_updater_pipeline(state):
-    """
-    Dynamic LLM-based profile updater agent
-    """
-    
-    query = state.get("query", "")
-    user_id = state.get("user_id", "")
-    
-    # Get current profile
-    try:
-        current_profile = await get_current_profile(user_id)
-    except Exception as e:
-        current_profile = {}
-    
-    prompt = f"""
-You are a car profile extraction and update specialist. Analyze the user's query and determine if it contains car information that should be stored.
+logger = logging.getLogger(__name__)
 
-Current Profile: {json.dumps(current_profile, indent=2)}
-User Query: "{query}"
+# Static instructions, sent as a cached system block
+PROFILE_UPDATER_INSTRUCTIONS = PromptText("""
+You are a car profile extraction and update specialist. Analyze the user's query and determine if it contains car information that should be stored.
 
 Extract any car information from the query including:
 - Make (manufacturer) 
@@ -33,67 +22,59 @@ Extract any car information from the query including:
 
 Determine if the profile should be updated and provide a summary.
 
-Return JSON:
-{{
-    "should_update": true_or_false,
-    "updates": {{
-        "make": "extracted_make_or_null",
-        "model": "extracted_model_or_null", 
-        "year": extracted_year_or_null,
-        "resale_pref": "extracted_preference_or_null"
-    }},
-    "extracted_info": {{
-        "name": "extracted_name_or_null",
-        "interests": ["performance", "goals"],
-        "summary": "what_was_learned_about_user"
-    }},
-    "response": "conversational_response_to_user_about_profile_update"
-}}
+Answer by calling the `profile_update_result` tool.
 
 Only include fields you actually found. Be conversational in your response.
-"""
+""")
+
+PROFILE_UPDATER_PROMPT = PromptTemplate("""
+Current Profile: {current_profile}
+User Query: "{query}"
+""")
 
+async def profile_updater_pipeline(state):
+    """
+    Dynamic LLM-based profile updater agent
+    """
+    
+    query = state.get("query", "")
+    user_id = state.get("user_id", "")
+    
+    # Current profile: already loaded into state by the view, else from the profile cache
     try:
-        response = await call_claude(prompt, temperature=0.1)
-        
-        # Parse response
-        cleaned_response = response.strip()
-        if cleaned_response.startswith("```json"):
-            cleaned_response = cleaned_response[7:-3]
-        elif cleaned_response.startswith("```"):
-            cleaned_response = cleaned_response[3:-3]
-        
-        result = json.loads(cleaned_response)
+        current_profile = await get_current_profile(user_id, state.get("car_profile"))
+    except Exception as e:
+        current_profile = {}
+    
+    prompt = PROFILE_UPDATER_PROMPT.render(current_profile=compact_json(current_profile), query=query)
+
+    try:
+        result = await call_structured(prompt, ProfileUpdateResult, system=[cache_block(PROFILE_UPDATER_INSTRUCTIONS)], temperature=0.1, agent="profile_updater")
         
         # Update database if needed
-        if result.get("should_update") and result.get("updates"):
-            await update_profile_in_db(user_id, result["updates"])
+        updates = result.updates.model_dump(exclude_none=True)
+        if result.should_update and updates:
+            await update_profile_in_db(user_id, updates)
             
         # Store results in state
-        state["profile_updated"] = result.get("should_update", False)
-        state["extracted_info"] = result.get("extracted_info", {})
-        state["profile_response"] = result.get("response", "Profile information noted.")
+        state["profile_updated"] = result.should_update
+        state["extracted_info"] = result.extracted_info.model_dump()
+        state["profile_response"] = result.response
         
         return state
         
     except Exception as e:
-        print(f"Error in profile updater: {e}")
+        logger.exception("Error in profile updater: %s", e)
         state["profile_response"] = "I'll keep that information in mind for future recommendations."
         return state
 
-@sync_to_async
-def get_current_profile(user_id: str):
-    """Get current car profile from database"""
-    try:
-        profile = CarProfile.objects.get(user_id=user_id)
-        return {
-            "make": profile.make,
-            "model": profile.model,
-            "year": profile.year,
-            "resale_pref": profile.resale_pref
-        }
-    except CarProfile.DoesNotExist:
-        return {}
+PROFILE_FIELDS = ("make", "model", "year", "resale_pref")
+
+async def get_current_profile(user_id: str, car_profile=None):
+    """Get current car profile fields, reusing the request's loaded profile when available"""
+    if not car_profile:
+        car_profile = await get_car_profile(user_id)
+    return {field: car_profile.get(field) for field in PROFILE_FIELDS}
 
 @sync_to_async  
 def update_profile_in_db(user_id: str, updates):
@@ -112,10 +93,11 @@ def update_profile_in_db(user_id: str, updates):
                     setattr(profile, key, str(value))
         
         profile.save()
+        invalidate_car_profile(user_id)
         return True
         
     except Exception as e:
-        print(f"Error updating profile: {e}")
+        logger.exception("Error updating profile: %s", e)
         return False
 
 # Keep the old function for backward compatibility but make it call the pipeline
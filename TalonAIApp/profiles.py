@@ -0,0 +1,196 @@
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Prefetch
+
+from .models import CarProfile, Mod, Symptom, BuildGoal
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Seconds a loaded profile stays cached; writes invalidate it earlier
+PROFILE_CACHE_TTL = int(os.getenv("PROFILE_CACHE_TTL", "300"))
+
+# Bump when the cached profile dict changes shape
+PROFILE_CACHE_SCHEMA = 1
+
+DEFAULT_PROFILE = {"make": "", "model": "", "year": 2020, "resale_pref": ""}
+
+
+def _version_key(user_id: str) -> str:
+    return f"car_profile_version:{user_id}"
+
+
+def _profile_key(user_id: str, version: int) -> str:
+    return f"car_profile:{PROFILE_CACHE_SCHEMA}:{user_id}:{version}"
+
+
+def _current_version(user_id: str) -> int:
+    """
+    The user's profile cache version. Seeded from the clock so an evicted version
+    key can never bring back a profile cached under an older version.
+    """
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        seed = time.time_ns()
+        # Another worker may have seeded it first; if the key is evicted again before
+        # we read it back, our own seed is still a fresh, unique version
+        cache.add(_version_key(user_id), seed, timeout=None)
+        version = cache.get(_version_key(user_id))
+        if version is None:
+            version = seed
+    return version
+
+
+def invalidate_car_profile(user_id: str) -> None:
+    """Call after writing a user's CarProfile, mods, symptoms or goals."""
+    try:
+        cache.incr(_version_key(user_id))
+    except ValueError:
+        # No version yet, so nothing has been cached under it
+        pass
+    except Exception as e:
+        logger.warning("⚠️ Profile cache invalidation failed: %s", e)
+
+
+def serialize_profile(profile: CarProfile) -> Dict[str, Any]:
+    """Profile dict from a CarProfile with mods, open symptoms and goals prefetched."""
+    return {
+        "make": profile.make or "",
+        "model": profile.model or "",
+        "year": profile.year or 2020,
+        "resale_pref": profile.resale_pref or "",
+        "mods": [
+            {
+                "name": mod.name,
+                "brand": mod.brand,
+                "status": mod.status,
+                "install_date": mod.install_date.isoformat() if mod.install_date else None,
+                "notes": mod.notes,
+                "source_link": mod.source_link
+            } for mod in profile.mods.all()
+        ],
+        "symptoms": [
+            {
+                "description": s.description,
+                "severity": s.severity,
+                "resolved": s.resolved,
+                "resolution_notes": s.resolution_notes
+            } for s in profile.open_symptoms
+        ],
+        "goals": [
+            {
+                "goal_type": g.goal_type,
+                "priority": g.priority,
+                "notes": g.notes
+            } for g in profile.goals.all()
+        ]
+    }
+
+
+def _postgres_profile_query() -> str:
+    """
+    Profile row plus its mods, open symptoms and goals as JSON arrays, in one statement.
+    """
+    q = connection.ops.quote_name
+    profile, mod, symptom, goal = (
+        q(model._meta.db_table) for model in (CarProfile, Mod, Symptom, BuildGoal)
+    )
+    return f"""
+SELECT p.make, p.model, p.year, p.resale_pref,
+  COALESCE((SELECT json_agg(json_build_object(
+      'name', m.name, 'brand', m.brand, 'status', m.status,
+      'install_date', m.install_date, 'notes', m.notes, 'source_link', m.source_link
+    ) ORDER BY m.id) FROM {mod} m WHERE m.car_id = p.id), '[]'::json),
+  COALESCE((SELECT json_agg(json_build_object(
+      'description', s.description, 'severity', s.severity,
+      'resolved', s.resolved, 'resolution_notes', s.resolution_notes
+    ) ORDER BY s.id) FROM {symptom} s WHERE s.car_id = p.id AND NOT s.resolved), '[]'::json),
+  COALESCE((SELECT json_agg(json_build_object(
+      'goal_type', g.goal_type, 'priority', g.priority, 'notes', g.notes
+    ) ORDER BY g.id) FROM {goal} g WHERE g.car_id = p.id), '[]'::json)
+FROM {profile} p
+WHERE p.user_id = %s
+ORDER BY p.id
+LIMIT 1
+"""
+
+
+def _fetch_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute(_postgres_profile_query(), [user_id])
+            row = cursor.fetchone()
+        if row is None:
+            return None
+        make, model, year, resale_pref, mods, symptoms, goals = row
+        return {
+            "make": make or "",
+            "model": model or "",
+            "year": year or 2020,
+            "resale_pref": resale_pref or "",
+            "mods": mods,
+            "symptoms": symptoms,
+            "goals": goals
+        }
+
+    # Other backends (SQLite in development): one query per relation, no N+1
+    profile = (
+        CarProfile.objects.filter(user_id=user_id)
+        .order_by("id")
+        .prefetch_related(
+            "mods",
+            Prefetch("symptoms", queryset=Symptom.objects.filter(resolved=False), to_attr="open_symptoms"),
+            "goals",
+        )
+        .first()
+    )
+    return serialize_profile(profile) if profile else None
+
+
+def load_car_profile(user_id: str) -> Dict[str, Any]:
+    """
+    Car profile with mods, unresolved symptoms and goals.
+
+    Served from the cache when warm; otherwise one database round trip on Postgres,
+    creating an empty profile for first-time users.
+    """
+    try:
+        version = _current_version(user_id)
+        cached = cache.get(_profile_key(user_id, version))
+    except Exception as e:
+        logger.warning("⚠️ Profile cache unavailable: %s", e)
+        version, cached = None, None
+    if cached is not None:
+        return cached
+
+    profile = _fetch_profile(user_id)
+    if profile is None:
+        CarProfile.objects.get_or_create(user_id=user_id, defaults=DEFAULT_PROFILE)
+        profile = {**DEFAULT_PROFILE, "mods": [], "symptoms": [], "goals": []}
+
+    if version is not None:
+        try:
+            cache.set(_profile_key(user_id, version), profile, timeout=PROFILE_CACHE_TTL)
+        except Exception as e:
+            logger.warning("⚠️ Profile cache write failed: %s", e)
+    return profile
+
+
+@sync_to_async
+def get_car_profile(user_id: str) -> Dict[str, Any]:
+    """
+    Retrieve car profile and all related data (cached)
+    """
+    try:
+        with span("profile.load"):
+            return load_car_profile(user_id)
+    except Exception as e:
+        logger.warning("⚠️ Database error loading car profile: %s", e)
+        # Return default profile if database error
+        return {**DEFAULT_PROFILE, "mods": [], "symptoms": [], "goals": []}
@@ -0,0 +1,239 @@
+import json
+import logging
+import os
+import threading
+from string import Formatter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .lifecycle import on_startup
+
+logger = logging.getLogger(__name__)
+
+# Token budgets for the variable-size parts of a prompt
+PROMPT_PROFILE_TOKENS = int(os.getenv("PROMPT_PROFILE_TOKENS", "600"))
+PROMPT_TRACE_TOKENS = int(os.getenv("PROMPT_TRACE_TOKENS", "400"))
+PROMPT_MEMORY_TOKENS = int(os.getenv("PROMPT_MEMORY_TOKENS", "500"))
+PROMPT_TOOL_TOKENS = int(os.getenv("PROMPT_TOOL_TOKENS", "1200"))
+
+# tiktoken has no Claude encoding; cl100k_base is a close enough approximation for budgeting
+TOKEN_ENCODING = os.getenv("PROMPT_TOKEN_ENCODING", "cl100k_base")
+
+
+class TokenCounter:
+    """
+    Approximate token counts for prompt budgeting.
+
+    The tiktoken encoding is loaded once in a background thread (it may need to
+    download its BPE file); until it's ready, or if it can't be loaded, counts fall
+    back to ~4 characters per token.
+    """
+
+    def __init__(self, encoding_name: str = TOKEN_ENCODING):
+        self.encoding_name = encoding_name
+        self._encoding = None
+        self._loading = False
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(self.encoding_name)
+        except Exception as e:
+            logger.warning("⚠️ tiktoken unavailable, estimating prompt tokens: %s", e)
+
+    def _start_loading(self) -> None:
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+        threading.Thread(target=self.load, name="tiktoken-load", daemon=True).start()
+
+    @property
+    def exact(self) -> bool:
+        """Whether counts come from tiktoken rather than the ~4 characters per token estimate."""
+        return self._encoding is not None
+
+    def count(self, text: str) -> int:
+        if self._encoding is None:
+            self._start_loading()
+            return (len(text) + 3) // 4
+        return len(self._encoding.encode(text, disallowed_special=()))
+
+
+token_counter = TokenCounter()
+
+
+def count_tokens(text: str) -> int:
+    if isinstance(text, PromptText):
+        return text.tokens
+    return token_counter.count(text)
+
+
+@on_startup
+async def warm_token_counter() -> None:
+    token_counter._start_loading()
+
+
+class PromptText(str):
+    """
+    Prompt text that carries its token count: counted once, and once more after tiktoken
+    has loaded (the first count may be the estimate). count_tokens() uses it, so static
+    instructions sent on every call are never re-encoded. String operations return str.
+    """
+
+    _token_cache: Optional[Tuple[bool, int]] = None
+
+    @property
+    def tokens(self) -> int:
+        exact = token_counter.exact
+        if self._token_cache is None or self._token_cache[0] != exact:
+            self._token_cache = (exact, self._count())
+        return self._token_cache[1]
+
+    def _count(self) -> int:
+        return token_counter.count(str(self))
+
+
+class RenderedPrompt(PromptText):
+    """A PromptTemplate rendering: static token count from the template plus the fields'."""
+
+    def __new__(cls, text: str, template: "PromptTemplate", values: List[str]):
+        rendered = super().__new__(cls, text)
+        rendered.template = template
+        rendered.values = values
+        return rendered
+
+    def _count(self) -> int:
+        return self.template.static_tokens + sum(count_tokens(value) for value in self.values)
+
+
+class PromptTemplate:
+    """
+    A prompt compiled once at import into static text and named `{field}` slots.
+
+    render() only stringifies the fields and joins; the static text and its token count
+    are computed once per template. Uses str.format syntax (`{{`/`}}` for literal braces),
+    without format specs or conversions. Token counts are summed per segment, which can
+    differ from encoding the whole text by a token per boundary - fine for budgeting.
+    """
+
+    def __init__(self, template: str):
+        self.template = template
+        self._parts: List[str] = []
+        self._slots: List[Tuple[int, str]] = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if literal:
+                self._parts.append(literal)
+            if field is None:
+                continue
+            if not field.isidentifier() or spec or conversion:
+                raise ValueError(f"Prompt template fields must be plain names, got {field!r} ({spec=}, {conversion=})")
+            self._slots.append((len(self._parts), field))
+            self._parts.append("")
+        self.fields = tuple(dict.fromkeys(field for _, field in self._slots))
+        self.static_text = PromptText("".join(self._parts))
+
+    @property
+    def static_tokens(self) -> int:
+        return self.static_text.tokens
+
+    def render(self, **values: Any) -> RenderedPrompt:
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise KeyError(f"Prompt template is missing fields: {', '.join(missing)}")
+        parts = list(self._parts)
+        rendered = []
+        for index, field in self._slots:
+            parts[index] = value = str(values[field])
+            rendered.append(value)
+        return RenderedPrompt("".join(parts), self, rendered)
+
+
+# Per-request user prompt of the answer agents; their instructions are cached system blocks
+AGENT_QUERY_PROMPT = PromptTemplate("""
+User Query: "{query}"
+Car Profile: {car_profile}
+Tool Results:
+{tool_results}
+""")
+
+
+def compact_json(data: Any) -> str:
+    """JSON without indentation or padding; unicode is kept as-is."""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False, default=str)
+
+
+def _drop_empty(data: Any) -> Any:
+    if isinstance(data, dict):
+        return {key: _drop_empty(value) for key, value in data.items() if value not in (None, "", [], {})}
+    if isinstance(data, list):
+        return [_drop_empty(item) for item in data]
+    return data
+
+
+def format_car_profile(car_profile: Optional[Dict[str, Any]], max_tokens: int = PROMPT_PROFILE_TOKENS) -> str:
+    """
+    Compact car profile for prompts: empty fields dropped, no indentation, and the
+    mods / symptoms / goals lists trimmed (longest first) until it fits `max_tokens`.
+    """
+    profile = _drop_empty(car_profile or {})
+    if not profile:
+        return "{}"
+    text = compact_json(profile)
+    omitted: Dict[str, int] = {}
+    while count_tokens(text) > max_tokens:
+        lists = [key for key in ("mods", "symptoms", "goals") if profile.get(key)]
+        if not lists:
+            break
+        longest = max(lists, key=lambda key: len(profile[key]))
+        profile[longest] = profile[longest][:-1]
+        omitted[longest] = omitted.get(longest, 0) + 1
+        text = compact_json({**profile, **{f"{key}_omitted": count for key, count in omitted.items()}})
+    return text
+
+
+def format_trace(trace: Optional[List[str]], max_tokens: int = PROMPT_TRACE_TOKENS) -> str:
+    """The most recent agent_trace entries that fit `max_tokens`, one per line."""
+    if not trace:
+        return "None"
+    kept: List[str] = []
+    used = 0
+    for entry in reversed(trace):
+        tokens = count_tokens(entry) + 1
+        if kept and used + tokens > max_tokens:
+            break
+        kept.append(entry)
+        used += tokens
+    lines = [f"- {entry}" for entry in reversed(kept)]
+    if len(kept) < len(trace):
+        lines.insert(0, f"- ({len(trace) - len(kept)} earlier steps omitted)")
+    return "\n".join(lines)
+
+
+def fit_memories(memories: List[Dict[str, Any]], formatter, max_tokens: int = PROMPT_MEMORY_TOKENS) -> str:
+    """Format newest-first `memories`, dropping the oldest until the text fits `max_tokens`."""
+    memories = list(memories)
+    text = formatter(memories)
+    while len(memories) > 1 and count_tokens(text) > max_tokens:
+        memories.pop()
+        text = formatter(memories)
+    return text
+
+
+def format_tool_results(entries: List[Dict[str, Any]], max_tokens: int = PROMPT_TOOL_TOKENS) -> str:
+    """Successful tool calls as `- name: <json>` lines, in call order, up to `max_tokens`."""
+    lines: List[str] = []
+    used = 0
+    for entry in entries:
+        if "result" not in entry:
+            continue
+        line = f"- {entry['tool']}: {compact_json(entry['result'])}"
+        tokens = count_tokens(line) + 1
+        if used + tokens > max_tokens:
+            break
+        lines.append(line)
+        used += tokens
+    skipped = sum(1 for entry in entries if "result" in entry) - len(lines)
+    if skipped:
+        lines.append(f"- ({skipped} more results omitted)")
+    return "\n".join(lines) if lines else "None"
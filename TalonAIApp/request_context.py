@@ -0,0 +1,49 @@
+import logging
+from typing import Any, Dict, List, Optional
+
+from .memory import get_recent_memory, format_memory_for_prompt
+from .prompts import fit_memories
+from .tracing import span
+
+logger = logging.getLogger(__name__)
+
+# Conversations included in the planner's MEMORY CONTEXT
+MEMORY_CONTEXT_LIMIT = 3
+
+
+class RequestContext:
+    """
+    Per-request data loaded once in the view and shared by every planner step.
+
+    Recent ConversationMemory rows are fetched a single time and their prompt
+    fragment is formatted lazily and cached, instead of re-querying the database
+    on each planner iteration.
+
+    It also holds the planner's conversation: each planner step appends its user
+    turn and decision, so later steps send only what changed since the last one.
+    """
+
+    def __init__(self, user_id: str, session_id: str = "default", memories: Optional[List[Dict[str, Any]]] = None):
+        self.user_id = user_id
+        self.session_id = session_id
+        self.memories = memories or []
+        self._memory_prompt: Optional[str] = None
+        self.planner_history: List[Dict[str, Any]] = []
+        self.planner_trace_seen = 0  # agent_trace entries already shown to the planner
+
+    @classmethod
+    async def load(cls, user_id: str, session_id: str = "default", memory_limit: int = MEMORY_CONTEXT_LIMIT) -> "RequestContext":
+        try:
+            with span("memory.load", limit=memory_limit):
+                memories = await get_recent_memory(user_id, limit=memory_limit)
+        except Exception as e:
+            logger.warning("⚠️ Memory retrieval failed: %s", e)
+            memories = []
+        return cls(user_id, session_id, memories)
+
+    @property
+    def memory_prompt(self) -> str:
+        if self._memory_prompt is None:
+            # Oldest conversations are dropped first if over the memory token budget
+            self._memory_prompt = fit_memories(self.memories, format_memory_for_prompt)
+        return self._memory_prompt
@@ -0,0 +1,340 @@
+import asyncio
+import logging
+import os
+import random
+import time
+from collections import deque
+from contextlib import nullcontext
+from typing import Any, AsyncContextManager, Awaitable, Callable, Dict, Optional, TypeVar
+
+import anthropic
+from tenacity import (
+    AsyncRetrying,
+    RetryCallState,
+    retry_if_exception,
+    stop_after_attempt,
+)
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Admission for one outgoing request (e.g. a rate limiter slot). It yields a dict; the
+# policy stores the request's result under "result" so the slot can read its usage.
+Slot = Callable[[], AsyncContextManager[Dict[str, Any]]]
+
+# Per-call policy for Anthropic requests (see call_claude)
+CLAUDE_ATTEMPT_TIMEOUT = float(os.getenv("CLAUDE_ATTEMPT_TIMEOUT", "30"))  # one HTTP attempt (non-streaming)
+CLAUDE_DEADLINE = float(os.getenv("CLAUDE_DEADLINE", "60"))  # all attempts of one call together
+CLAUDE_MAX_ATTEMPTS = int(os.getenv("CLAUDE_MAX_ATTEMPTS", "4"))
+CLAUDE_RETRY_BASE_WAIT = float(os.getenv("CLAUDE_RETRY_BASE_WAIT", "0.5"))
+CLAUDE_RETRY_MAX_WAIT = float(os.getenv("CLAUDE_RETRY_MAX_WAIT", "8"))
+
+# Hedging: if a non-streaming call is slower than the recent p95, race a duplicate request
+CLAUDE_HEDGE_ENABLED = os.getenv("CLAUDE_HEDGE_ENABLED", "False") == "True"
+CLAUDE_HEDGE_MIN_DELAY = float(os.getenv("CLAUDE_HEDGE_MIN_DELAY", "2"))
+CLAUDE_HEDGE_MIN_SAMPLES = int(os.getenv("CLAUDE_HEDGE_MIN_SAMPLES", "20"))
+
+# Circuit breaker: fail fast after consecutive transient failures
+CLAUDE_BREAKER_THRESHOLD = int(os.getenv("CLAUDE_BREAKER_THRESHOLD", "5"))
+CLAUDE_BREAKER_COOLDOWN = float(os.getenv("CLAUDE_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504, 529}
+
+
+class CircuitOpenError(RuntimeError):
+    """The Claude circuit breaker is open; the call was not attempted."""
+
+
+class StreamInterruptedError(RuntimeError):
+    """A streaming call failed after tokens were already sent to the client."""
+
+
+def is_retryable(exc: BaseException) -> bool:
+    if isinstance(exc, (asyncio.TimeoutError, anthropic.APIConnectionError)):
+        return True  # includes APITimeoutError
+    if isinstance(exc, anthropic.APIStatusError):
+        if exc.status_code in RETRYABLE_STATUS or exc.status_code >= 500:
+            return True
+        # Mid-stream errors arrive as a 200 response with an overloaded_error body
+        body = exc.body if isinstance(exc.body, dict) else {}
+        return (body.get("error") or {}).get("type") == "overloaded_error"
+    return False
+
+
+def retry_after_seconds(exc: BaseException) -> Optional[float]:
+    """Server-requested delay from retry-after-ms / retry-after headers, if any."""
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    headers = response.headers
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except ValueError:
+        return None  # HTTP-date form; fall back to backoff
+    return None
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker. After `threshold` transient failures in a row it
+    opens for `cooldown` seconds, then lets a single trial call through (half-open);
+    that call's outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold: int = CLAUDE_BREAKER_THRESHOLD, cooldown: float = CLAUDE_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+        self.rejected = 0
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def before_call(self) -> bool:
+        """Raise CircuitOpenError if the call may not proceed; True if it is the half-open trial."""
+        state = self.state
+        if state == "open" or (state == "half_open" and self.trial_in_flight):
+            self.rejected += 1
+            raise CircuitOpenError("Claude circuit breaker is open")
+        if state == "half_open":
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def abort_trial(self) -> None:
+        """The trial ended without a verdict (cancelled, or never sent); let the next call try."""
+        self.trial_in_flight = False
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.trial_in_flight or self.failures >= self.threshold:
+            if self.opened_at is None or self.trial_in_flight:
+                self.times_opened += 1
+            self.opened_at = time.monotonic()
+        self.trial_in_flight = False
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies, for the hedging threshold."""
+
+    def __init__(self, size: int = 200):
+        self.samples: deque = deque(maxlen=size)
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class ResiliencePolicy:
+    """
+    Deadline, retry, hedging and circuit breaking around one Claude request.
+
+    - Each attempt is bounded by attempt_timeout (streams only by the deadline, since
+      long answers stream for a while) and all attempts by `deadline`.
+    - Transient errors (429, 5xx / 529 overloaded, connection errors, timeouts) are
+      retried with jittered exponential backoff; a retry-after header overrides it.
+    - With hedging on, a non-streaming attempt still running after the recent p95
+      latency gets a duplicate request; the first to succeed wins.
+    """
+
+    def __init__(
+        self,
+        attempt_timeout: float = CLAUDE_ATTEMPT_TIMEOUT,
+        deadline: float = CLAUDE_DEADLINE,
+        max_attempts: int = CLAUDE_MAX_ATTEMPTS,
+        base_wait: float = CLAUDE_RETRY_BASE_WAIT,
+        max_wait: float = CLAUDE_RETRY_MAX_WAIT,
+        hedge_enabled: bool = CLAUDE_HEDGE_ENABLED,
+        hedge_min_delay: float = CLAUDE_HEDGE_MIN_DELAY,
+        hedge_min_samples: int = CLAUDE_HEDGE_MIN_SAMPLES,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.max_attempts = max_attempts
+        self.base_wait = base_wait
+        self.max_wait = max_wait
+        self.hedge_enabled = hedge_enabled
+        self.hedge_min_delay = hedge_min_delay
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = LatencyTracker()
+        self.retries = 0
+        self.timeouts = 0
+        self.hedges_launched = 0
+        self.hedges_won = 0
+
+    def _wait(self, retry_state: RetryCallState) -> float:
+        server_wait = retry_after_seconds(retry_state.outcome.exception())
+        if server_wait is not None:
+            return min(server_wait, self.max_wait)
+        # Full jitter
+        return random.uniform(0, min(self.max_wait, self.base_wait * 2 ** (retry_state.attempt_number - 1)))
+
+    def hedge_delay(self) -> Optional[float]:
+        if not self.hedge_enabled or len(self.latency.samples) < self.hedge_min_samples:
+            return None
+        return max(self.hedge_min_delay, self.latency.percentile(0.95))
+
+    async def call(
+        self,
+        operation: Callable[[], Awaitable[T]],
+        streaming: bool = False,
+        deadline: Optional[float] = None,
+        slot: Optional[Slot] = None,
+    ) -> T:
+        """
+        Run `operation` (one API request per invocation) under the policy. Each request
+        sent - first attempt, retry or hedge - is made inside its own `slot()`.
+        """
+        deadline = min(self.deadline, deadline) if deadline is not None else self.deadline
+        expires_at = time.monotonic() + deadline
+
+        def wait(retry_state: RetryCallState) -> float:
+            # Never back off past the deadline
+            return min(self._wait(retry_state), max(0.0, expires_at - time.monotonic()))
+
+        def deadline_reached(retry_state: RetryCallState) -> bool:
+            # Give up now rather than sleep until the deadline and then time out
+            return expires_at - time.monotonic() <= retry_state.upcoming_sleep
+
+        def before_sleep(retry_state: RetryCallState) -> None:
+            self.retries += 1
+            exc = retry_state.outcome.exception()
+            logger.warning("🔁 Claude attempt %s failed (%s: %s), retrying in %.2fs",
+                           retry_state.attempt_number, type(exc).__name__, exc, retry_state.next_action.sleep)
+
+        retrying = AsyncRetrying(
+            stop=stop_after_attempt(self.max_attempts) | deadline_reached,
+            wait=wait,
+            retry=retry_if_exception(is_retryable),
+            before_sleep=before_sleep,
+            reraise=True,
+        )
+        async for attempt in retrying:
+            with attempt:
+                trial = self.breaker.before_call()
+                settled = False
+                try:
+                    async with _open_slot(slot) as held:
+                        remaining = expires_at - time.monotonic()
+                        if remaining <= 0:
+                            raise asyncio.TimeoutError(f"Claude call deadline ({deadline:g}s) exceeded")
+                        timeout = remaining if streaming else min(self.attempt_timeout, remaining)
+                        started = time.monotonic()
+                        try:
+                            if streaming:
+                                result = await asyncio.wait_for(operation(), timeout)
+                            else:
+                                result = await self._attempt(operation, timeout, slot)
+                        except Exception as e:
+                            if isinstance(e, asyncio.TimeoutError):
+                                self.timeouts += 1
+                            if is_retryable(e) or (isinstance(e, StreamInterruptedError) and is_retryable(e.__cause__)):
+                                self.breaker.record_failure()
+                            else:
+                                self.breaker.record_success()  # the service answered
+                            settled = True
+                            raise
+                        self.breaker.record_success()
+                        settled = True
+                        held["result"] = result
+                finally:
+                    # Cancelled mid-request (wall-time limit, client disconnect) or never sent:
+                    # that says nothing about the service, so don't leave the trial slot taken
+                    if trial and not settled:
+                        self.breaker.abort_trial()
+                if not streaming:
+                    self.latency.record(time.monotonic() - started)
+                return result
+
+    async def _attempt(self, operation: Callable[[], Awaitable[T]], timeout: float, slot: Optional[Slot] = None) -> T:
+        hedge_after = self.hedge_delay()
+        if hedge_after is None or hedge_after >= timeout:
+            return await asyncio.wait_for(operation(), timeout)
+
+        primary = asyncio.ensure_future(operation())
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_after)
+            if not done:
+                self.hedges_launched += 1
+                logger.info("🏇 Claude call slower than p95 (%.2fs), sending hedged request", hedge_after)
+                tasks.add(asyncio.ensure_future(_send_in_slot(operation, slot)))
+            return await self._first_success(tasks, primary, timeout - hedge_after)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _first_success(self, tasks: set, primary: asyncio.Future, timeout: float) -> T:
+        pending = set(tasks)
+        error: Optional[BaseException] = None
+        loop = asyncio.get_running_loop()
+        expires_at = loop.time() + timeout
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, timeout=max(0.0, expires_at - loop.time()), return_when=asyncio.FIRST_COMPLETED
+            )
+            if not done:
+                raise asyncio.TimeoutError("Claude attempt timed out")
+            for task in done:
+                if task.exception() is None:
+                    if task is not primary:
+                        self.hedges_won += 1
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    def stats(self) -> Dict[str, Any]:
+        p95 = self.latency.percentile(0.95)
+        return {
+            "retries": self.retries,
+            "timeouts": self.timeouts,
+            "hedging_enabled": self.hedge_enabled,
+            "hedges_launched": self.hedges_launched,
+            "hedges_won": self.hedges_won,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+            "breaker_state": self.breaker.state,
+            "breaker_opened": self.breaker.times_opened,
+            "breaker_rejected": self.breaker.rejected,
+        }
+
+
+def _open_slot(slot: Optional[Slot]) -> AsyncContextManager[Dict[str, Any]]:
+    return slot() if slot is not None else nullcontext({})
+
+
+async def _send_in_slot(operation: Callable[[], Awaitable[T]], slot: Optional[Slot]) -> T:
+    """A request outside the attempt's own slot (a hedge), admitted separately."""
+    async with _open_slot(slot) as held:
+        held["result"] = result = await operation()
+        return result
+
+
+claude_policy = ResiliencePolicy()
+
+
+def get_resilience_stats() -> Dict[str, Any]:
+    return claude_policy.stats()
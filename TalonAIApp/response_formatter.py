@@ -1,7 +1,10 @@
 from typing import Dict, Any, List, Optional
 import json
+import logging
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
 def format_agent_response(state: Dict[str, Any]) -> Dict[str, Any]:
     """
     Comprehensive response formatter that organizes all state data properly
@@ -40,7 +43,7 @@ def format_agent_response(state: Dict[str, Any]) -> Dict[str, Any]:
             else:
                 response.update(format_default_response(state))
         except Exception as e:
-            print(f"⚠️ Error formatting agent response: {e}")
+            logger.exception("⚠️ Error formatting agent response: %s", e)
             response.update(format_default_response(state))
         
         # Add car profile information
@@ -53,7 +56,7 @@ def format_agent_response(state: Dict[str, Any]) -> Dict[str, Any]:
         return response
         
     except Exception as e:
-        print(f"❌ Critical error in response formatter: {e}")
+        logger.exception("❌ Critical error in response formatter: %s", e)
         # Return minimal safe response
         return {
             "type": "error",
@@ -0,0 +1,167 @@
+import os
+import re
+from typing import Any, Dict, List, Optional, Pattern, Tuple
+
+# Minimum confidence for skipping the LLM planner entirely
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.75"))
+ROUTER_ENABLED = os.getenv("ROUTER_ENABLED", "True") == "True"
+
+
+def _rule(pattern: str, weight: float) -> Tuple[Pattern, float]:
+    return re.compile(pattern, re.IGNORECASE), weight
+
+
+# Greeting / small-talk with nothing else in the message
+GREETING_ONLY = re.compile(
+    r"^\s*(hi|hello|hey|yo|sup|howdy|hiya|good (morning|afternoon|evening)|thanks|thank you|thx)"
+    r"( there| talon| talonai)?[\s!.,?]*$",
+    re.IGNORECASE,
+)
+
+# Weighted rules per agent; an agent's score is the sum of matched weights (capped at 1.0)
+INTENT_RULES: Dict[str, List[Tuple[Pattern, float]]] = {
+    "diagnostic": [
+        _rule(r"\b(misfir\w*|rattl\w*|knock\w*|grind\w*|squeal\w*|squeak\w*|clunk\w*|whin(e|ing))\b", 0.8),
+        _rule(r"\b(leak\w*|overheat\w*|stall\w*|hesitat\w*|stutter\w*|sputter\w*|shak(e|es|ing)|vibrat\w*)\b", 0.5),
+        _rule(r"\b(check engine|warning light|engine light|won'?t start|no start|rough idle|limp mode)\b", 0.8),
+        # "ping" and "cel" are ordinary words too; they only count next to an engine, noise or light word
+        _rule(r"\bping(s|ed|ing)?\b.{0,30}\b(engine|motor|noise|sound|accelerat\w*|boost|load|uphill|idle)\b"
+              r"|\b(engine|motor|noise|sound)\b.{0,30}\bping(s|ed|ing)?\b", 0.8),
+        _rule(r"\bcel\b.{0,20}\b(on|lit|light|flash\w*|blink\w*|codes?|dash\w*)\b|\b(dash\w*|light)\b.{0,20}\bcel\b", 0.8),
+        _rule(r"\b[pbcu][0-3]\d{3}\b", 0.8),  # OBD-II trouble codes
+        _rule(r"\b(noise|sound(s|ing)? (weird|off|bad)|smell\w*|smok(e|ing)|problem|issue|broken|diagnos\w*)\b", 0.35),
+    ],
+    "buildplanner": [
+        _rule(r"\b(build plan|build roadmap|staged build|full build|plan (out )?(my|a|the) build)\b", 0.8),
+        _rule(r"\bstage(s|d)?\s*[1-4]\b.*\bstage(s|d)?\s*[1-4]\b", 0.5),
+        _rule(r"\b(roadmap|step[- ]by[- ]step|long[- ]term plan|over the next)\b", 0.3),
+        _rule(r"\b(get|reach|hit|make)\b.{0,20}\b\d{3,4}\s?(w?hp|horsepower|whp)\b", 0.5),
+    ],
+    "modcoach": [
+        _rule(r"\b(mods?|modif\w*|upgrad\w*|aftermarket|bolt[- ]ons?)\b", 0.45),
+        _rule(r"\b(intake|exhaust|cat[- ]?back|downpipe|intercooler|turbo\w*|supercharg\w*|tune|tuning|flash|coilovers?|wheels|tires)\b", 0.35),
+        _rule(r"\b((more|increase|add|gain)( some)? (power|hp|horsepower|torque)|faster|quicker|first mod|best mods?)\b", 0.45),
+    ],
+    "info": [
+        _rule(r"^\s*(what|how|why|when|which|who)\b", 0.4),
+        _rule(r"\b(explain|what is|what's|what are|meaning of|define|difference between|how does|how do)\b", 0.5),
+    ],
+}
+
+# Gazetteer of common makes/models, used to detect profile updates the LLM should handle
+CAR_MAKES = {
+    "acura", "honda", "toyota", "lexus", "subaru", "mazda", "nissan", "infiniti", "mitsubishi",
+    "hyundai", "kia", "genesis", "ford", "chevy", "chevrolet", "dodge", "ram", "jeep", "gmc",
+    "cadillac", "bmw", "audi", "volkswagen", "vw", "porsche", "mercedes", "mini", "volvo", "tesla",
+}
+CAR_MODELS = {
+    "integra", "civic", "accord", "s2000", "nsx", "tlx", "rsx", "supra", "corolla", "camry", "gr86",
+    "86", "brz", "wrx", "sti", "mx-5", "miata", "mazda3", "350z", "370z", "gt-r", "gtr", "evo",
+    "elantra", "veloster", "stinger", "mustang", "focus", "fiesta", "camaro", "corvette", "challenger",
+    "charger", "wrangler", "m3", "m2", "golf", "gti", "jetta", "a4", "s4", "rs3", "911", "cayman",
+    "model 3", "model y",
+}
+# Symptom gazetteer: multi-word phrases the rules above don't capture on their own
+SYMPTOM_PHRASES = {
+    "loss of power", "power loss", "losing power", "bad gas mileage", "hard starting", "burning oil",
+    "white smoke", "blue smoke", "black smoke", "pulls to the", "brakes squeal", "clutch slipping",
+    "slipping clutch", "boost leak", "low boost", "idle is rough", "engine shakes",
+}
+YEAR_PATTERN = re.compile(r"\b(19[6-9]\d|20[0-4]\d)\b")
+
+# A specialist score at or above this is a real intent, not just a part name in passing
+STRONG_INTENT = 0.45
+
+# Confidence ceiling for messages with fewer than ROUTER_MIN_WORDS words ("knock", "P0301"):
+# too little to go on to skip the planner, whatever rule matched
+ROUTER_MIN_WORDS = 2
+SHORT_QUERY_MAX_CONFIDENCE = 0.5
+
+
+def _mentioned_car_details(query_lower: str, car_profile: Dict[str, Any]) -> List[str]:
+    """Makes/models/years in the query that are not already in the car profile."""
+    words = set(re.findall(r"[a-z0-9-]+", query_lower))
+    profile_values = {
+        str(car_profile.get(field, "")).lower() for field in ("make", "model", "year")
+    }
+    mentioned = [w for w in words & CAR_MAKES if w not in profile_values]
+    mentioned += [m for m in CAR_MODELS if (m in words or (" " in m and m in query_lower)) and m not in profile_values]
+    mentioned += [y for y in YEAR_PATTERN.findall(query_lower) if y not in profile_values]
+    return mentioned
+
+
+def route_query(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Deterministically classify a query without calling the LLM.
+
+    Returns {"action", "confidence", "scores", "reasons"}. confidence is 0-1; the planner
+    only trusts the route when it is at or above ROUTER_CONFIDENCE_THRESHOLD.
+    """
+    car_profile = car_profile or {}
+    query_lower = query.lower().strip()
+
+    if GREETING_ONLY.match(query_lower):
+        return {"action": "info", "confidence": 0.95, "scores": {"info": 1.0}, "reasons": ["greeting"]}
+
+    scores: Dict[str, float] = {}
+    reasons: Dict[str, List[str]] = {}
+    for action, rules in INTENT_RULES.items():
+        for pattern, weight in rules:
+            match = pattern.search(query_lower)
+            if match:
+                scores[action] = scores.get(action, 0.0) + weight
+                reasons.setdefault(action, []).append(match.group(0).strip())
+
+    for phrase in SYMPTOM_PHRASES:
+        if phrase in query_lower:
+            scores["diagnostic"] = scores.get("diagnostic", 0.0) + 0.5
+            reasons.setdefault("diagnostic", []).append(phrase)
+
+    scores = {action: min(score, 1.0) for action, score in scores.items()}
+    if not scores:
+        return {"action": None, "confidence": 0.0, "scores": {}, "reasons": ["no rule matched"]}
+
+    ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+    specialists = [(name, score) for name, score in ranked if name != "info"]
+    info_score = scores.get("info", 0.0)
+
+    if specialists and specialists[0][1] >= STRONG_INTENT:
+        # Question phrasing ("what's a good first mod") doesn't compete with a specialist,
+        # but a second strong specialist means a compound query the LLM should sequence
+        action, top = specialists[0]
+        runner_up = specialists[1][1] if len(specialists) > 1 else 0.0
+        confidence = top - runner_up * 0.8
+    elif info_score:
+        # Explanations that merely name a part ("what is a turbocharger") stay with info
+        action = "info"
+        confidence = info_score - (specialists[0][1] * 0.3 if specialists else 0.0)
+    else:
+        action, confidence = specialists[0]
+    confidence = max(0.0, confidence)
+
+    route_reasons = reasons.get(action, [])
+    if len(re.findall(r"[a-z0-9']+", query_lower)) < ROUTER_MIN_WORDS:
+        confidence = min(confidence, SHORT_QUERY_MAX_CONFIDENCE)
+        route_reasons = route_reasons + ["single-word message"]
+    new_details = _mentioned_car_details(query_lower, car_profile)
+    if new_details:
+        # The profile_updater should run first; that is the LLM planner's call to make
+        confidence = min(confidence, 0.5)
+        route_reasons = route_reasons + [f"new car details: {', '.join(sorted(new_details))}"]
+
+    return {
+        "action": action,
+        "confidence": round(confidence, 2),
+        "scores": {name: round(score, 2) for name, score in ranked},
+        "reasons": route_reasons,
+    }
+
+
+def fast_path_route(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    """The router's decision when it is confident enough to bypass the LLM planner, else None."""
+    if not ROUTER_ENABLED:
+        return None
+    route = route_query(query, car_profile)
+    if route["action"] and route["confidence"] >= ROUTER_CONFIDENCE_THRESHOLD:
+        return route
+    return None
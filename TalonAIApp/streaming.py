@@ -0,0 +1,155 @@
+import asyncio
+import json
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Dict, List, Optional, Sequence, Tuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+# Queue of (event, data) pairs for the /chat/stream/ request running in this task.
+# Unset for regular /chat/ requests, which makes emit_event a no-op.
+_event_sink: ContextVar[Optional[asyncio.Queue]] = ContextVar("talon_event_sink", default=None)
+
+
+def streaming_enabled() -> bool:
+    return _event_sink.get() is not None
+
+
+def emit_event(event: str, data: Dict[str, Any]) -> None:
+    """Publish a progress event to the active SSE stream, if any."""
+    queue = _event_sink.get()
+    if queue is not None:
+        queue.put_nowait((event, data))
+
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    """Serialize one Server-Sent Events frame."""
+    return f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+async def _run_with_event_sink(queue: asyncio.Queue, work: Awaitable[Any]) -> Any:
+    # Runs inside its own task, so the context variable is scoped to this request
+    _event_sink.set(queue)
+    try:
+        return await work
+    finally:
+        queue.put_nowait(None)
+
+
+async def stream_events(work: Awaitable[Any]) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Run `work` in a background task and yield its events as they are emitted,
+    followed by ("result", <return value of work>).
+    """
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(_run_with_event_sink(queue, work))
+    try:
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            yield item
+        yield "result", await task
+    finally:
+        # Client disconnected mid-stream
+        if not task.done():
+            task.cancel()
+
+
+class JsonFieldStream:
+    """
+    Pulls one string field out of a JSON object that arrives in fragments (a forced tool's
+    input_json deltas), so a stream carries the user-facing text instead of raw JSON.
+
+    `path` is the key path from the top-level object, e.g. ("diagnosis", "explanation");
+    feed() returns the newly decoded characters of that field, "" while elsewhere.
+    """
+
+    _ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+    def __init__(self, path: Sequence[str]):
+        self.path = tuple(path)
+        self._stack: List[List[Any]] = []  # open containers: ["{" or "[", current key]
+        self._pending = ""  # escape sequence split across fragments
+        self._in_string = False
+        self._is_key = False
+        self._expect_key = False
+        self._capture = False
+        self._key: List[str] = []
+
+    def feed(self, fragment: str) -> str:
+        text, self._pending = self._pending + fragment, ""
+        out: List[str] = []
+        i, end = 0, len(text)
+        while i < end:
+            char = text[i]
+            if self._in_string:
+                if char == '"':
+                    self._close_string()
+                    i += 1
+                elif char == "\\":
+                    decoded, size = self._unescape(text, i)
+                    if decoded is None:
+                        self._pending = text[i:]
+                        break
+                    self._add(decoded, out)
+                    i += size
+                else:
+                    run_end = i
+                    while run_end < end and text[run_end] not in '"\\':
+                        run_end += 1
+                    self._add(text[i:run_end], out)
+                    i = run_end
+                continue
+            if char == '"':
+                self._in_string = True
+                self._is_key = self._expect_key
+                self._key = []
+                self._capture = not self._is_key and self._at_path()
+            elif char in "{[":
+                self._stack.append([char, None])
+                self._expect_key = char == "{"
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                self._expect_key = False
+            elif char == ",":
+                self._expect_key = bool(self._stack) and self._stack[-1][0] == "{"
+            elif char == ":":
+                self._expect_key = False
+            i += 1
+        return "".join(out)
+
+    def _unescape(self, text: str, i: int) -> Tuple[Optional[str], int]:
+        """(character, length) of the escape at text[i], or (None, 0) if it is incomplete."""
+        if i + 1 >= len(text):
+            return None, 0
+        if text[i + 1] != "u":
+            return self._ESCAPES.get(text[i + 1], text[i + 1]), 2
+        if i + 6 > len(text):
+            return None, 0
+        code = int(text[i + 2:i + 6], 16)
+        if 0xD800 <= code < 0xDC00:
+            # UTF-16 surrogate pair: \ud83d\ude97
+            if i + 12 > len(text):
+                return None, 0
+            if text[i + 6:i + 8] == "\\u":
+                low = int(text[i + 8:i + 12], 16)
+                return chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)), 12
+        return chr(code), 6
+
+    def _add(self, chars: str, out: List[str]) -> None:
+        if self._is_key:
+            self._key.append(chars)
+        elif self._capture:
+            out.append(chars)
+
+    def _close_string(self) -> None:
+        self._in_string = False
+        if self._is_key and self._stack:
+            self._stack[-1][1] = "".join(self._key)
+        self._capture = False
+
+    def _at_path(self) -> bool:
+        return len(self._stack) == len(self.path) and all(
+            kind == "{" and key == name for (kind, key), name in zip(self._stack, self.path)
+        )
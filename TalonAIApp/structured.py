@@ -0,0 +1,281 @@
+import logging
+import re
+from typing import Any, ClassVar, Dict, List, Literal, Optional, Tuple, Type, TypeVar
+
+import orjson
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+from .claude import call_claude, model_for, CLAUDE_MODEL
+from .budget import get_current_budget
+
+logger = logging.getLogger(__name__)
+
+# Typed agent outputs. Claude is forced to return each model through a tool call whose
+# input_schema is the model's JSON schema, so replies are JSON objects by construction.
+# Field descriptions are part of that schema: they are how Claude learns each field's format.
+
+LEVEL = "high, medium or low"
+COST_RANGE = "Price range, e.g. $300-$500"
+
+class StructuredOutput(BaseModel):
+    # Keep extra fields Claude adds, and accept numbers where strings are expected
+    # ("probability": 70 vs "70%")
+    model_config = ConfigDict(extra="allow", coerce_numbers_to_str=True)
+    # Key path of the user-facing string field streamed to /chat/stream/ while it is generated
+    stream_field: ClassVar[Tuple[str, ...]] = ()
+
+
+class InfoResult(StructuredOutput):
+    """Answer to a general automotive question."""
+    stream_field = ("answer",)
+    answer: str
+    car_specific: bool = Field(False, description="Whether the answer used the user's car profile")
+    response_type: str = Field("general", description="greeting, technical, general or recommendation")
+    confidence: str = Field("medium", description=LEVEL)
+
+
+class Diagnosis(StructuredOutput):
+    most_likely_cause: str = Field("", description="Primary diagnosis")
+    confidence: str = Field("medium", description=LEVEL)
+    explanation: str = Field("", description="Detailed explanation of the issue, addressed to the user")
+
+
+class PossibleCause(StructuredOutput):
+    cause: str
+    probability: str = Field("", description="Percentage likelihood")
+    symptoms_match: str = Field("", description="How well the symptoms align")
+
+
+class DiagnosticStep(StructuredOutput):
+    step: str = Field(description="What to check or test")
+    tools_needed: List[str] = []
+    difficulty: str = Field("", description="easy, medium or hard")
+
+
+class RecommendedAction(StructuredOutput):
+    action: str
+    urgency: str = Field("", description="immediate, soon or routine")
+    estimated_cost: str = Field("", description=COST_RANGE)
+
+
+class DiagnosticResult(StructuredOutput):
+    """Diagnosis of the symptoms the user described."""
+    stream_field = ("diagnosis", "explanation")
+    diagnosis: Diagnosis
+    possible_causes: List[PossibleCause] = []
+    diagnostic_steps: List[DiagnosticStep] = []
+    recommended_actions: List[RecommendedAction] = []
+    safety_concerns: List[str] = []
+
+
+class ModRecommendation(StructuredOutput):
+    name: str = Field(description="Specific modification, e.g. a named part")
+    type: str = Field("", description="intake, exhaust, engine, suspension, ...")
+    priority: str = Field("", description=LEVEL)
+    estimated_cost: str = Field("", description=COST_RANGE)
+    power_gain: str = Field("", description="Estimated horsepower gain")
+    justification: str = Field("", description="Why this mod suits their car")
+    difficulty: str = Field("", description="easy, medium or hard")
+    supporting_mods: List[str] = Field([], description="Modifications this one needs")
+
+
+class ModCoachResult(StructuredOutput):
+    """Performance modification recommendations."""
+    stream_field = ("expected_results",)
+    recommendations: List[ModRecommendation] = Field(description="3-5 recommendations, most impactful first")
+    total_estimated_cost: str = Field("", description=COST_RANGE)
+    expected_results: str = Field("", description="Overall performance improvement, addressed to the user")
+    installation_order: List[str] = Field([], description="Recommendation names in install order")
+    important_notes: List[str] = []
+
+
+class StageModification(StructuredOutput):
+    name: str
+    cost: str = Field("", description=COST_RANGE)
+    install_time: str = ""
+    justification: str = Field("", description="Why this modification belongs in this stage")
+
+
+class BuildStage(StructuredOutput):
+    stage: int
+    name: str = Field(description="Descriptive stage name")
+    timeframe: str = Field("", description="Estimated time to complete")
+    total_cost: str = Field("", description=COST_RANGE)
+    priority: str = Field("", description=LEVEL)
+    modifications: List[StageModification] = []
+    expected_results: str = Field("", description="What this stage achieves")
+    prerequisites: List[str] = Field([], description="Supporting mods required first")
+
+
+class BuildPlanResult(StructuredOutput):
+    """Staged build plan."""
+    stream_field = ("build_philosophy",)
+    build_plan: List[BuildStage] = Field(description="3-5 stages, each building on the previous ones")
+    total_timeline: str = ""
+    total_cost: str = Field("", description=COST_RANGE)
+    final_power_estimate: str = Field("", description="Estimated final horsepower")
+    build_philosophy: str = Field("", description="Approach and reasoning, addressed to the user")
+    important_considerations: List[str] = Field([], description="Key notes and warnings")
+
+
+class ProfileUpdates(StructuredOutput):
+    make: Optional[str] = None
+    model: Optional[str] = None
+    year: Optional[int] = None
+    resale_pref: Optional[str] = None
+
+
+class ExtractedInfo(StructuredOutput):
+    name: Optional[str] = Field(None, description="The user's name, if mentioned")
+    interests: List[str] = Field([], description="Performance interests and goals")
+    summary: str = Field("", description="What was learned about the user")
+
+
+class ProfileUpdateResult(StructuredOutput):
+    """Car profile details extracted from the user's message."""
+    should_update: bool
+    updates: ProfileUpdates = Field(ProfileUpdates(), description="Only the fields stated in the query")
+    extracted_info: ExtractedInfo = ExtractedInfo()
+    response: str = Field("Profile information noted.", description="Conversational reply about the profile update")
+    confidence: str = Field("high", description=LEVEL)
+
+
+PlannerAction = Literal["profile_updater", "info", "modcoach", "diagnostic", "buildplanner", "end"]
+
+
+class PlannerDecision(StructuredOutput):
+    """The planner's choice of which agents to run next."""
+    actions: List[PlannerAction] = Field(description="Agents to run now, in parallel; \"end\" must be the only action when used")
+    reasoning: str = Field("", description="Why these actions were chosen")
+    confidence: str = Field("medium", description=LEVEL)
+    final: bool = Field(False, description="True when these actions' output will fully answer the query")
+
+
+T = TypeVar("T", bound=StructuredOutput)
+
+
+# Confidence values that make a fast-model answer get re-asked on CLAUDE_MODEL
+ESCALATE_CONFIDENCE = {"low"}
+
+
+class StructuredOutputError(ValueError):
+    """Claude's output could not be parsed into the expected model, even after repair."""
+
+
+def _tool_name(output_model: Type[BaseModel]) -> str:
+    # InfoResult -> info_result
+    return re.sub(r"(?<!^)(?=[A-Z])", "_", output_model.__name__).lower()
+
+
+def _inline_refs(schema: Any, defs: Dict[str, Any]) -> Any:
+    """Replace pydantic's $ref/$defs with the referenced schemas."""
+    if isinstance(schema, dict):
+        if "$ref" in schema:
+            return _inline_refs(defs[schema["$ref"].split("/")[-1]], defs)
+        return {key: _inline_refs(value, defs) for key, value in schema.items() if key != "$defs"}
+    if isinstance(schema, list):
+        return [_inline_refs(item, defs) for item in schema]
+    return schema
+
+
+_tool_cache: Dict[type, Dict[str, Any]] = {}
+
+
+def tool_for(output_model: Type[BaseModel]) -> Dict[str, Any]:
+    """Anthropic tool definition whose input schema is `output_model`."""
+    if output_model not in _tool_cache:
+        schema = output_model.model_json_schema()
+        _tool_cache[output_model] = {
+            "name": _tool_name(output_model),
+            "description": (output_model.__doc__ or "").strip() or f"Return a {output_model.__name__}.",
+            "input_schema": _inline_refs(schema, schema.get("$defs", {})),
+        }
+    return _tool_cache[output_model]
+
+
+_FENCE = re.compile(r"^```(?:json)?\s*|\s*```$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+
+def _local_repair(raw: str) -> str:
+    """Free fixes for common JSON damage: code fences, surrounding prose, trailing commas."""
+    text = _FENCE.sub("", raw.strip())
+    start, end = text.find("{"), text.rfind("}")
+    if start != -1 and end > start:
+        text = text[start:end + 1]
+    return _TRAILING_COMMA.sub(r"\1", text)
+
+
+def parse_structured(raw: str, output_model: Type[T]) -> T:
+    """Decode and validate `raw`; raises ValueError (orjson / pydantic) on failure."""
+    try:
+        data = orjson.loads(raw)
+    except orjson.JSONDecodeError:
+        data = orjson.loads(_local_repair(raw))
+    return output_model.model_validate(data)
+
+
+async def call_structured(
+    prompt: str,
+    output_model: Type[T],
+    agent: Optional[str] = None,
+    temperature: float = 0.0,
+    stream: bool = False,
+    escalate: bool = True,
+    **kwargs: Any
+) -> T:
+    """
+    call_claude with Claude forced to answer through `output_model`'s schema.
+
+    If the reply doesn't validate, one repair call sends the validation error and
+    the bad output back (instead of discarding the paid answer). Raises
+    StructuredOutputError if the repaired output is still invalid.
+
+    When a smaller model than CLAUDE_MODEL answered (planner, profile_updater) and
+    the result reports low confidence, the call is repeated once on CLAUDE_MODEL.
+    """
+    model = kwargs.pop("model", None) or model_for(agent)
+    result = await _call_structured(prompt, output_model, agent, temperature, stream, model=model, **kwargs)
+    if escalate and model != CLAUDE_MODEL and getattr(result, "confidence", None) in ESCALATE_CONFIDENCE:
+        logger.info("⬆️ %s answered with %s confidence on %s, escalating to %s",
+                    agent, result.confidence, model, CLAUDE_MODEL)
+        budget = get_current_budget()
+        if budget:
+            budget.escalations += 1
+        result = await _call_structured(prompt, output_model, agent, temperature, stream, model=CLAUDE_MODEL, **kwargs)
+    return result
+
+
+async def _call_structured(
+    prompt: str,
+    output_model: Type[T],
+    agent: Optional[str],
+    temperature: float,
+    stream: bool,
+    **kwargs: Any
+) -> T:
+    tool = tool_for(output_model)
+    raw = await call_claude(prompt, temperature=temperature, agent=agent, stream=stream, tool=tool,
+                            stream_field=output_model.stream_field, **kwargs)
+    try:
+        return parse_structured(raw, output_model)
+    except (ValueError, ValidationError) as e:
+        logger.warning("🩹 %s output failed validation, repairing: %s", agent or "claude", e)
+        error = e
+
+    repair_prompt = f"""
+This output was meant to match the `{tool['name']}` tool schema but failed validation.
+
+Validation error:
+{error}
+
+Output:
+{raw}
+
+Call `{tool['name']}` with the corrected data. Keep all of the original content; only fix the structure and types.
+"""
+    repaired = await call_claude(repair_prompt, temperature=0.0, agent=f"{agent}_repair" if agent else None, tool=tool, **kwargs)
+    try:
+        return parse_structured(repaired, output_model)
+    except (ValueError, ValidationError) as e:
+        raise StructuredOutputError(f"Invalid {output_model.__name__} after repair: {e}") from e
@@ -1,3 +1,847 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import os
+import tempfile
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from benchmarks.import_time import measure
+from benchmarks.mcp_fixtures import FIXTURES
+from . import agent_loop, build_planner, diagnostic, info, limiter, llm_cache, llm_fixtures, memory, mod_coach, planner, profiles, router, structured, tools, tracing, views
+from .budget import RequestBudget, bind_budget, get_current_budget, unbind_budget
+from .claude import CLAUDE_MODEL, _system_tokens, cache_block, cache_min_tokens, call_claude, model_for
+from .resilience import CircuitBreaker, CircuitOpenError, ResiliencePolicy
+from .streaming import JsonFieldStream
+from .tracing import current_span, span, start_trace
+from .structured import InfoResult, PlannerDecision, StructuredOutputError
+
+# Generous ceiling for a cold django.setup() + views import; the LangChain stack alone
+# used to add over a second. Override on slow CI machines.
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", "3.0"))
+
+
+class ImportTimeTests(SimpleTestCase):
+    def test_views_import_skips_langchain_and_openai(self):
+        result = measure("TalonAIApp.views")
+        self.assertEqual(result["heavy"], [])
+        self.assertLess(result["seconds"], IMPORT_TIME_BUDGET)
+
+
+class RouterTests(SimpleTestCase):
+    INTEGRA = {"year": 2023, "make": "Acura", "model": "Integra"}
+
+    # (query, car profile, expected action, expected confidence, bypasses the planner)
+    CASES = [
+        ("hi there", None, "info", 0.95, True),
+        ("my car has a misfire at idle", None, "diagnostic", 0.8, True),
+        ("my engine pings under load", None, "diagnostic", 0.8, True),
+        ("the cel came on this morning", None, "diagnostic", 0.8, True),
+        # Bare words: no context, or a single word, never skips the planner
+        ("ping", None, None, 0.0, False),
+        ("cel", None, None, 0.0, False),
+        ("ping me when it's ready", None, None, 0.0, False),
+        ("knock", None, "diagnostic", 0.5, False),
+        ("P0301", None, "diagnostic", 0.5, False),
+        # A specialist at STRONG_INTENT wins over question phrasing; a weaker one stays with info
+        ("what's a good first mod for more power", None, "modcoach", 0.9, True),
+        ("what is a turbocharger", None, "info", 0.8, True),
+        # Two strong specialists: a compound query for the planner
+        ("my car is making a knocking noise and I want an exhaust upgrade", None, "diagnostic", 0.36, False),
+        # New car details cap the route at 0.5 so the planner can run profile_updater first
+        ("best mods for my 2023 integra", None, "modcoach", 0.5, False),
+        ("best mods for my 2023 integra", INTEGRA, "modcoach", 0.9, True),
+    ]
+
+    def test_routes(self):
+        for query, profile, action, confidence, fast in self.CASES:
+            with self.subTest(query=query, profile=profile):
+                route = router.route_query(query, profile)
+                self.assertEqual((route["action"], route["confidence"]), (action, confidence))
+                self.assertEqual(router.fast_path_route(query, profile) is not None, fast)
+
+    def test_threshold_is_inclusive_and_configurable(self):
+        with mock.patch.object(router, "ROUTER_CONFIDENCE_THRESHOLD", 0.8):
+            self.assertIsNotNone(router.fast_path_route("my car has a misfire at idle"))
+        with mock.patch.object(router, "ROUTER_CONFIDENCE_THRESHOLD", 0.81):
+            self.assertIsNone(router.fast_path_route("my car has a misfire at idle"))
+        with mock.patch.object(router, "ROUTER_ENABLED", False):
+            self.assertIsNone(router.fast_path_route("hi"))
+
+
+class SchedulerBudgetTests(SimpleTestCase):
+    def run_scheduler(self, step, **limits):
+        """run_agent_system with `step(budget, iteration)` in place of the planner step."""
+        steps = []
+
+        async def planner_step(state, iteration, context):
+            steps.append(iteration)
+            done = await step(get_current_budget(), iteration)
+            state["agent_trace"].append(f"step {iteration}")
+            return state, done
+
+        budget = RequestBudget(**limits)
+        with mock.patch.object(agent_loop, "run_planner_step", side_effect=planner_step):
+            response = asyncio.run(agent_loop.run_agent_system(
+                {"query": "q", "user_id": "u1"}, budget=budget, context=mock.Mock()
+            ))
+        return response, steps
+
+    def test_stop_reasons(self):
+        async def answer_on_second(budget, iteration):
+            budget.record_call(10, 5)
+            return iteration == 2
+
+        async def never_done(budget, iteration):
+            return False
+
+        async def one_call(budget, iteration):
+            budget.record_call()
+            return False
+
+        async def big_call(budget, iteration):
+            budget.record_call(400, 200)
+            return False
+
+        async def fail(budget, iteration):
+            raise RuntimeError("planner down")
+
+        cases = [
+            (answer_on_second, {}, "answered", [1, 2]),
+            (never_done, {"max_planner_steps": 3}, "budget exhausted: max planner steps (3)", [1, 2, 3]),
+            (one_call, {"max_llm_calls": 2}, "budget exhausted: max LLM calls (2)", [1, 2]),
+            (big_call, {"max_tokens": 1000}, "budget exhausted: max tokens (1000)", [1, 2]),
+            (fail, {}, "error", [1]),
+        ]
+        for step, limits, reason, expected_steps in cases:
+            with self.subTest(reason=reason):
+                response, steps = self.run_scheduler(step, **limits)
+                self.assertEqual(response["budget"]["stop_reason"], reason)
+                self.assertEqual(steps, expected_steps)
+                self.assertEqual(response["budget"]["planner_steps"], len(expected_steps))
+
+    def test_budget_report_is_attached_to_the_response(self):
+        async def answer(budget, iteration):
+            budget.record_call(120, 30, cache_read_tokens=100)
+            budget.record_cache_hit()
+            return True
+
+        response, _ = self.run_scheduler(answer, max_llm_calls=4)
+        report = response["budget"]
+        self.assertEqual((report["llm_calls"], report["max_llm_calls"], report["cache_hits"]), (1, 4, 1))
+        self.assertEqual((report["input_tokens"], report["output_tokens"], report["cache_read_tokens"]), (120, 30, 100))
+        self.assertIn("wall_time", report)
+
+    def test_step_running_past_the_wall_time_is_cut_off(self):
+        async def slow(budget, iteration):
+            await asyncio.sleep(5)
+            return True
+
+        response, steps = self.run_scheduler(slow, max_wall_time=0.05)
+        self.assertEqual(response["budget"]["stop_reason"], "budget exhausted: max wall time (0.05s)")
+        self.assertIn("Scheduler stopped: wall-time budget exceeded in step 1", response["agent_trace"])
+        self.assertLess(response["budget"]["wall_time"], 1)
+
+    def test_no_step_starts_once_the_wall_time_is_spent(self):
+        async def spend_it(budget, iteration):
+            budget.started_at -= budget.max_wall_time
+            return False
+
+        response, steps = self.run_scheduler(spend_it, max_wall_time=10)
+        self.assertEqual(steps, [1])
+        self.assertEqual(response["budget"]["stop_reason"], "budget exhausted: max wall time (10s)")
+        self.assertIn("Scheduler stopped: budget exhausted (max wall time (10s))", response["agent_trace"])
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch("TalonAIApp.resilience.time.monotonic", side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker(threshold=3, cooldown=30)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+
+    def test_opens_after_threshold_consecutive_failures(self):
+        for _ in range(2):
+            self.breaker.before_call()
+            self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+
+    def test_success_resets_the_failure_count(self):
+        for _ in range(2):
+            self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_after_cooldown_allows_one_trial(self):
+        self.open_breaker()
+        self.now += 30
+        self.assertEqual(self.breaker.state, "half_open")
+        self.assertTrue(self.breaker.before_call())
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.before_call()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_failed_trial_reopens(self):
+        self.open_breaker()
+        self.now += 30
+        self.breaker.before_call()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.times_opened, 2)
+
+
+class ResiliencePolicyTests(SimpleTestCase):
+    def policy(self, **kwargs):
+        defaults = {"max_attempts": 3, "base_wait": 0, "max_wait": 0, "attempt_timeout": 5, "deadline": 10}
+        return ResiliencePolicy(**{**defaults, **kwargs})
+
+    def test_cancelled_half_open_trial_frees_the_breaker(self):
+        breaker = CircuitBreaker(threshold=1, cooldown=0)
+        breaker.record_failure()
+        policy = self.policy(breaker=breaker)
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(60)
+
+        async def scenario():
+            task = asyncio.ensure_future(policy.call(hang))
+            await started.wait()
+            self.assertTrue(breaker.trial_in_flight)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            self.assertFalse(breaker.trial_in_flight)
+
+            async def answer():
+                return "ok"
+            return await policy.call(answer)
+
+        self.assertEqual(asyncio.run(scenario()), "ok")
+        self.assertEqual(breaker.state, "closed")
+
+    def test_backoff_never_sleeps_past_the_deadline(self):
+        policy = self.policy(deadline=0.2)
+        calls = []
+
+        async def operation():
+            calls.append(time.monotonic())
+            raise asyncio.TimeoutError("slow")
+
+        async def scenario(backoff):
+            with mock.patch.object(policy, "_wait", return_value=backoff):
+                started = time.monotonic()
+                with self.assertRaises(asyncio.TimeoutError):
+                    await policy.call(operation)
+                return time.monotonic() - started
+
+        # A backoff longer than the time left: give up now instead of sleeping into the deadline
+        self.assertLess(asyncio.run(scenario(5.0)), 0.1)
+        self.assertEqual(len(calls), 1)
+
+        # Short backoffs still retry while time remains
+        calls.clear()
+        asyncio.run(scenario(0.01))
+        self.assertEqual(len(calls), 3)
+
+    def test_every_attempt_takes_its_own_slot(self):
+        policy = self.policy()
+        admitted = []
+        attempts = iter([asyncio.TimeoutError("slow"), "ok"])
+
+        @asynccontextmanager
+        async def slot():
+            held = {}
+            admitted.append(held)
+            yield held
+
+        async def operation():
+            outcome = next(attempts)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        self.assertEqual(asyncio.run(policy.call(operation, slot=slot)), "ok")
+        self.assertEqual(len(admitted), 2)
+        self.assertEqual(admitted[-1]["result"], "ok")
+        self.assertEqual(policy.retries, 1)
+
+    def test_hedged_request_takes_its_own_slot(self):
+        policy = self.policy(hedge_enabled=True, hedge_min_delay=0.01, hedge_min_samples=1)
+        policy.latency.record(0.01)
+        admitted = []
+        calls = []
+
+        @asynccontextmanager
+        async def slot():
+            held = {}
+            admitted.append(held)
+            yield held
+
+        async def operation():
+            calls.append(1)
+            await asyncio.sleep(0.2 if len(calls) == 1 else 0)
+            return len(calls)
+
+        asyncio.run(policy.call(operation, slot=slot))
+        self.assertEqual(policy.hedges_launched, 1)
+        self.assertEqual(len(admitted), 2)
+
+
+class ProfileCacheTests(SimpleTestCase):
+    def setUp(self):
+        profiles.cache.clear()
+        self.addCleanup(profiles.cache.clear)
+        self.rows = {"make": "Acura", "model": "Integra", "year": 2023, "resale_pref": "", "mods": [], "symptoms": [], "goals": []}
+        patcher = mock.patch.object(profiles, "_fetch_profile", side_effect=lambda user_id: dict(self.rows))
+        self.fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_update_bumps_the_version_and_the_next_read_hits_the_database(self):
+        self.assertEqual(profiles.load_car_profile("u1")["model"], "Integra")
+        profiles.load_car_profile("u1")
+        self.assertEqual(self.fetch.call_count, 1)
+
+        version = profiles._current_version("u1")
+        self.rows["model"] = "Civic"
+        profiles.invalidate_car_profile("u1")
+        self.assertEqual(profiles._current_version("u1"), version + 1)
+
+        self.assertEqual(profiles.load_car_profile("u1")["model"], "Civic")
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_version_evicted_between_add_and_get_uses_the_seed(self):
+        evicting = mock.Mock(get=mock.Mock(return_value=None), add=mock.Mock(return_value=True))
+        with mock.patch.object(profiles, "cache", evicting):
+            version = profiles._current_version("u1")
+        self.assertIsNotNone(version)
+        self.assertEqual(version, evicting.add.call_args.args[1])
+
+
+class LLMCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(llm_cache, "time", SimpleNamespace(monotonic=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_key_is_stable_and_covers_every_input(self):
+        tool = {"name": "info_result", "input_schema": {"type": "object", "properties": {}}}
+        reordered = {"input_schema": {"properties": {}, "type": "object"}, "name": "info_result"}
+        base = ("model-a", [{"type": "text", "text": "sys"}], "hi", 0.0, 1024, tool)
+        key = llm_cache.make_cache_key(*base)
+        self.assertEqual(key, llm_cache.make_cache_key(*base[:5], reordered))
+        self.assertRegex(key, r"^llm:[0-9a-f]{64}$")
+        for index, changed in [(0, "model-b"), (1, "other"), (2, "hello"), (3, 0.2), (4, 2048), (5, None)]:
+            with self.subTest(field=index):
+                variant = list(base)
+                variant[index] = changed
+                self.assertNotEqual(llm_cache.make_cache_key(*variant), key)
+
+    def test_lru_evicts_the_least_recently_used(self):
+        lru = llm_cache.LRUTier(max_entries=2)
+        lru.set("a", "1", 60)
+        lru.set("b", "2", 60)
+        self.assertEqual(lru.get("a"), "1")
+        lru.set("c", "3", 60)
+        self.assertIsNone(lru.get("b"))
+        self.assertEqual((lru.get("a"), lru.get("c"), len(lru)), ("1", "3", 2))
+
+    def test_entries_expire_after_their_ttl(self):
+        lru = llm_cache.LRUTier()
+        lru.set("a", "1", 60)
+        self.now += 59
+        self.assertEqual(lru.get("a"), "1")
+        self.now += 2
+        self.assertIsNone(lru.get("a"))
+        self.assertEqual(len(lru), 0)
+
+    def cache_with_redis(self, client):
+        cache = llm_cache.LLMResponseCache(enabled=True)
+        cache.redis = llm_cache.RedisTier("redis://cache")
+        cache.redis._get_client = mock.Mock(side_effect=client) if isinstance(client, Exception) else lambda: client
+        return cache
+
+    def test_redis_failure_falls_back_to_memory(self):
+        cache = self.cache_with_redis(ConnectionError("redis down"))
+
+        async def scenario():
+            self.assertIsNone(await cache.get("k"))
+            await cache.set("k", "answer", 60)
+            return await cache.get("k")
+
+        self.assertEqual(asyncio.run(scenario()), "answer")
+        self.assertEqual(cache.redis.errors, 2)
+        self.assertEqual((cache.misses, cache.hits["lru"]), (1, 1))
+
+    def test_redis_hit_is_promoted_for_its_remaining_ttl(self):
+        class Pipeline:
+            async def __aenter__(self):
+                return self
+
+            async def __aexit__(self, *exc):
+                return False
+
+            def get(self, key):
+                return self
+
+            def ttl(self, key):
+                return self
+
+            async def execute(self):
+                return ["shared answer", 30]
+
+        cache = self.cache_with_redis(SimpleNamespace(pipeline=lambda transaction: Pipeline()))
+        self.assertEqual(asyncio.run(cache.get("k")), "shared answer")
+        self.assertEqual(cache.lru.get("k"), "shared answer")
+        self.now += 31
+        self.assertIsNone(cache.lru.get("k"))
+
+
+class LLMFixtureTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "fixtures.jsonl.gz")
+
+    def test_record_then_replay_through_call_claude(self):
+        async def create(**request):
+            return SimpleNamespace(
+                usage=SimpleNamespace(input_tokens=12, output_tokens=3),
+                content=[SimpleNamespace(type="text", text="recorded answer")],
+            )
+
+        client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        recorder = llm_fixtures.LLMFixtureStore(mode="record", path=self.path)
+        with mock.patch("TalonAIApp.claude.llm_fixtures", recorder), \
+                mock.patch("TalonAIApp.claude.get_claude_client", return_value=client):
+            self.assertEqual(asyncio.run(call_claude("hi", agent="info")), "recorded answer")
+
+        player = llm_fixtures.LLMFixtureStore(mode="replay", path=self.path)
+        budget = RequestBudget()
+        token = bind_budget(budget)
+        self.addCleanup(unbind_budget, token)
+        with mock.patch("TalonAIApp.claude.llm_fixtures", player), \
+                mock.patch("TalonAIApp.claude.get_claude_client", side_effect=AssertionError("network call in replay")):
+            self.assertEqual(asyncio.run(call_claude("hi", agent="info")), "recorded answer")
+            with self.assertRaises(llm_fixtures.FixtureMissError):
+                asyncio.run(call_claude("something new", agent="info"))
+        self.assertEqual((player.hits, player.misses), (1, 1))
+        self.assertEqual((budget.llm_calls, budget.input_tokens, budget.output_tokens), (1, 12, 3))
+
+    def test_non_strict_miss_returns_none(self):
+        store = llm_fixtures.LLMFixtureStore(mode="replay", path=self.path, strict=False)
+        self.assertIsNone(asyncio.run(store.replay("llm:missing")))
+        self.assertEqual(store.misses, 1)
+
+    def test_gzip_appends_survive_a_reload(self):
+        async def record(key, response):
+            await llm_fixtures.LLMFixtureStore(mode="record", path=self.path).record(key, response, 0.5)
+
+        asyncio.run(record("k1", "first"))
+        asyncio.run(record("k2", "second"))
+        asyncio.run(record("k1", "re-recorded"))
+
+        with gzip.open(self.path, "rt", encoding="utf-8") as file:
+            self.assertEqual(len(file.readlines()), 3)
+        store = llm_fixtures.LLMFixtureStore(mode="replay", path=self.path)
+        self.assertEqual(asyncio.run(store.replay("k1"))["response"], "re-recorded")
+        self.assertEqual(asyncio.run(store.replay("k2"))["latency"], 0.5)
+        self.assertEqual(store.stats()["fixtures"], 2)
+
+
+class LimiterTests(SimpleTestCase):
+    def setUp(self):
+        # Fake clock for the token buckets; the event loop keeps the real one
+        self.now = 1000.0
+        patcher = mock.patch.object(limiter, "time", SimpleNamespace(monotonic=lambda: self.now))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_bucket_refills_continuously_up_to_capacity(self):
+        bucket = limiter.TokenBucket(60)  # one unit per second
+        bucket.take(60)
+        self.assertEqual(bucket.wait_time(30), 30)
+        self.now += 10
+        self.assertEqual(bucket.wait_time(30), 20)
+        self.now += 20
+        self.assertEqual(bucket.wait_time(30), 0)
+        self.now += 1000
+        bucket.give_back(10)
+        self.assertEqual(bucket.level, 60)
+
+    def test_users_are_served_round_robin(self):
+        rate = limiter.LLMRateLimiter(max_concurrency=1, requests_per_minute=1000, tokens_per_minute=100000)
+        order = []
+
+        async def call(user, n):
+            ticket = await rate.acquire(user, 10)
+            order.append(f"{user}{n}")
+            return ticket
+
+        async def scenario():
+            held = await rate.acquire("heavy", 10)
+            pending = {asyncio.create_task(call("heavy", n)) for n in (2, 3, 4)}
+            await asyncio.sleep(0)
+            pending.add(asyncio.create_task(call("light", 1)))
+            await asyncio.sleep(0)
+            self.assertEqual(rate.queue_depth, 4)
+            while pending:
+                rate.release(held)
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                held = done.pop().result()
+            rate.release(held)
+
+        asyncio.run(scenario())
+        self.assertEqual(order, ["heavy2", "light1", "heavy3", "heavy4"])
+        self.assertEqual((rate.in_flight, rate.granted), (0, 5))
+
+    def test_request_rate_waits_for_the_refill(self):
+        rate = limiter.LLMRateLimiter(requests_per_minute=2, tokens_per_minute=100000)
+
+        async def scenario():
+            await rate.acquire("u1", 10)
+            await rate.acquire("u1", 10)
+            waiting = asyncio.create_task(rate.acquire("u2", 10))
+            await asyncio.sleep(0)
+            self.assertFalse(waiting.done())
+            self.now += 30  # one request's worth at 2/min
+            rate._dispatch()
+            await asyncio.wait_for(waiting, 1)
+
+        asyncio.run(scenario())
+        self.assertEqual(rate.throttled["requests_per_minute"], 1)
+
+    def test_queue_timeout(self):
+        rate = limiter.LLMRateLimiter(max_concurrency=1, queue_timeout=0.02)
+
+        async def scenario():
+            held = await rate.acquire("u1", 10)
+            with self.assertRaises(limiter.LLMQueueTimeout):
+                await rate.acquire("u2", 10)
+            self.assertEqual(rate.queue_depth, 0)
+            rate.release(held)
+
+        asyncio.run(scenario())
+        self.assertEqual((rate.timeouts, rate.in_flight), (1, 0))
+
+
+class StructuredOutputTests(SimpleTestCase):
+    def call(self, replies, output_model=InfoResult, **kwargs):
+        """call_structured against a stubbed call_claude returning `replies` in order; returns (result, calls)."""
+        replies = iter(replies)
+        calls = []
+
+        async def claude(prompt, **call_kwargs):
+            calls.append({"prompt": prompt, **call_kwargs})
+            return next(replies)
+
+        with mock.patch.object(structured, "call_claude", side_effect=claude):
+            result = asyncio.run(structured.call_structured("q", output_model, **kwargs))
+        return result, calls
+
+    def test_damaged_json_is_repaired_locally(self):
+        raw = 'Here you go:\n```json\n{"answer": "Use 0W-20.", "confidence": "high",}\n```'
+        result, calls = self.call([raw], agent="info")
+        self.assertEqual((result.answer, result.confidence), ("Use 0W-20.", "high"))
+        self.assertEqual(len(calls), 1)
+
+    def test_one_repair_call_then_success(self):
+        result, calls = self.call(['{"confidence": "high"}', '{"answer": "fixed"}'], agent="info")
+        self.assertEqual(result.answer, "fixed")
+        self.assertEqual(calls[1]["agent"], "info_repair")
+        self.assertIn("answer", calls[1]["prompt"])
+        self.assertIn('{"confidence": "high"}', calls[1]["prompt"])
+
+    def test_gives_up_after_one_repair_call(self):
+        with self.assertRaises(StructuredOutputError):
+            self.call(['{"confidence": "high"}', "still not it", '{"answer": "too late"}'], agent="info")
+
+    def test_low_confidence_from_the_fast_model_escalates(self):
+        low = '{"actions": ["info"], "confidence": "low"}'
+        high = '{"actions": ["diagnostic"], "confidence": "high"}'
+        budget = RequestBudget()
+        token = bind_budget(budget)
+        self.addCleanup(unbind_budget, token)
+
+        result, calls = self.call([low, high], PlannerDecision, agent="planner")
+        self.assertEqual(result.actions, ["diagnostic"])
+        self.assertEqual([call["model"] for call in calls], [model_for("planner"), CLAUDE_MODEL])
+        self.assertEqual(budget.escalations, 1)
+
+        for replies, kwargs in [([high], {}), ([low], {"escalate": False}), ([low], {"model": CLAUDE_MODEL})]:
+            with self.subTest(kwargs=kwargs, reply=replies[0]):
+                _, calls = self.call(replies, PlannerDecision, agent="planner", **kwargs)
+                self.assertEqual(len(calls), 1)
+
+
+class StubToolBackend(tools.ToolBackend):
+    name = "stub"
+
+    def __init__(self, results, hang=False):
+        self.results = results
+        self.hang = hang
+        self.calls = []
+
+    async def call(self, name, arguments):
+        self.calls.append(name)
+        if name not in self.results and self.hang:
+            await asyncio.sleep(60)
+        if name not in self.results:
+            raise tools.ToolError(f"{name} is down")
+        return self.results[name]
+
+
+class AgentToolTests(SimpleTestCase):
+    def use_backend(self, backend):
+        previous = tools.set_tool_backend(backend)
+        self.addCleanup(tools.set_tool_backend, previous)
+
+    def test_every_defined_tool_has_a_fake_server_fixture(self):
+        self.assertEqual(set(tools.tool_registry._tools) - set(FIXTURES), set())
+
+    def test_tool_results_reach_the_reasoning_prompt(self):
+        self.use_backend(StubToolBackend({"lookup_glossary_term": {"term": "boost", "definition": "intake pressure"}}))
+        prompts = []
+
+        async def answer(prompt, output_model, **kwargs):
+            prompts.append(prompt)
+            return InfoResult(answer="Boost is intake pressure.")
+
+        state = {"query": "what is boost? any owner reviews?", "car_profile": {}}
+        with mock.patch("TalonAIApp.info.call_structured", side_effect=answer):
+            state = asyncio.run(info.info_pipeline(state))
+
+        self.assertIn('- lookup_glossary_term: {"term":"boost","definition":"intake pressure"}', prompts[0])
+        self.assertNotIn("fetch_forum_threads", prompts[0])
+        self.assertEqual([entry["tool"] for entry in state["tool_trace"]],
+                         ["lookup_glossary_term", "explain_tuning_concept", "fetch_forum_threads"])
+        self.assertIn("error", state["tool_trace"][2])
+
+    def test_no_backend_runs_no_tools(self):
+        self.use_backend(None)
+        prompts = []
+
+        async def answer(prompt, output_model, **kwargs):
+            prompts.append(prompt)
+            return InfoResult(answer="ok")
+
+        with mock.patch("TalonAIApp.info.call_structured", side_effect=answer):
+            state = asyncio.run(info.info_pipeline({"query": "what is boost?", "car_profile": {}}))
+        self.assertIn("Tool Results:\nNone", prompts[0])
+        self.assertNotIn("tool_trace", state)
+
+
+class TraceTests(SimpleTestCase):
+    def test_spans_after_the_trace_finished_are_not_recorded(self):
+        async def scenario():
+            gate = asyncio.Event()
+
+            async def background():
+                await gate.wait()
+                with span("db.query") as late:
+                    return late
+
+            with start_trace("request") as trace:
+                with span("agent"):
+                    task = asyncio.create_task(background())
+            before = [item.span_id for item in trace.spans]
+            gate.set()
+            return trace, before, await task
+
+        trace, before, late = asyncio.run(scenario())
+        self.assertIsNone(late)
+        self.assertEqual([item.span_id for item in trace.spans], before)
+        self.assertEqual(len(before), 2)
+
+    def test_late_finishing_child_is_dropped(self):
+        with start_trace("request") as trace:
+            child = tracing.Span("slow", trace, trace.root, {})
+        child.finish()
+        self.assertEqual([item.name for item in trace.spans], ["request"])
+
+
+class MemoryWriterTests(SimpleTestCase):
+    def test_writer_task_does_not_inherit_the_request_context(self):
+        writer = memory.MemoryWriter(flush_interval=0)
+        spans_seen = []
+
+        async def bulk_create(batch):
+            spans_seen.append(current_span())
+
+        async def scenario():
+            with start_trace("request") as trace:
+                await writer.enqueue(memory.ConversationMemory(user_id="u1", session_id="s1", query="hi"))
+            await writer.close()
+            return trace
+
+        with mock.patch.object(memory, "lifespan_running", return_value=True), \
+                mock.patch.object(memory.ConversationMemory.objects, "abulk_create", side_effect=bulk_create), \
+                mock.patch.object(memory, "prune_memories", return_value=0), \
+                mock.patch.object(memory, "close_old_connections") as close_old_connections:
+            trace = asyncio.run(scenario())
+
+        self.assertEqual(spans_seen, [None])
+        self.assertEqual(len(trace.spans), 1)
+        self.assertEqual(writer.written, 1)
+        self.assertGreaterEqual(close_old_connections.call_count, 2)
+
+
+class ToolPrefetchTests(SimpleTestCase):
+    def setUp(self):
+        self.backend = StubToolBackend({"lookup_glossary_term": {"term": "boost"}, "check_compatibility": {"fits": True}})
+        previous = tools.set_tool_backend(self.backend)
+        self.addCleanup(tools.set_tool_backend, previous)
+
+    def test_tools_run_while_the_planner_decides(self):
+        prompts = []
+
+        async def decide(state, iteration, context):
+            # The planner's LLM call: the tools were started before it and run during it
+            await asyncio.sleep(0.01)
+            self.assertIn("lookup_glossary_term", self.backend.calls)
+            return {"action": "info", "actions": ["info"], "reasoning": "question", "final": True}
+
+        async def answer(prompt, output_model, **kwargs):
+            prompts.append(prompt)
+            return InfoResult(answer="Boost is intake pressure.")
+
+        async def scenario():
+            token = tools.bind_tool_prefetch(tools.ToolPrefetch())
+            try:
+                state = {"query": "what is boost? will an intake fit?", "car_profile": {}, "agent_trace": []}
+                return await planner.run_planner_step(state, 1, mock.Mock())
+            finally:
+                tools.unbind_tool_prefetch(token)
+
+        with mock.patch.object(planner, "fast_path_route", return_value=None), \
+                mock.patch.object(planner, "decide_next_action", side_effect=decide), \
+                mock.patch("TalonAIApp.info.call_structured", side_effect=answer):
+            state, done = asyncio.run(scenario())
+
+        self.assertTrue(done)
+        self.assertIn('- lookup_glossary_term: {"term":"boost"}', prompts[0])
+        self.assertEqual(self.backend.calls.count("lookup_glossary_term"), 1)
+        self.assertEqual({entry["agent"] for entry in state["tool_trace"]}, {"info"})
+
+    def test_identical_calls_share_one_task_and_unused_ones_are_cancelled(self):
+        fixtures = ["check_compatibility", "estimate_power_gains", "suggest_install_order", "estimate_mod_cost"]
+        self.backend.results = {name: {"ok": True} for name in fixtures}
+        self.backend.hang = True
+
+        async def scenario():
+            prefetch = tools.ToolPrefetch()
+            token = tools.bind_tool_prefetch(prefetch)
+            try:
+                tools.prefetch_tools("will an intake fit?", {})
+                first = await tools.fetch_tools("modcoach", "will an intake fit?", {})
+                second = await tools.fetch_tools("buildplanner", "will an intake fit?", {})
+                pending = [future for future in prefetch._calls.values() if not future.done()]
+            finally:
+                tools.unbind_tool_prefetch(token)
+            await asyncio.sleep(0)
+            return first, second, pending
+
+        first, second, pending = asyncio.run(scenario())
+        self.assertEqual(self.backend.calls.count("check_compatibility"), 1)
+        self.assertEqual([entry["agent"] for entry in first + second if entry["tool"] == "check_compatibility"],
+                         ["modcoach", "buildplanner"])
+        self.assertIn("symptom_fault_matcher", self.backend.calls)
+        self.assertTrue(pending)
+        self.assertTrue(all(future.cancelled() for future in pending))
+
+
+class JsonFieldStreamTests(SimpleTestCase):
+    def stream(self, path, text, size):
+        field = JsonFieldStream(path)
+        return "".join(field.feed(text[i:i + size]) for i in range(0, len(text), size))
+
+    def test_streams_only_the_nested_field_across_any_split(self):
+        text = json.dumps({
+            "possible_causes": [{"cause": "coil", "explanation": "not this"}],
+            "diagnosis": {"most_likely_cause": "coil", "explanation": 'Bad "coil" \\ cyl 1\n\u00e9 \U0001f697'},
+        })
+        for size in range(1, 9):
+            self.assertEqual(self.stream(("diagnosis", "explanation"), text, size),
+                             'Bad "coil" \\ cyl 1\n\u00e9 \U0001f697')
+
+    def test_missing_field_streams_nothing(self):
+        self.assertEqual(self.stream(("answer",), json.dumps({"actions": ["end"], "reasoning": "answer"}), 3), "")
+
+
+class PromptCacheTests(SimpleTestCase):
+    def send(self, system, model):
+        requests = []
+
+        async def create(**request):
+            requests.append(request)
+            return SimpleNamespace(
+                usage=SimpleNamespace(input_tokens=1, output_tokens=1),
+                content=[SimpleNamespace(type="text", text="ok")],
+            )
+
+        client = SimpleNamespace(messages=SimpleNamespace(create=create))
+        with mock.patch("TalonAIApp.claude.get_claude_client", return_value=client):
+            asyncio.run(call_claude("hi", model=model, system=system))
+        return requests[0]["system"]
+
+    def test_prefix_below_the_minimum_is_sent_without_markers(self):
+        for agent, instructions in [("info", info.INFO_INSTRUCTIONS), ("diagnostic", diagnostic.DIAGNOSTIC_INSTRUCTIONS)]:
+            with self.subTest(agent=agent):
+                self.assertLess(_system_tokens([cache_block(instructions)]), cache_min_tokens(model_for(agent)))
+                system = self.send([cache_block(instructions)], model_for(agent))
+                self.assertNotIn("cache_control", system[0])
+
+    def test_prefix_at_the_minimum_keeps_its_marker(self):
+        system = self.send([cache_block("word " * 2048)], "claude-3-5-sonnet-20241022")
+        self.assertEqual(system[0]["cache_control"], {"type": "ephemeral"})
+
+
+@override_settings(DEBUG=False)
+class InternalAccessTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        for name, value in [("INTERNAL_API_TOKEN", "s3cret"), ("TRACE_DEBUG_RESPONSE", True)]:
+            patcher = mock.patch.object(views, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def chat_request(self, **headers):
+        body = json.dumps({"query": "hi", "user_id": "u1", "debug": True})
+        return self.factory.post("/chat/", body, content_type="application/json", headers=headers)
+
+    def test_metrics_require_the_internal_token(self):
+        self.assertEqual(views.metrics_view(self.factory.get("/metrics/")).status_code, 403)
+        wrong = self.factory.get("/metrics/", headers={"Authorization": "Bearer nope"})
+        self.assertEqual(views.metrics_view(wrong).status_code, 403)
+        internal = self.factory.get("/metrics/", headers={"Authorization": "Bearer s3cret"})
+        self.assertEqual(views.metrics_view(internal).status_code, 200)
+
+    def test_debug_trace_only_for_internal_callers(self):
+        fields, _ = views.parse_chat_request(self.chat_request())
+        self.assertFalse(fields["debug"])
+        fields, _ = views.parse_chat_request(self.chat_request(Authorization="Bearer s3cret"))
+        self.assertTrue(fields["debug"])
+
+    @override_settings(DEBUG=True)
+    def test_debug_settings_open_both(self):
+        self.assertTrue(views.parse_chat_request(self.chat_request())[0]["debug"])
+        self.assertEqual(views.metrics_view(self.factory.get("/metrics/")).status_code, 200)
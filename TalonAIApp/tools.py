@@ -0,0 +1,381 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import Counter
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from .lifecycle import on_shutdown
+from .tracing import annotate, span
+
+logger = logging.getLogger(__name__)
+
+# Agent tools (DTC lookup, compatibility checks, cost estimates, ...) are served by a backend:
+#   off   - agents run without tools
+#   http  - an MCP server at MCP_SERVER_URL (JSON-RPC tools/call over streamable HTTP)
+# The agent modules only define which tools they use; the data comes from the server.
+MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "")
+MCP_TOOL_BACKEND = os.getenv("MCP_TOOL_BACKEND", "http" if MCP_SERVER_URL else "off")
+# Seconds a tool call may take; a tool can set its own, and MCP_TOOL_TIMEOUT_<NAME> overrides both
+MCP_TOOL_TIMEOUT = float(os.getenv("MCP_TOOL_TIMEOUT", "3.0"))
+MCP_POOL_MAX_CONNECTIONS = int(os.getenv("MCP_POOL_MAX_CONNECTIONS", "20"))
+
+# Arguments every tool takes; tools are picked from the request (see Tool.when), not by a model turn
+TOOL_INPUT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "query": {"type": "string", "description": "The user's question"},
+        "car_profile": {"type": "object", "description": "The user's car profile"},
+    },
+    "required": ["query"],
+}
+
+ToolPredicate = Callable[[str, Dict[str, Any]], bool]
+
+
+class ToolError(Exception):
+    """A tool backend returned an error for a call."""
+
+
+@dataclass
+class Tool:
+    name: str
+    description: str
+    agents: Tuple[str, ...]
+    timeout: float = MCP_TOOL_TIMEOUT
+    # Whether the tool is worth calling for a (query, car_profile); None = always
+    when: Optional[ToolPredicate] = None
+
+    @property
+    def effective_timeout(self) -> float:
+        override = os.getenv(f"MCP_TOOL_TIMEOUT_{self.name.upper()}")
+        return float(override) if override else self.timeout
+
+    def definition(self) -> Dict[str, Any]:
+        """Anthropic / MCP tool definition."""
+        return {"name": self.name, "description": self.description, "input_schema": TOOL_INPUT_SCHEMA}
+
+
+class ToolRegistry:
+    """Tools by name, and which agents use them. Agent modules define theirs at import."""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+
+    def define(
+        self,
+        name: str,
+        description: str,
+        *agents: str,
+        timeout: float = MCP_TOOL_TIMEOUT,
+        when: Optional[ToolPredicate] = None,
+    ) -> Tool:
+        """Declare a tool the MCP server provides, and the agents that call it."""
+        if name in self._tools:
+            raise ValueError(f"Tool {name!r} is already registered")
+        self._tools[name] = tool = Tool(name, " ".join(description.split()), agents, timeout, when)
+        return tool
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def for_agent(self, agent: str) -> List[Tool]:
+        return [tool for tool in self._tools.values() if agent in tool.agents]
+
+    def agents(self) -> List[str]:
+        """Agents that use at least one tool, in definition order."""
+        return list(dict.fromkeys(agent for tool in self._tools.values() for agent in tool.agents))
+
+    def select(self, agent: str, query: str, car_profile: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Tool calls worth making for this request, as {"name", "arguments"} dicts."""
+        profile = car_profile or {}
+        arguments = {"query": query, "car_profile": profile}
+        return [
+            {"name": tool.name, "arguments": arguments}
+            for tool in self.for_agent(agent)
+            if tool.when is None or tool.when(query, profile)
+        ]
+
+    def definitions(self, agent: Optional[str] = None) -> List[Dict[str, Any]]:
+        tools = self.for_agent(agent) if agent else self._tools.values()
+        return [tool.definition() for tool in tools]
+
+
+tool_registry = ToolRegistry()
+
+
+class ToolBackend:
+    """Executes tool calls by name."""
+
+    name = "base"
+
+    async def call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        raise NotImplementedError
+
+    async def aclose(self) -> None:
+        pass
+
+
+class MCPHttpBackend(ToolBackend):
+    """
+    MCP client over streamable HTTP: one `initialize` per session, then JSON-RPC
+    `tools/call` requests on a shared keep-alive pool. Replies may be plain JSON or
+    an SSE stream carrying the JSON-RPC response.
+    """
+
+    name = "http"
+    protocol_version = "2025-03-26"
+
+    def __init__(self, url: str = MCP_SERVER_URL, max_connections: int = MCP_POOL_MAX_CONNECTIONS):
+        if not url:
+            raise ValueError("MCP_SERVER_URL is required for the http tool backend")
+        self.url = url
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._session_id: Optional[str] = None
+        self._initialized: Optional[asyncio.Task] = None
+        self._request_id = 0
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Same rule as the Claude client: httpx pools belong to the loop that created them
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=None)
+            self._loop = loop
+            self._session_id = None
+            self._initialized = None
+        return self._client
+
+    async def _rpc(self, method: str, params: Dict[str, Any], notify: bool = False) -> Any:
+        client = self._get_client()
+        message: Dict[str, Any] = {"jsonrpc": "2.0", "method": method, "params": params}
+        if not notify:
+            self._request_id += 1
+            message["id"] = self._request_id
+        headers = {"Accept": "application/json, text/event-stream"}
+        if self._session_id:
+            headers["Mcp-Session-Id"] = self._session_id
+        response = await client.post(self.url, json=message, headers=headers)
+        response.raise_for_status()
+        if "mcp-session-id" in response.headers:
+            self._session_id = response.headers["mcp-session-id"]
+        if notify:
+            return None
+        reply = self._parse(response)
+        if "error" in reply:
+            raise ToolError(reply["error"].get("message", "MCP error"))
+        return reply.get("result")
+
+    @staticmethod
+    def _parse(response: httpx.Response) -> Dict[str, Any]:
+        if response.headers.get("content-type", "").startswith("text/event-stream"):
+            for line in response.text.splitlines():
+                if line.startswith("data:"):
+                    data = json.loads(line[5:])
+                    if "result" in data or "error" in data:
+                        return data
+            raise ToolError("MCP stream ended without a response")
+        return response.json()
+
+    async def _initialize(self) -> None:
+        await self._rpc("initialize", {
+            "protocolVersion": self.protocol_version,
+            "capabilities": {},
+            "clientInfo": {"name": "talonai", "version": "1.0"},
+        })
+        await self._rpc("notifications/initialized", {}, notify=True)
+
+    async def _ensure_initialized(self) -> None:
+        self._get_client()
+        if self._initialized is None or (self._initialized.done() and self._initialized.exception()):
+            # Concurrent first calls share one handshake
+            self._initialized = asyncio.ensure_future(self._initialize())
+        await asyncio.shield(self._initialized)
+
+    async def call(self, name: str, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        await self._ensure_initialized()
+        result = await self._rpc("tools/call", {"name": name, "arguments": arguments})
+        text = "".join(block.get("text", "") for block in result.get("content", []) if block.get("type") == "text")
+        if result.get("isError"):
+            raise ToolError(text or f"{name} failed")
+        if "structuredContent" in result:
+            return result["structuredContent"]
+        try:
+            return json.loads(text)
+        except ValueError:
+            return {"text": text}
+
+    async def aclose(self) -> None:
+        client, self._client, self._loop = self._client, None, None
+        if client is not None and not client.is_closed:
+            await client.aclose()
+
+
+def make_tool_backend(kind: str = MCP_TOOL_BACKEND) -> Optional[ToolBackend]:
+    if kind == "off":
+        return None
+    if kind == "http":
+        return MCPHttpBackend()
+    raise ValueError(f"MCP_TOOL_BACKEND must be off or http, not {kind!r}")
+
+
+_backend: Optional[ToolBackend] = make_tool_backend()
+_stats: Counter = Counter()
+_latency: Dict[str, float] = {}
+
+
+def get_tool_backend() -> Optional[ToolBackend]:
+    return _backend
+
+
+def set_tool_backend(backend: Optional[ToolBackend]) -> Optional[ToolBackend]:
+    """Swap the process-wide backend (benchmarks, tests); returns the previous one."""
+    global _backend
+    previous, _backend = _backend, backend
+    return previous
+
+
+@on_shutdown
+async def close_tool_backend() -> None:
+    if _backend is not None:
+        await _backend.aclose()
+
+
+async def call_tool(name: str, arguments: Dict[str, Any], agent: Optional[str] = None) -> Dict[str, Any]:
+    """
+    One tool call, bounded by the tool's timeout. Never raises: failures come back as a
+    tool_trace entry with an `error` instead of a `result`.
+    """
+    entry: Dict[str, Any] = {"tool": name, "agent": agent}
+    backend = _backend
+    tool = tool_registry.get(name)
+    timeout = tool.effective_timeout if tool else MCP_TOOL_TIMEOUT
+    started = time.monotonic()
+    with span("tool.call", tool=name, agent=agent, backend=backend.name if backend else None):
+        try:
+            if backend is None:
+                raise ToolError("No tool backend configured")
+            entry["result"] = await asyncio.wait_for(backend.call(name, arguments), timeout)
+            _stats[f"{name}.ok"] += 1
+        except asyncio.TimeoutError:
+            entry["error"] = f"timed out after {timeout}s"
+            _stats[f"{name}.timeout"] += 1
+        except Exception as e:
+            entry["error"] = str(e) or type(e).__name__
+            _stats[f"{name}.error"] += 1
+        if "error" in entry:
+            annotate(error=entry["error"])
+    entry["ms"] = round((time.monotonic() - started) * 1000, 1)
+    _latency[name] = entry["ms"]
+    if "error" in entry:
+        logger.warning("⚠️ Tool %s failed for %s: %s", name, agent, entry["error"])
+    return entry
+
+
+async def run_tool_calls(calls: List[Dict[str, Any]], agent: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Run {"name", "arguments"} tool calls concurrently, results in call order."""
+    return list(await asyncio.gather(*(call_tool(call["name"], call["arguments"], agent) for call in calls)))
+
+
+class ToolPrefetch:
+    """
+    Tool calls of one request, started ahead of the agents that need them.
+
+    While the LLM planner decides which agents to run, the scheduler starts every tool
+    any agent would call for the request (prefetch_tools). The chosen agents then await
+    those calls instead of starting them, so tool latency overlaps the planner call.
+    Identical calls (same tool and arguments) share one task; calls no agent used are
+    cancelled when the request ends.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._used: set = set()
+
+    @staticmethod
+    def _key(call: Dict[str, Any]) -> str:
+        return f"{call['name']}:{json.dumps(call['arguments'], sort_keys=True, default=str)}"
+
+    def start(self, calls: List[Dict[str, Any]], agent: Optional[str] = None) -> List[asyncio.Future]:
+        """The running task of each call, starting the ones not already in flight."""
+        futures = []
+        for call in calls:
+            key = self._key(call)
+            if key not in self._calls:
+                self._calls[key] = asyncio.ensure_future(call_tool(call["name"], call["arguments"], agent))
+                _stats["prefetch.started"] += 1
+            futures.append(self._calls[key])
+        return futures
+
+    async def fetch(self, calls: List[Dict[str, Any]], agent: str) -> List[Dict[str, Any]]:
+        self._used.update(self._key(call) for call in calls)
+        # Shielded: an agent that is cancelled must not cancel a call another agent shares
+        entries = await asyncio.gather(*(asyncio.shield(future) for future in self.start(calls, agent)))
+        return [{**entry, "agent": agent} for entry in entries]
+
+    def cancel(self) -> None:
+        for key, future in self._calls.items():
+            if key not in self._used:
+                _stats["prefetch.unused"] += 1
+                future.cancel()
+
+
+_prefetch: ContextVar[Optional[ToolPrefetch]] = ContextVar("talon_tool_prefetch", default=None)
+
+
+def bind_tool_prefetch(prefetch: Optional[ToolPrefetch]):
+    """Make `prefetch` the current request's; returns a token for unbind_tool_prefetch."""
+    return _prefetch.set(prefetch)
+
+
+def unbind_tool_prefetch(token) -> None:
+    prefetch = _prefetch.get()
+    if prefetch is not None:
+        prefetch.cancel()
+    _prefetch.reset(token)
+
+
+def prefetch_tools(query: str, car_profile: Optional[Dict[str, Any]]) -> None:
+    """Start every agent's applicable tools for this request; a no-op outside a request or with tools off."""
+    prefetch = _prefetch.get()
+    if prefetch is None or _backend is None:
+        return
+    for agent in tool_registry.agents():
+        prefetch.start(tool_registry.select(agent, query, car_profile), agent)
+
+
+async def fetch_tools(agent: str, query: str, car_profile: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Results of the agent's applicable tools for this request, for its reasoning prompt;
+    [] when tools are off. Calls already prefetched for the request are awaited, not repeated.
+    """
+    if _backend is None:
+        return []
+    calls = tool_registry.select(agent, query, car_profile)
+    prefetch = _prefetch.get()
+    if prefetch is None:
+        return await run_tool_calls(calls, agent)
+    return await prefetch.fetch(calls, agent)
+
+
+def add_tool_trace(state: Dict[str, Any], entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Append an agent's tool calls to state["tool_trace"]."""
+    if entries:
+        state["tool_trace"] = (state.get("tool_trace") or []) + entries
+    return state
+
+
+def get_tool_stats() -> Dict[str, Any]:
+    return {
+        "backend": _backend.name if _backend else "off",
+        "tools": len(tool_registry._tools),
+        "calls": dict(_stats),
+        "last_ms": dict(_latency),
+    }
+
@@ -0,0 +1,268 @@
+import asyncio
+import inspect
+import json
+import logging
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from .lifecycle import on_shutdown
+
+logger = logging.getLogger(__name__)
+
+# Request tracing. Spans are only recorded inside a trace started by a view (start_trace);
+# elsewhere span() is a no-op. Tasks spawned during a request inherit its context, so
+# spans opened after the request's trace has finished are not recorded either.
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "")  # JSONL file, one finished trace per line
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))  # share of traces exported
+TRACE_OTEL_ENABLED = os.getenv("TRACE_OTEL_ENABLED", "False") == "True"  # mirror spans to OpenTelemetry
+TRACE_DEBUG_RESPONSE = os.getenv("TRACE_DEBUG_RESPONSE", "False") == "True"  # honour "debug": true from internal callers
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", "500"))  # per trace; extra spans are counted, not kept
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("talon_current_span", default=None)
+
+_otel_tracer: Any = None
+_otel_checked = False
+
+
+def _get_otel_tracer():
+    """OpenTelemetry tracer if enabled and installed (the SDK / exporter is configured by the deployment)."""
+    global _otel_tracer, _otel_checked
+    if not _otel_checked:
+        _otel_checked = True
+        if TRACE_OTEL_ENABLED:
+            try:
+                from opentelemetry import trace as otel_trace
+                _otel_tracer = otel_trace.get_tracer("talonai")
+            except ImportError:
+                logger.warning("⚠️ TRACE_OTEL_ENABLED is set but opentelemetry is not installed")
+    return _otel_tracer
+
+
+class Span:
+    """One timed operation, with OpenTelemetry-style ids and attributes."""
+
+    __slots__ = ("name", "trace", "span_id", "parent_id", "start_ns", "end_ns", "attributes", "status", "_otel")
+
+    def __init__(self, name: str, trace: "Trace", parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace = trace
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes = attributes
+        self.status = "ok"
+        self._otel = None
+        tracer = _get_otel_tracer()
+        if tracer is not None:
+            from opentelemetry import trace as otel_trace
+            context = otel_trace.set_span_in_context(parent._otel) if parent and parent._otel else None
+            self._otel = tracer.start_span(name, context=context, start_time=self.start_ns)
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def finish(self) -> None:
+        self.end_ns = time.time_ns()
+        self.trace.add(self)
+        if self._otel is not None:
+            from opentelemetry.trace import Status, StatusCode
+            for key, value in self.attributes.items():
+                if value is not None:
+                    self._otel.set_attribute(key, value)
+            if self.status == "error":
+                self._otel.set_status(Status(StatusCode.ERROR))
+            self._otel.end(end_time=self.end_ns)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "start_time_unix_nano": self.start_ns,
+            "end_time_unix_nano": self.end_ns,
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+class Trace:
+    """Spans of one request. Finished spans are appended from any task or sync_to_async thread."""
+
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.trace_id = secrets.token_hex(16)
+        self.max_spans = max_spans
+        self.spans: List[Span] = []
+        self.dropped = 0
+        self.root: Optional[Span] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.root is not None and self.root.end_ns is not None
+
+    def add(self, span: Span) -> None:
+        if span is not self.root and self.finished:
+            return  # already exported; a late span would only mutate a closed trace
+        if len(self.spans) < self.max_spans or span is self.root:
+            self.spans.append(span)
+        else:
+            self.dropped += 1
+
+    def breakdown(self) -> Dict[str, Any]:
+        """Per-request latency breakdown: time per span name plus the span tree, in ms from the start."""
+        start = self.root.start_ns if self.root else 0
+        totals: Dict[str, Dict[str, Any]] = {}
+        spans = sorted(self.spans, key=lambda span: span.start_ns)
+        for span in spans:
+            total = totals.setdefault(span.name, {"count": 0, "ms": 0.0})
+            total["count"] += 1
+            total["ms"] += span.duration_ms
+        return {
+            "trace_id": self.trace_id,
+            "duration_ms": round(self.root.duration_ms, 2) if self.root else None,
+            "totals": {name: {"count": total["count"], "ms": round(total["ms"], 2)} for name, total in totals.items()},
+            "spans": [
+                {
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_span_id": span.parent_id,
+                    "start_ms": round((span.start_ns - start) / 1e6, 2),
+                    "duration_ms": round(span.duration_ms, 2),
+                    "status": span.status,
+                    "attributes": span.attributes,
+                }
+                for span in spans
+            ],
+            "dropped_spans": self.dropped,
+        }
+
+
+class JsonlSpanExporter:
+    """
+    Appends finished traces to a JSONL file (one line per span) from a background
+    thread, so request handling never waits on disk writes.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: "queue.SimpleQueue[Optional[List[Dict[str, Any]]]]" = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def export(self, trace: Trace) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-export", daemon=True)
+                self._thread.start()
+        self._queue.put([span.to_dict() for span in trace.spans])
+
+    def _run(self) -> None:
+        while True:
+            spans = self._queue.get()
+            if spans is None:
+                return
+            try:
+                with open(self.path, "a", encoding="utf-8") as file:
+                    for span in spans:
+                        file.write(json.dumps(span, separators=(",", ":"), default=str) + "\n")
+            except OSError as e:
+                logger.warning("⚠️ Trace export to %s failed: %s", self.path, e)
+
+    def close(self, timeout: float = 5.0) -> None:
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join(timeout)
+            self._thread = None
+
+
+exporter = JsonlSpanExporter(TRACE_EXPORT_PATH) if TRACE_EXPORT_PATH else None
+
+
+@on_shutdown
+async def flush_trace_exporter() -> None:
+    if exporter is not None:
+        await asyncio.to_thread(exporter.close)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def annotate(**attributes: Any) -> None:
+    """Add attributes to the innermost open span, if tracing."""
+    active = _current_span.get()
+    if active is not None:
+        active.set(**attributes)
+
+
+@contextmanager
+def _open_span(span: Span) -> Iterator[Span]:
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.attributes["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        span.finish()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            pass  # closed from another context (e.g. an SSE generator finalized after disconnect)
+
+
+@contextmanager
+def start_trace(name: str, **attributes: Any) -> Iterator[Trace]:
+    """Start a request trace with a root span; exported (if configured) when it closes."""
+    trace = Trace()
+    trace.root = Span(name, trace, None, attributes)
+    try:
+        with _open_span(trace.root):
+            yield trace
+    finally:
+        if exporter is not None and random.random() < TRACE_SAMPLE_RATE:
+            exporter.export(trace)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Child span of the current one; a no-op (yields None) outside a trace or after it finished."""
+    parent = _current_span.get()
+    if parent is None or parent.trace.finished:
+        yield None
+        return
+    with _open_span(Span(name, parent.trace, parent, attributes)) as child:
+        yield child
+
+
+def traced(name: str) -> Callable:
+    """Decorator form of span() for sync and async functions."""
+    def decorator(func: Callable) -> Callable:
+        if inspect.iscoroutinefunction(func):
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -4,5 +4,7 @@ from . import views
 urlpatterns = [
     path('', views.root_view),  # Root endpoint
     path('chat/', views.chat_view),
+    path('chat/stream/', views.chat_stream_view),
     path('test/', views.test_view),
+    path('metrics/', views.metrics_view),
 ]
\ No newline at end of file
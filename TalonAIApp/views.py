@@ -1,25 +1,38 @@
+import asyncio
+import hmac
 import json
 import os
 import logging
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import async_only_middleware
-from asgiref.sync import sync_to_async
-from .models import CarProfile, Mod, Symptom, BuildGoal
 from .state import AgentState
 from .agent_loop import run_agent_system
-from .memory import store_conversation_memory
+from .memory import store_conversation_memory, get_memory_writer_stats
+from .request_context import RequestContext
+from .profiles import get_car_profile
 from .profile_updater import update_car_profile_from_query
+from .claude import get_claude_client_stats
+from .resilience import get_resilience_stats
+from .limiter import get_limiter_stats
+from .llm_cache import get_llm_cache_stats
+from .llm_fixtures import get_llm_fixture_stats
+from .db import get_db_pool_stats
+from .tools import get_tool_stats
+from .streaming import format_sse, stream_events
+from .tracing import start_trace, span, TRACE_DEBUG_RESPONSE
+from .logs import log_payload, get_log_handler_stats
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
-# Debug logging function
+# Shared secret of internal callers (ops tooling, load tests); unlocks /metrics/ and debug traces
+INTERNAL_API_TOKEN = os.getenv("INTERNAL_API_TOKEN", "")
+
+# Debug logging function; payloads are only serialized when DEBUG logging is on (see logs.log_payload)
 def debug_log(message, data=None):
-    print(f"🔍 DEBUG: {message}")
-    if data:
-        print(f"📊 DATA: {data}")
-    logger.debug(f"{message} - Data: {data}")
+    log_payload(logger, message, data)
 
 def check_security(request):
     """
@@ -55,46 +68,51 @@ def check_security(request):
     debug_log("✅ Security check passed")
     return True
 
-@csrf_exempt
-@async_only_middleware
-async def chat_view(request):
+def is_internal_request(request) -> bool:
     """
-    Main chat endpoint for the AI agent system
+    Whether the caller may see internals (request traces, process metrics): any request
+    when settings.DEBUG is on, otherwise only `Authorization: Bearer <INTERNAL_API_TOKEN>`.
+    """
+    if settings.DEBUG:
+        return True
+    if not INTERNAL_API_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {INTERNAL_API_TOKEN}")
+
+def parse_chat_request(request):
+    """
+    Validate a chat request.
+
+    Returns (fields, None) on success or (None, JsonResponse) describing the error.
     """
-    debug_log("🚀 Chat view called", f"Method: {request.method}")
-    
     if request.method != "POST":
         debug_log("❌ Wrong method", request.method)
-        return JsonResponse({"error": "POST required"}, status=405)
+        return None, JsonResponse({"error": "POST required"}, status=405)
     
     debug_log("✅ POST method confirmed")
     
     # Security check
     if not check_security(request):
         debug_log("❌ Security check failed")
-        return JsonResponse({"error": "Access denied"}, status=403)
+        return None, JsonResponse({"error": "Access denied"}, status=403)
 
     debug_log("✅ Security check passed")
 
+    # Django's ASGIRequest doesn\'t provide a .json() helper; parse manually
     try:
-        # Django's ASGIRequest doesn\'t provide a .json() helper; parse manually
-        try:
-            body = json.loads(request.body.decode("utf-8"))
-        except Exception as e:
-            debug_log("❌ JSON decode error", str(e))
-            return JsonResponse({"error": "Invalid JSON"}, status=400)
-        debug_log("✅ JSON parsed successfully", body)
-    except json.JSONDecodeError as e:
+        body = json.loads(request.body.decode("utf-8"))
+    except Exception as e:
         debug_log("❌ JSON decode error", str(e))
-        return JsonResponse({"error": "Invalid JSON"}, status=400)
+        return None, JsonResponse({"error": "Invalid JSON"}, status=400)
+    debug_log("✅ JSON parsed successfully", body)
 
     # Validate required fields
     if "query" not in body:
         debug_log("❌ Missing query field")
-        return JsonResponse({"error": "Missing 'query' field"}, status=400)
+        return None, JsonResponse({"error": "Missing 'query' field"}, status=400)
     if "user_id" not in body:
         debug_log("❌ Missing user_id field")
-        return JsonResponse({"error": "Missing 'user_id' field"}, status=400)
+        return None, JsonResponse({"error": "Missing 'user_id' field"}, status=400)
 
     user_query = body["query"].strip()
     user_id = body["user_id"].strip()
@@ -109,88 +127,39 @@ async def chat_view(request):
     # Validate input
     if not user_query:
         debug_log("❌ Empty query")
-        return JsonResponse({"error": "Query cannot be empty"}, status=400)
+        return None, JsonResponse({"error": "Query cannot be empty"}, status=400)
     if not user_id:
         debug_log("❌ Empty user_id")
-        return JsonResponse({"error": "User ID cannot be empty"}, status=400)
-
-    @sync_to_async
-    def get_car_profile(user_id: str) -> dict:
-        """
-        Retrieve car profile and all related data from database
-        """
-        try:
-            from django.db import connection
-            # Close any existing connections to avoid pool issues
-            connection.close()
-            
-            profile, created = CarProfile.objects.get_or_create(
-                user_id=user_id,
-                defaults={
-                    "make": "",
-                    "model": "",
-                    "year": 2020,
-                    "resale_pref": ""
-                }
-            )
-            
-            return {
-                "make": profile.make or "",
-                "model": profile.model or "",
-                "year": profile.year or 2020,
-                "resale_pref": profile.resale_pref or "",
-                "mods": [
-                    {
-                        "name": mod.name,
-                        "brand": mod.brand,
-                        "status": mod.status,
-                        "install_date": mod.install_date.isoformat() if mod.install_date else None,
-                        "notes": mod.notes,
-                        "source_link": mod.source_link
-                    } for mod in profile.mods.all()
-                ],
-                "symptoms": [
-                    {
-                        "description": s.description,
-                        "severity": s.severity,
-                        "resolved": s.resolved,
-                        "resolution_notes": s.resolution_notes
-                    } for s in profile.symptoms.filter(resolved=False)
-                ],
-                "goals": [
-                    {
-                        "goal_type": g.goal_type,
-                        "priority": g.priority,
-                        "notes": g.notes
-                    } for g in profile.goals.all()
-                ]
-            }
-        except Exception as e:
-            print(f"⚠️ Database error loading car profile: {e}")
-            # Return default profile if database error
-            return {
-                "make": "",
-                "model": "",
-                "year": 2020,
-                "resale_pref": "",
-                "mods": [],
-                "symptoms": [],
-                "goals": []
-            }
+        return None, JsonResponse({"error": "User ID cannot be empty"}, status=400)
 
-    try:
-        debug_log("🔍 Loading car profile", user_id)
-        car_profile_dict = await get_car_profile(user_id)
-        debug_log("✅ Car profile loaded", car_profile_dict)
-    except Exception as e:
-        debug_log("❌ Car profile loading failed", str(e))
-        return JsonResponse({"error": f"Failed to load car profile: {str(e)}"}, status=500)
-
-    # Initialize agent state
-    state: AgentState = {
+    return {
         "query": user_query,
         "user_id": user_id,
         "session_id": session_id,
+        # Include the request's latency breakdown in the response (internal callers only)
+        "debug": bool(body.get("debug")) and TRACE_DEBUG_RESPONSE and is_internal_request(request),
+    }, None
+
+def with_trace(result: dict, fields: dict, trace) -> dict:
+    """Response payload, plus the trace breakdown under "trace" for debug requests"""
+    if not fields["debug"]:
+        return result
+    # Copy: the queued memory write still references `result`
+    return {**result, "trace": trace.breakdown()}
+
+async def load_request_data(fields: dict):
+    """Car profile and recent memory for the request, loaded concurrently"""
+    return await asyncio.gather(
+        get_car_profile(fields["user_id"]),
+        RequestContext.load(fields["user_id"], fields["session_id"])
+    )
+
+def build_initial_state(fields: dict, car_profile_dict: dict) -> AgentState:
+    """Initialize agent state for a validated chat request"""
+    return {
+        "query": fields["query"],
+        "user_id": fields["user_id"],
+        "session_id": fields["session_id"],
         "car_profile": car_profile_dict,
         "mod_recommendations": None,
         "symptom_summary": None,
@@ -202,39 +171,109 @@ async def chat_view(request):
         'tool_trace': []
     }
 
+async def save_conversation(fields: dict, result: dict, car_profile_dict: dict) -> None:
+    """Queue the conversation for the background memory writer; failures never fail the request"""
+    debug_log("💾 Queueing conversation memory")
     try:
-        debug_log("🤖 Starting agent system", state)
-        # Run the agentic system (this will use memory automatically)
-        result = await run_agent_system(state)
-        debug_log("✅ Agent system completed", result)
-        
-        # Store the conversation in memory
-        debug_log("💾 Storing conversation memory")
-        try:
+        with span("memory.queue"):
             await store_conversation_memory(
-                user_id=user_id,
-                session_id=session_id,
-                query=user_query,
+                user_id=fields["user_id"],
+                session_id=fields["session_id"],
+                query=fields["query"],
                 agent_trace=result.get("agent_trace", []),
                 final_output=result,
                 car_profile=car_profile_dict
             )
-            debug_log("✅ Memory storage completed")
-        except Exception as e:
-            debug_log("⚠️ Memory storage failed", str(e))
-            # Don't fail the request if memory storage fails
-        
-        debug_log("🚀 Returning response", result)
-        return JsonResponse(result)
-        
+        debug_log("✅ Memory queued")
     except Exception as e:
-        debug_log("❌ Agent system error", str(e))
-        # Return error response if agent system fails
-        return JsonResponse({
-            "error": f"Agent system error: {str(e)}",
-            "type": "error",
-            "message": "Sorry, I encountered an error processing your request. Please try again."
-        }, status=500)
+        logger.warning("⚠️ Memory storage failed: %s", e)
+        # Don't fail the request if memory storage fails
+
+@csrf_exempt
+@async_only_middleware
+async def chat_view(request):
+    """
+    Main chat endpoint for the AI agent system
+    """
+    debug_log("🚀 Chat view called", f"Method: {request.method}")
+    
+    fields, error_response = parse_chat_request(request)
+    if error_response:
+        return error_response
+
+    with start_trace("chat_view", user_id=fields["user_id"], session_id=fields["session_id"]) as trace:
+        try:
+            debug_log("🔍 Loading car profile and memory", fields["user_id"])
+            car_profile_dict, context = await load_request_data(fields)
+            debug_log("✅ Car profile loaded", car_profile_dict)
+        except Exception as e:
+            logger.error("❌ Car profile loading failed: %s", e)
+            return JsonResponse({"error": f"Failed to load car profile: {str(e)}"}, status=500)
+
+        # Initialize agent state
+        state = build_initial_state(fields, car_profile_dict)
+
+        try:
+            debug_log("🤖 Starting agent system", state)
+            # Run the agentic system with the prefetched memory context
+            result = await run_agent_system(state, context=context)
+            debug_log("✅ Agent system completed", result)
+            
+            await save_conversation(fields, result, car_profile_dict)
+            
+            debug_log("🚀 Returning response", result)
+            return JsonResponse(with_trace(result, fields, trace))
+            
+        except Exception as e:
+            logger.exception("❌ Agent system error: %s", e)
+            # Return error response if agent system fails
+            return JsonResponse({
+                "error": f"Agent system error: {str(e)}",
+                "type": "error",
+                "message": "Sorry, I encountered an error processing your request. Please try again."
+            }, status=500)
+
+@csrf_exempt
+@async_only_middleware
+async def chat_stream_view(request):
+    """
+    Streaming chat endpoint: same request body as /chat/, answered as Server-Sent Events.
+
+    Emits `decision`, `agent_start`, `token` and `agent_end` events while the agents run,
+    then a final `result` event carrying the same payload /chat/ would return.
+    """
+    debug_log("🚀 Chat stream view called", f"Method: {request.method}")
+
+    fields, error_response = parse_chat_request(request)
+    if error_response:
+        return error_response
+
+    async def event_stream():
+        yield format_sse("start", {"query": fields["query"], "session_id": fields["session_id"]})
+        with start_trace("chat_stream_view", user_id=fields["user_id"], session_id=fields["session_id"]) as trace:
+            try:
+                car_profile_dict, context = await load_request_data(fields)
+                state = build_initial_state(fields, car_profile_dict)
+                async for event, data in stream_events(run_agent_system(state, context=context)):
+                    if event == "result":
+                        # Flush the answer before the memory write
+                        yield format_sse("result", with_trace(data, fields, trace))
+                        await save_conversation(fields, data, car_profile_dict)
+                    else:
+                        yield format_sse(event, data)
+            except Exception as e:
+                logger.exception("❌ Agent stream error: %s", e)
+                yield format_sse("error", {
+                    "error": f"Agent system error: {str(e)}",
+                    "type": "error",
+                    "message": "Sorry, I encountered an error processing your request. Please try again."
+                })
+        yield format_sse("done", {})
+
+    response = StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"  # disable proxy buffering
+    return response
 
 # Simple test endpoint to verify Django is working
 @csrf_exempt
@@ -250,6 +289,27 @@ def test_view(request):
         "debug": True
     })
 
+# Runtime metrics for connection pools and caches
+@csrf_exempt
+def metrics_view(request):
+    """
+    Process-level metrics (Claude client pool reuse, resilience and rate limiting, LLM response cache,
+    DB pool, memory writer, log queue, agent tools). Internal callers only (see is_internal_request).
+    """
+    if not is_internal_request(request):
+        return JsonResponse({"error": "Access denied"}, status=403)
+    return JsonResponse({
+        "claude_client": get_claude_client_stats(),
+        "claude_resilience": get_resilience_stats(),
+        "llm_limiter": get_limiter_stats(),
+        "llm_cache": get_llm_cache_stats(),
+        "llm_fixtures": get_llm_fixture_stats(),
+        "database": get_db_pool_stats(),
+        "memory_writer": get_memory_writer_stats(),
+        "logging": get_log_handler_stats(),
+        "tools": get_tool_stats(),
+    })
+
 # Root endpoint to handle base URL requests
 @csrf_exempt
 def root_view(request):
@@ -263,13 +323,15 @@ def root_view(request):
         "status": "running",
         "endpoints": {
             "chat": "/chat/ (POST) - Main AI chat endpoint",
-            "test": "/test/ (GET/POST) - Health check endpoint"
+            "chat_stream": "/chat/stream/ (POST) - Same as /chat/, streamed as Server-Sent Events",
+            "test": "/test/ (GET/POST) - Health check endpoint",
+            "metrics": "/metrics/ (GET) - Connection pool and cache metrics (internal callers only)"
         },
         "usage": {
             "chat": {
                 "method": "POST",
                 "required_fields": ["query", "user_id"],
-                "optional_fields": ["session_id"],
+                "optional_fields": ["session_id", "debug"],
                 "example": {
                     "query": "I want to add more horsepower to my car",
                     "user_id": "user123",
@@ -13,4 +13,27 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TalonAILinux.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported after Django setup; TalonaiappConfig.ready() registers the app's hooks
+from TalonAIApp.lifecycle import run_startup_hooks, run_shutdown_hooks  # noqa: E402
+
+
+async def application(scope, receive, send):
+    """
+    Django's ASGI handler only speaks HTTP, so lifespan events are handled here
+    to open and close process-wide resources (e.g. the shared Claude client).
+    """
+    if scope["type"] != "lifespan":
+        await django_application(scope, receive, send)
+        return
+
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await run_startup_hooks()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await run_shutdown_hooks()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
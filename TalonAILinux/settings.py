@@ -26,7 +26,7 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-default-key-for-development')
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True  # Enabled for debugging
+DEBUG = os.getenv('DEBUG', 'False') == 'True'
 
 ALLOWED_HOSTS = [
     'talonaibackend.onrender.com',  # Your backend hosting
@@ -86,15 +86,64 @@ WSGI_APPLICATION = 'TalonAILinux.wsgi.application'
 
 import dj_database_url
 
+# Connection pooling profile:
+#   "psycopg"   - Django 5.1's built-in psycopg 3 pool (direct / session-mode Postgres)
+#   "pgbouncer" - persistent connections behind a transaction-mode pooler
+#                 (PgBouncer / Supabase port 6543)
+#   "none"      - open and close a connection per request
+DB_POOL_MODE = os.getenv('DB_POOL_MODE', 'psycopg')
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', '1'))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', '5'))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', '10'))  # seconds to wait for a free connection
+DB_POOL_MAX_IDLE = float(os.getenv('DB_POOL_MAX_IDLE', '300'))  # close idle connections after this
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', '60'))  # pgbouncer profile only
+# Verify connections before use (pool checkout / persistent-connection reuse)
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'True') == 'True'
+# Supabase requires SSL; local Postgres (e.g. the benchmark container) usually has none
+DB_SSL_REQUIRE = os.getenv('DB_SSL_REQUIRE', 'True') == 'True'
+
 DATABASES = {
     'default': dj_database_url.config(
         default=os.getenv('db_key'),
-        conn_max_age=0,  # Disable connection pooling to avoid pool limits
-        ssl_require=True,  # required by Supabase
-        conn_health_checks=False  # Disable health checks to reduce connections
+        # The psycopg pool requires non-persistent Django connections
+        conn_max_age=DB_CONN_MAX_AGE if DB_POOL_MODE == 'pgbouncer' else 0,
+        ssl_require=DB_SSL_REQUIRE,
+        conn_health_checks=DB_HEALTH_CHECKS and DB_POOL_MODE != 'none'
     )
 }
 
+if DATABASES['default'].get('ENGINE') == 'django.db.backends.postgresql':
+    db_options = DATABASES['default'].setdefault('OPTIONS', {})
+    if DB_POOL_MODE == 'psycopg':
+        # Requires psycopg_pool; CONN_HEALTH_CHECKS makes Django check connections on checkout
+        db_options['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+            'max_idle': DB_POOL_MAX_IDLE,
+        }
+    elif DB_POOL_MODE == 'pgbouncer':
+        # Transaction-mode poolers can't keep server-side cursors or prepared statements
+        DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+        db_options['prepare_threshold'] = None
+
+# Cache (car profiles); Redis when REDIS_URL is set, per-process memory otherwise
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+            'KEY_PREFIX': 'talonai',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'talonai',
+        }
+    }
+
 
 
 # Password validation
@@ -174,29 +223,38 @@ CORS_ALLOW_METHODS = [
     'OPTIONS',
 ]
 
-# Logging configuration for debugging
+# Logging
+#   "development" - readable lines, TalonAIApp at DEBUG with full (truncated) request payloads
+#   "production"  - JSON lines, INFO, debug payloads sampled and reduced to their shape
+# Records are written by a background listener thread so logging never blocks the event loop.
+LOG_PROFILE = os.getenv('LOG_PROFILE', 'development' if DEBUG else 'production')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG' if LOG_PROFILE == 'development' else 'INFO')
+LOG_PAYLOAD_SAMPLE_RATE = float(os.getenv('LOG_PAYLOAD_SAMPLE_RATE', '1.0' if LOG_PROFILE == 'development' else '0.01'))
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
     'handlers': {
-        'console': {
-            'class': 'logging.StreamHandler',
+        'async': {
+            '()': 'TalonAIApp.logs.AsyncQueueHandler',
+            'json': LOG_PROFILE == 'production',
         },
     },
     'root': {
-        'handlers': ['console'],
-        'level': 'DEBUG',
+        'handlers': ['async'],
+        'level': 'INFO',
     },
     'loggers': {
         'django': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
+            # DEBUG here logs every SQL query
+            'level': os.getenv('DJANGO_LOG_LEVEL', 'INFO'),
         },
         'TalonAIApp': {
-            'handlers': ['console'],
-            'level': 'DEBUG',
-            'propagate': False,
+            'level': LOG_LEVEL,
+        },
+        'httpx': {
+            # INFO logs a line per Claude request
+            'level': 'WARNING',
         },
     },
 }
@@ -0,0 +1,223 @@
+"""
+Local stand-in for the Anthropic Messages API, for benchmarks.
+
+    python -m benchmarks.fake_anthropic --port 8765 --latency-median 0.8 --latency-sigma 0.4 \
+        --output-tokens-per-second 80 --error-rate 0.02
+
+Point the app at it with ANTHROPIC_BASE_URL=http://127.0.0.1:8765.
+
+- Response time: a log-normal first-token latency (median / sigma), plus the output
+  tokens generated at --output-tokens-per-second. Streams are paced the same way.
+- Errors: --error-rate of requests fail with a status drawn from --error-statuses;
+  429s carry a retry-after-ms header like the real API.
+- Content: forced tool calls get a minimal object generated from the tool's
+  input_schema. Planner decisions return --planner-actions on the first turn of a
+  request and `end` once the conversation has history.
+- GET /stats returns request / error / token counters; POST /stats/reset clears them.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+
+@dataclass
+class FakeConfig:
+    latency_median: float = 0.8  # seconds to first token
+    latency_sigma: float = 0.4  # log-normal shape; 0 makes latency constant
+    output_tokens_per_second: float = 80.0
+    error_rate: float = 0.0
+    error_statuses: List[int] = field(default_factory=lambda: [429, 529, 500])
+    planner_actions: List[str] = field(default_factory=lambda: ["diagnostic", "modcoach"])
+    text_tokens: int = 150  # length of plain-text (non-tool) answers
+    seed: Optional[int] = None
+
+
+def sample_from_schema(schema: Dict[str, Any], name: str = "value") -> Any:
+    """Smallest plausible instance of a JSON schema: every property, one list item."""
+    if "enum" in schema:
+        return schema["enum"][0]
+    if "anyOf" in schema:
+        options = [option for option in schema["anyOf"] if option.get("type") != "null"]
+        return sample_from_schema(options[0] if options else {"type": "null"}, name)
+    kind = schema.get("type")
+    if kind == "object":
+        return {key: sample_from_schema(value, key) for key, value in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [sample_from_schema(schema.get("items", {}), name)]
+    if kind == "integer":
+        return 1
+    if kind == "number":
+        return 1.0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return f"Sample {name.replace('_', ' ')} from the benchmark stand-in."
+
+
+def estimate_tokens(data: Any) -> int:
+    return max(1, len(json.dumps(data)) // 4)
+
+
+class FakeAnthropic:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self.stats: Counter = Counter()
+        self.by_tool: Counter = Counter()
+        self.by_model: Counter = Counter()
+        self._cached_prefixes: set = set()
+
+    def latency(self) -> float:
+        if self.config.latency_sigma <= 0:
+            return self.config.latency_median
+        return self.random.lognormvariate(0, self.config.latency_sigma) * self.config.latency_median
+
+    def tool_input(self, tool: Dict[str, Any], body: Dict[str, Any]) -> Dict[str, Any]:
+        if tool["name"] == "planner_decision":
+            follow_up = any(message["role"] == "assistant" for message in body["messages"])
+            actions = ["end"] if follow_up else self.config.planner_actions
+            return {"actions": actions, "reasoning": "Benchmark stand-in decision", "confidence": "high",
+                    "final": follow_up}
+        return sample_from_schema(tool["input_schema"], tool["name"])
+
+    def usage(self, body: Dict[str, Any], output: Any) -> Dict[str, int]:
+        """Token usage, with system blocks marked cache_control reported as cache reads after first use."""
+        usage = {"input_tokens": estimate_tokens(body["messages"]), "output_tokens": estimate_tokens(output),
+                 "cache_read_input_tokens": 0, "cache_creation_input_tokens": 0}
+        system = body.get("system")
+        if system:
+            system_tokens = estimate_tokens(system)
+            cached = isinstance(system, list) and any("cache_control" in block for block in system)
+            key = hashlib.sha256(json.dumps(system, sort_keys=True).encode()).hexdigest()
+            if not cached:
+                usage["input_tokens"] += system_tokens
+            elif key in self._cached_prefixes:
+                usage["cache_read_input_tokens"] = system_tokens
+            else:
+                self._cached_prefixes.add(key)
+                usage["cache_creation_input_tokens"] = system_tokens
+        return usage
+
+    async def messages(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        tool = body["tools"][0] if body.get("tools") else None
+        self.stats["requests"] += 1
+        self.by_tool[tool["name"] if tool else "text"] += 1
+        self.by_model[body.get("model", "")] += 1
+
+        await asyncio.sleep(self.latency())
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            status = self.random.choice(self.config.error_statuses)
+            self.stats["errors"] += 1
+            self.stats[f"error_{status}"] += 1
+            error_type = {429: "rate_limit_error", 529: "overloaded_error"}.get(status, "api_error")
+            headers = {"retry-after-ms": "200"} if status == 429 else {}
+            return web.json_response(
+                {"type": "error", "error": {"type": error_type, "message": "Injected by the benchmark stand-in"}},
+                status=status, headers=headers,
+            )
+
+        if tool:
+            output: Any = self.tool_input(tool, body)
+            content = [{"type": "tool_use", "id": "toolu_bench", "name": tool["name"], "input": output}]
+        else:
+            output = " ".join(["benchmark"] * self.config.text_tokens)
+            content = [{"type": "text", "text": output}]
+        usage = self.usage(body, output)
+        self.stats["input_tokens"] += usage["input_tokens"]
+        self.stats["output_tokens"] += usage["output_tokens"]
+        generation_time = usage["output_tokens"] / self.config.output_tokens_per_second
+
+        if body.get("stream"):
+            return await self.stream(request, body, tool, output, usage, generation_time)
+        await asyncio.sleep(generation_time)
+        return web.json_response({
+            "id": "msg_bench", "type": "message", "role": "assistant", "model": body["model"],
+            "content": content, "stop_reason": "tool_use" if tool else "end_turn", "stop_sequence": None,
+            "usage": usage,
+        })
+
+    async def stream(self, request, body, tool, output, usage, generation_time) -> web.StreamResponse:
+        response = web.StreamResponse(headers={"content-type": "text/event-stream"})
+        await response.prepare(request)
+
+        async def send(event: str, data: Dict[str, Any]) -> None:
+            await response.write(f"event: {event}\ndata: {json.dumps(data)}\n\n".encode())
+
+        await send("message_start", {"type": "message_start", "message": {
+            "id": "msg_bench", "type": "message", "role": "assistant", "model": body["model"], "content": [],
+            "stop_reason": None, "stop_sequence": None, "usage": {**usage, "output_tokens": 0},
+        }})
+        if tool:
+            block = {"type": "tool_use", "id": "toolu_bench", "name": tool["name"], "input": {}}
+            text, delta_type, delta_key = json.dumps(output), "input_json_delta", "partial_json"
+        else:
+            block = {"type": "text", "text": ""}
+            text, delta_type, delta_key = output, "text_delta", "text"
+        await send("content_block_start", {"type": "content_block_start", "index": 0, "content_block": block})
+        chunks = [text[i:i + 16] for i in range(0, len(text), 16)]
+        for chunk in chunks:
+            await send("content_block_delta", {"type": "content_block_delta", "index": 0,
+                                               "delta": {"type": delta_type, delta_key: chunk}})
+            await asyncio.sleep(generation_time / len(chunks))
+        await send("content_block_stop", {"type": "content_block_stop", "index": 0})
+        await send("message_delta", {"type": "message_delta",
+                                     "delta": {"stop_reason": "tool_use" if tool else "end_turn", "stop_sequence": None},
+                                     "usage": {"output_tokens": usage["output_tokens"]}})
+        await send("message_stop", {"type": "message_stop"})
+        return response
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.stats, "by_tool": self.by_tool, "by_model": self.by_model})
+
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        self.stats.clear()
+        self.by_tool.clear()
+        self.by_model.clear()
+        return web.json_response({"ok": True})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/v1/messages", self.messages)
+        app.router.add_get("/stats", self.get_stats)
+        app.router.add_post("/stats/reset", self.reset_stats)
+        return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency-median", type=float, default=FakeConfig.latency_median)
+    parser.add_argument("--latency-sigma", type=float, default=FakeConfig.latency_sigma)
+    parser.add_argument("--output-tokens-per-second", type=float, default=FakeConfig.output_tokens_per_second)
+    parser.add_argument("--error-rate", type=float, default=FakeConfig.error_rate)
+    parser.add_argument("--error-statuses", default="429,529,500")
+    parser.add_argument("--planner-actions", default="diagnostic,modcoach")
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeConfig:
+    return FakeConfig(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        output_tokens_per_second=args.output_tokens_per_second,
+        error_rate=args.error_rate,
+        error_statuses=[int(status) for status in args.error_statuses.split(",") if status],
+        planner_actions=[action for action in args.planner_actions.split(",") if action],
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(FakeAnthropic(config_from_args(args)).app(), host=args.host, port=args.port, print=None)
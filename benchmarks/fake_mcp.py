@@ -0,0 +1,164 @@
+"""
+Local MCP server for the agent tools, for benchmarks and tests.
+
+    python -m benchmarks.fake_mcp --port 8766 --latency-median 0.3 --error-rate 0.05
+
+Point the app at it with MCP_SERVER_URL=http://127.0.0.1:8766/mcp.
+
+- Speaks the JSON-RPC subset of MCP streamable HTTP the app uses: initialize (with an
+  Mcp-Session-Id), notifications/initialized, tools/list and tools/call.
+- Tools are the ones the agent modules define (TalonAIApp.tools.tool_registry); each call
+  returns the canned result from benchmarks.mcp_fixtures after a log-normal delay.
+  --slow-tools makes named tools exceed their timeout.
+- --error-rate of tool calls return an MCP tool error (isError).
+- GET /stats returns call / error counters; POST /stats/reset clears them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from aiohttp import web
+
+from benchmarks.mcp_fixtures import FIXTURES
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class FakeMCPConfig:
+    latency_median: float = 0.2  # seconds per tool call
+    latency_sigma: float = 0.5  # log-normal shape; 0 makes latency constant
+    error_rate: float = 0.0
+    slow_tools: List[str] = field(default_factory=list)  # these sleep --slow-seconds
+    slow_seconds: float = 30.0
+    seed: Optional[int] = None
+
+
+def load_registry():
+    """The app's tool registry; importing the agent modules needs Django configured."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, str(ROOT))
+    import django
+    django.setup()
+    import TalonAIApp.planner  # noqa: F401  (imports every agent module, defining its tools)
+    from TalonAIApp.tools import tool_registry
+    return tool_registry
+
+
+class FakeMCP:
+    def __init__(self, config: FakeMCPConfig, registry):
+        self.config = config
+        self.registry = registry
+        self.random = random.Random(config.seed)
+        self.stats: Counter = Counter()
+        self.by_tool: Counter = Counter()
+        self.sessions: set = set()
+
+    def latency(self, name: str) -> float:
+        if name in self.config.slow_tools:
+            return self.config.slow_seconds
+        if self.config.latency_sigma <= 0:
+            return self.config.latency_median
+        return self.random.lognormvariate(0, self.config.latency_sigma) * self.config.latency_median
+
+    async def call_tool(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        name = params.get("name", "")
+        self.stats["tool_calls"] += 1
+        self.by_tool[name] += 1
+        await asyncio.sleep(self.latency(name))
+        fixture = FIXTURES.get(name)
+        if self.registry.get(name) is None or fixture is None:
+            self.stats["errors"] += 1
+            return {"content": [{"type": "text", "text": f"Unknown tool: {name}"}], "isError": True}
+        if self.config.error_rate and self.random.random() < self.config.error_rate:
+            self.stats["errors"] += 1
+            return {"content": [{"type": "text", "text": "Injected by the MCP stand-in"}], "isError": True}
+        result = fixture(**(params.get("arguments") or {}))
+        return {"content": [{"type": "text", "text": json.dumps(result)}], "structuredContent": result}
+
+    async def rpc(self, request: web.Request) -> web.Response:
+        message = await request.json()
+        method = message.get("method")
+        headers: Dict[str, str] = {}
+        if method == "initialize":
+            session = uuid.uuid4().hex
+            self.sessions.add(session)
+            headers["Mcp-Session-Id"] = session
+            self.stats["sessions"] += 1
+            result: Any = {
+                "protocolVersion": message["params"].get("protocolVersion", "2025-03-26"),
+                "capabilities": {"tools": {}},
+                "serverInfo": {"name": "talonai-fake-mcp", "version": "1.0"},
+            }
+        elif "id" not in message:
+            return web.Response(status=202)  # notification
+        elif request.headers.get("Mcp-Session-Id") not in self.sessions:
+            return web.json_response({"jsonrpc": "2.0", "id": message["id"],
+                                      "error": {"code": -32001, "message": "Unknown or missing session"}},
+                                     status=404)
+        elif method == "tools/list":
+            result = {"tools": [
+                {"name": definition["name"], "description": definition["description"],
+                 "inputSchema": definition["input_schema"]}
+                for definition in self.registry.definitions()
+            ]}
+        elif method == "tools/call":
+            result = await self.call_tool(message.get("params") or {})
+        else:
+            return web.json_response({"jsonrpc": "2.0", "id": message["id"],
+                                      "error": {"code": -32601, "message": f"Method not found: {method}"}})
+        return web.json_response({"jsonrpc": "2.0", "id": message.get("id"), "result": result}, headers=headers)
+
+    async def get_stats(self, request: web.Request) -> web.Response:
+        return web.json_response({**self.stats, "by_tool": self.by_tool})
+
+    async def reset_stats(self, request: web.Request) -> web.Response:
+        self.stats.clear()
+        self.by_tool.clear()
+        return web.json_response({"ok": True})
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/mcp", self.rpc)
+        app.router.add_get("/stats", self.get_stats)
+        app.router.add_post("/stats/reset", self.reset_stats)
+        return app
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--latency-median", type=float, default=FakeMCPConfig.latency_median)
+    parser.add_argument("--latency-sigma", type=float, default=FakeMCPConfig.latency_sigma)
+    parser.add_argument("--error-rate", type=float, default=FakeMCPConfig.error_rate)
+    parser.add_argument("--slow-tools", default="", help="Comma-separated tools that never answer in time")
+    parser.add_argument("--slow-seconds", type=float, default=FakeMCPConfig.slow_seconds)
+    parser.add_argument("--seed", type=int, default=None)
+    return parser.parse_args(argv)
+
+
+def config_from_args(args: argparse.Namespace) -> FakeMCPConfig:
+    return FakeMCPConfig(
+        latency_median=args.latency_median,
+        latency_sigma=args.latency_sigma,
+        error_rate=args.error_rate,
+        slow_tools=[name for name in args.slow_tools.split(",") if name],
+        slow_seconds=args.slow_seconds,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    web.run_app(FakeMCP(config_from_args(args), load_registry()).app(), host=args.host, port=args.port, print=None,
+                access_log=None)
@@ -0,0 +1,87 @@
+"""
+Cold import time of the app, the part of worker boot / autoscale cold start that is ours.
+
+    python -m benchmarks.import_time --repeat 5
+    python -X importtime -m benchmarks.import_time --repeat 1 2> imports.txt   # per-module detail
+
+Each run is a fresh interpreter that calls django.setup() and imports TalonAIApp.views
+(which pulls in every agent module), and reports the wall time and which heavy optional
+stacks ended up loaded. LangChain and the OpenAI SDK should never be in that list; the
+legacy templates that need them live in TalonAIApp.legacy_prompts, which is opt-in.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Any, Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+# Packages the request path must not import
+HEAVY_MODULES = ["langchain", "langchain_core", "langchain_openai", "openai"]
+
+_PROBE = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import {module}
+print(json.dumps({{
+    "seconds": time.perf_counter() - started,
+    "modules": len(sys.modules),
+    "heavy": [name for name in {heavy!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(module: str = "TalonAIApp.views", settings: str = "benchmarks.settings") -> Dict[str, Any]:
+    """Import `module` after django.setup() in a fresh interpreter; time, module count and heavy imports."""
+    env = {
+        **os.environ,
+        "DJANGO_SETTINGS_MODULE": settings,
+        "PYTHONPATH": os.pathsep.join(filter(None, [str(ROOT), os.environ.get("PYTHONPATH")])),
+    }
+    env.setdefault("ANTHROPIC_API_KEY", "import-time")
+    env.setdefault("LOG_LEVEL", "WARNING")
+    result = subprocess.run(
+        [sys.executable, "-c", _PROBE.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def run(repeat: int, module: str, settings: str) -> Dict[str, Any]:
+    runs: List[Dict[str, Any]] = [measure(module, settings) for _ in range(repeat)]
+    seconds = sorted(run["seconds"] for run in runs)
+    return {
+        "module": module,
+        "runs": repeat,
+        "min_s": round(seconds[0], 3),
+        "median_s": round(statistics.median(seconds), 3),
+        "max_s": round(seconds[-1], 3),
+        "modules": runs[-1]["modules"],
+        "heavy": runs[-1]["heavy"],
+    }
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--module", default="TalonAIApp.views")
+    parser.add_argument("--settings", default="benchmarks.settings")
+    parser.add_argument("--json", action="store_true", help="Print the result as JSON")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run(args.repeat, args.module, args.settings)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print(f"{report['module']}: median {report['median_s']}s (min {report['min_s']}s, max {report['max_s']}s) "
+              f"over {report['runs']} runs, {report['modules']} modules loaded")
+        print(f"heavy imports: {', '.join(report['heavy']) or 'none'}")
+    sys.exit(1 if report["heavy"] else 0)
@@ -0,0 +1,222 @@
+"""
+Canned tool results served by benchmarks.fake_mcp.
+
+Fixed sample data shaped like real tool replies, so load tests exercise tool latency,
+prompt size and tool_trace serialization. None of it is true for the user's car; the app
+itself only declares the tools (TalonAIApp.tools.tool_registry) and never serves these.
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+Fixture = Callable[..., Dict[str, Any]]
+
+FIXTURES: Dict[str, Fixture] = {}
+
+
+def fixture(handler: Fixture) -> Fixture:
+    """Serve `handler` for the tool of the same name."""
+    FIXTURES[handler.__name__] = handler
+    return handler
+
+
+def describe_car(car_profile: Optional[Dict[str, Any]]) -> str:
+    """"2023 Acura Integra" from a car profile, or "your car" when it is empty."""
+    profile = car_profile or {}
+    label = " ".join(str(profile[key]) for key in ("year", "make", "model") if profile.get(key))
+    return label if profile.get("make") or profile.get("model") else "your car"
+
+
+def _mod_names(car_profile: Optional[Dict[str, Any]]) -> List[str]:
+    return [mod["name"] if isinstance(mod, dict) else str(mod) for mod in (car_profile or {}).get("mods") or []]
+
+
+# info
+
+@fixture
+def lookup_glossary_term(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "term": "horsepower",
+        "definition": "A unit of power equal to 550 foot-pounds per second, used to measure engine output",
+        "context": "In automotive terms, horsepower measures the engine's ability to do work over time",
+        "related_terms": ["torque", "brake horsepower", "wheel horsepower"]
+    }
+
+
+@fixture
+def tech_spec_lookup(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "specification": "2023 Acura Integra Engine",
+        "displacement": "1.5L Turbo",
+        "stock_horsepower": "200 HP",
+        "stock_torque": "192 lb-ft",
+        "compression_ratio": "10.3:1",
+        "fuel_system": "Direct Injection"
+    }
+
+
+@fixture
+def explain_tuning_concept(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "concept": "ECU Tuning",
+        "explanation": "ECU tuning modifies the engine control unit's software to optimize air/fuel ratios, ignition timing, and boost pressure for better performance",
+        "benefits": ["Increased horsepower", "Better throttle response", "Improved fuel efficiency"],
+        "risks": ["Voided warranty", "Potential engine damage if done incorrectly"]
+    }
+
+
+@fixture
+def fetch_forum_threads(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "threads": [
+            {
+                "title": "Best mods for 2023 Integra",
+                "author": "IntegraOwner2023",
+                "replies": 45,
+                "key_points": ["Cold air intake first", "Exhaust system next", "ECU tune for best results"]
+            },
+            {
+                "title": "Dyno results after intake + exhaust",
+                "author": "ModdedIntegra",
+                "replies": 23,
+                "key_points": ["+22 HP gain", "Better sound", "Improved throttle response"]
+            }
+        ]
+    }
+
+
+# diagnostic
+
+DTC_PATTERN = re.compile(r"\b[PBCU][0-3][0-9A-F]{3}\b", re.IGNORECASE)
+DTC_DESCRIPTIONS = {
+    "P0300": "Random/Multiple Cylinder Misfire Detected",
+    "P0301": "Cylinder 1 Misfire Detected",
+    "P0302": "Cylinder 2 Misfire Detected",
+    "P0303": "Cylinder 3 Misfire Detected",
+    "P0304": "Cylinder 4 Misfire Detected",
+    "P0171": "System Too Lean (Bank 1)",
+    "P0420": "Catalyst System Efficiency Below Threshold (Bank 1)",
+}
+
+
+@fixture
+def lookup_official_dtc(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    codes = list(dict.fromkeys(code.upper() for code in DTC_PATTERN.findall(query)))
+    return {
+        "dtc_codes": codes,
+        "descriptions": [DTC_DESCRIPTIONS.get(code, "Unknown code") for code in codes],
+        "severity": "Medium",
+        "common_causes": ["Faulty spark plugs", "Bad ignition coils", "Vacuum leaks", "Low fuel pressure"]
+    }
+
+
+@fixture
+def symptom_fault_matcher(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "matched_symptoms": ["engine misfire", "rough idle", "power loss"],
+        "likely_causes": [
+            {"cause": "Faulty ignition system", "confidence": 85},
+            {"cause": "Vacuum leak", "confidence": 70},
+            {"cause": "Fuel system issue", "confidence": 60}
+        ],
+        "diagnostic_steps": [
+            "Check spark plugs and ignition coils",
+            "Inspect for vacuum leaks",
+            "Test fuel pressure",
+            "Scan for trouble codes"
+        ]
+    }
+
+
+@fixture
+def get_known_issues(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "known_issues": [
+            {
+                "issue": "Ignition coil failure",
+                "frequency": f"Common on {describe_car(car_profile)}",
+                "symptoms": ["Misfire", "Rough idle", "Check engine light"],
+                "solution": "Replace affected ignition coil(s)"
+            },
+            {
+                "issue": "Turbo wastegate sticking",
+                "frequency": "Occasional",
+                "symptoms": ["Power loss", "Boost issues", "Engine hesitation"],
+                "solution": "Clean or replace wastegate actuator"
+            }
+        ],
+        "tsb_references": ["TSB-2023-001", "TSB-2023-015"]
+    }
+
+
+# modcoach / buildplanner
+
+@fixture
+def check_compatibility(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "installed_mods": _mod_names(car_profile),
+        "compatible_parts": [
+            "Injen Cold Air Intake",
+            "AWE Touring Exhaust",
+            "Hondata FlashPro",
+            "PRL Intercooler",
+            "RV6 Downpipe"
+        ],
+        "incompatible_parts": [],
+        "fitment_notes": f"Suggested intake, exhaust and tune parts fit the {describe_car(car_profile)} platform",
+        "installation_difficulty": "Easy to Moderate",
+        "warranty_impact": "Some mods may void powertrain warranty"
+    }
+
+
+@fixture
+def estimate_power_gains(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "estimated_hp_gain": "15-25 HP",
+        "estimated_tq_gain": "10-15 lb-ft",
+        "dyno_notes": f"Based on similar builds on the {describe_car(car_profile)} platform",
+        "recommended_tune": "Stage 1 ECU tune recommended for optimal gains"
+    }
+
+
+@fixture
+def price_analysis(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "total_cost": "$800-1200",
+        "cost_breakdown": {
+            "intake": "$200-300",
+            "exhaust": "$400-600",
+            "tune": "$200-300"
+        },
+        "value_rating": "High - Good power per dollar ratio"
+    }
+
+
+@fixture
+def suggest_install_order(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "optimal_order": [
+            {"stage": 1, "mods": ["Cold Air Intake", "High Flow Air Filter"]},
+            {"stage": 2, "mods": ["Cat-Back Exhaust System"]},
+            {"stage": 3, "mods": ["ECU Tune", "Downpipe"]},
+            {"stage": 4, "mods": ["Intercooler Upgrade", "Charge Pipes"]},
+            {"stage": 5, "mods": ["Turbo Upgrade", "Fuel System"]}
+        ],
+        "reasoning": "This order maximizes gains while maintaining reliability",
+        "estimated_timeline": "3-6 months for full build"
+    }
+
+
+@fixture
+def estimate_mod_cost(query: str, car_profile: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return {
+        "total_build_cost": "$3,500-5,200",
+        "cost_breakdown": {
+            "stage_1": "$400-600",
+            "stage_2": "$800-1200",
+            "stage_3": "$1200-1800",
+            "stage_4": "$600-900",
+            "stage_5": "$500-700"
+        },
+        "labor_estimate": "$800-1200",
+        "dyno_tuning": "$300-500"
+    }
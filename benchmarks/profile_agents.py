@@ -0,0 +1,117 @@
+"""
+Profile the request path in-process against recorded Claude responses, with no network.
+
+    # 1. Record fixtures once (against the real API or the benchmark stand-in)
+    LLM_FIXTURE_MODE=record LLM_FIXTURE_PATH=fixtures.jsonl.gz python -m benchmarks.profile_agents
+
+    # 2. Replay them under cProfile; --latency-scale 1 waits the recorded latencies
+    python -m benchmarks.profile_agents --fixtures fixtures.jsonl.gz --profile agents.prof
+
+Each query goes through /chat/ (views, run_agent_system, format_agent_response and the
+DB paths) on a fresh SQLite database, so recorded and replayed prompts match as long as
+both runs use the same arguments. Replays of the same fixtures see identical LLM
+traffic, which makes planner variants comparable.
+"""
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_QUERIES = [
+    "I want more power but my engine is misfiring",
+    "What mods should I do first for a track day build?",
+    "My car makes a grinding noise when I brake",
+    "Plan a three stage build for my car on a $10k budget",
+]
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixtures", help="Replay this fixture file (sets LLM_FIXTURE_MODE=replay)")
+    parser.add_argument("--latency-scale", type=float, default=0.0, help="Replay recorded latency x this factor")
+    parser.add_argument("--queries", help="File with one query per line (default: built-in mix)")
+    parser.add_argument("--repeat", type=int, default=1, help="Passes over the queries")
+    parser.add_argument("--no-warmup", action="store_true",
+                        help="Profile the first request too (includes lazy imports and connection setup)")
+    parser.add_argument("--profile", help="Write cProfile stats to this file")
+    parser.add_argument("--top", type=int, default=25, help="Functions to print, by cumulative time")
+    return parser.parse_args(argv)
+
+
+def setup_django(args: argparse.Namespace, db_path: str) -> None:
+    # Fixture settings are read at import time, so set them before Django loads the app
+    if args.fixtures:
+        os.environ["LLM_FIXTURE_MODE"] = "replay"
+        os.environ["LLM_FIXTURE_PATH"] = args.fixtures
+        os.environ["LLM_FIXTURE_LATENCY_SCALE"] = str(args.latency_scale)
+        os.environ.setdefault("ANTHROPIC_API_KEY", "replay")
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "benchmarks.settings")
+    os.environ.setdefault("LOG_PROFILE", "production")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    os.environ["BENCH_SQLITE_PATH"] = db_path
+    sys.path.insert(0, str(ROOT))
+
+    import django
+    from django.core.management import call_command
+    django.setup()
+    call_command("migrate", verbosity=0)
+
+
+async def warm_up(query: str) -> None:
+    from django.test import AsyncClient
+
+    await AsyncClient().post(
+        "/chat/", data=json.dumps({"query": query, "user_id": "profile-warmup"}), content_type="application/json"
+    )
+
+
+async def run_queries(queries, repeat: int):
+    from django.test import AsyncClient
+
+    client = AsyncClient()
+    timings = []
+    for iteration in range(repeat):
+        for index, query in enumerate(queries):
+            started = time.perf_counter()
+            response = await client.post(
+                "/chat/",
+                data=json.dumps({"query": query, "user_id": f"profile-user-{index}", "session_id": f"profile-{iteration}"}),
+                content_type="application/json",
+            )
+            budget = response.json().get("budget", {})
+            timings.append((query, response.status_code, time.perf_counter() - started, budget.get("llm_calls")))
+    return timings
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    queries = Path(args.queries).read_text().splitlines() if args.queries else DEFAULT_QUERIES
+    with tempfile.TemporaryDirectory(prefix="talonai-profile-") as tmpdir:
+        setup_django(args, str(Path(tmpdir) / "profile.sqlite3"))
+        if not args.no_warmup:
+            asyncio.run(warm_up(queries[0]))
+        profiler = cProfile.Profile()
+        profiler.enable()
+        timings = asyncio.run(run_queries(queries, args.repeat))
+        profiler.disable()
+
+    for query, status, seconds, llm_calls in timings:
+        print(f"{status}  {seconds * 1000:8.1f} ms  {llm_calls} llm calls  {query[:60]}")
+    from TalonAIApp.llm_fixtures import get_llm_fixture_stats
+    print(f"fixtures: {get_llm_fixture_stats()}")
+
+    stats = pstats.Stats(profiler).sort_stats("cumulative")
+    if args.profile:
+        stats.dump_stats(args.profile)
+    stats.print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()
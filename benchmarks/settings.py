@@ -0,0 +1,18 @@
+"""Django settings for benchmark runs: production settings plus a local database."""
+import os
+
+from TalonAILinux.settings import *  # noqa: F401,F403
+
+ALLOWED_HOSTS = ["*"]
+
+# SQLite file when no DATABASE_URL is given (see load_test.py --db)
+BENCH_SQLITE_PATH = os.getenv("BENCH_SQLITE_PATH")
+if BENCH_SQLITE_PATH:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": BENCH_SQLITE_PATH,
+            # Concurrent requests share one file; wait for the write lock instead of failing
+            "OPTIONS": {"timeout": 30},
+        }
+    }
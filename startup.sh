@@ -6,6 +6,7 @@ echo "🚀 Starting TalonAI Backend..."
 # Skip migrations during deployment to avoid database pool issues
 echo "⏭️  Skipping database migrations during deployment..."
 echo "📝 Run migrations manually if needed: python manage.py migrate"
+echo "🧹 Schedule memory retention separately: python manage.py prune_memories"
 
 # Start the server directly
 echo "🌟 Starting server..."